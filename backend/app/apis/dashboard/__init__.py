@@ -1,19 +1,19 @@
 from fastapi import APIRouter
+from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import asyncpg
-import databutton as db
-import json
 from datetime import datetime, timedelta
 from app.auth import AuthorizedUser
-from app.libs.database import get_db_connection
+from app.libs.database import acquire
+from app.libs.cache import dashboard_cache
+from app.libs.achievements import get_achievement_catalog, get_user_metrics
+import asyncio
+import logging
 import os
 
-router = APIRouter(prefix="/dashboard")
+logger = logging.getLogger(__name__)
 
-# Database connection
-async def get_db():
-    return await get_db_connection()
+router = APIRouter(prefix="/dashboard")
 
 # Pydantic models
 class DashboardStats(BaseModel):
@@ -96,47 +96,80 @@ class DashboardData(BaseModel):
     recommended_lessons: List[RecommendedLesson]
     progress_overview: List[ProgressOverview]
     learning_streak: LearningStreak
+    # Panels that failed or timed out and were replaced by empty defaults
+    partial_panels: List[str] = []
+
+# Execution engine for /dashboard/: 'serial' runs every panel on one connection,
+# 'concurrent' fans the panels out over pooled connections and 'single_query'
+# builds the whole payload as JSON inside Postgres in one round trip
+DASHBOARD_ENGINE = os.environ.get("DASHBOARD_ENGINE", "serial").lower()
+# Seconds a single panel may take (including waiting for a slot and a connection) in concurrent mode
+DASHBOARD_PANEL_TIMEOUT = float(os.environ.get("DASHBOARD_PANEL_TIMEOUT", "5"))
+# Pooled connections one dashboard request may hold at once in concurrent mode,
+# so a few concurrent dashboards cannot take the whole pool
+DASHBOARD_PANEL_CONCURRENCY = int(os.environ.get("DASHBOARD_PANEL_CONCURRENCY", "3"))
 
 @router.get("/")
 async def get_dashboard_data(user: AuthorizedUser) -> DashboardData:
     """Get comprehensive dashboard data for the user"""
-    conn = await get_db()
-    try:
-        # Store/update user profile information
-        # await upsert_user_profile(conn, user)
-        
-        # Get basic stats
-        stats = await get_user_stats(conn, user.sub)
-        
-        # Get recent activity
-        recent_activity = await get_recent_activity(conn, user.sub)
-        
-        # Get quick actions
-        quick_actions = await get_quick_actions(conn, user.sub)
-        
-        # Get achievements
-        achievements = await get_user_achievements(conn, user.sub)
-        
-        # Get recommended lessons
-        recommended_lessons = await get_recommended_lessons(conn, user.sub)
-        
-        # Get progress overview by category
-        progress_overview = await get_progress_overview(conn, user.sub)
-        
-        # Get learning streak
-        learning_streak = await get_learning_streak(conn, user.sub)
-        
-        return DashboardData(
-            stats=stats,
-            recent_activity=recent_activity,
-            quick_actions=quick_actions,
-            achievements=achievements,
-            recommended_lessons=recommended_lessons,
-            progress_overview=progress_overview,
-            learning_streak=learning_streak
-        )
-    finally:
-        await conn.close()
+    # Entries are invalidated by writes (see invalidate_user) and by the date
+    # changing, since the learning streak is relative to today
+    version = (dashboard_cache.version(user.sub), datetime.now().date())
+    payload = dashboard_cache.get(user.sub, version)
+    if payload is None:
+        payload, complete = await build_dashboard_payload(user.sub)
+        if complete:
+            dashboard_cache.put(user.sub, version, payload)
+
+    return Response(content=payload, media_type="application/json")
+
+async def build_dashboard_payload(user_id: str) -> tuple[bytes, bool]:
+    """Serialize DashboardData with the configured engine; the flag is False for partial data"""
+    if DASHBOARD_ENGINE == "single_query":
+        async with acquire() as conn:
+            # Already serialized by Postgres in the DashboardData shape
+            payload = await get_dashboard_json(conn, user_id)
+        return payload.encode(), True
+
+    if DASHBOARD_ENGINE == "concurrent":
+        data = await get_dashboard_data_concurrent(user_id)
+    else:
+        async with acquire() as conn:
+            data = await get_dashboard_data_serial(conn, user_id)
+    return data.model_dump_json().encode(), not data.partial_panels
+
+async def get_dashboard_data_serial(conn, user_id: str) -> DashboardData:
+    """Build the dashboard by running each panel in turn on a single connection"""
+    # Get basic stats
+    stats = await get_user_stats(conn, user_id)
+    
+    # Get recent activity
+    recent_activity = await get_recent_activity(conn, user_id)
+    
+    # Get quick actions
+    quick_actions = await get_quick_actions(conn, user_id)
+    
+    # Get achievements
+    achievements = await get_user_achievements(conn, user_id)
+    
+    # Get recommended lessons
+    recommended_lessons = await get_recommended_lessons(conn, user_id)
+    
+    # Get progress overview by category
+    progress_overview = await get_progress_overview(conn, user_id)
+    
+    # Get learning streak
+    learning_streak = await get_learning_streak(conn, user_id)
+    
+    return DashboardData(
+        stats=stats,
+        recent_activity=recent_activity,
+        quick_actions=quick_actions,
+        achievements=achievements,
+        recommended_lessons=recommended_lessons,
+        progress_overview=progress_overview,
+        learning_streak=learning_streak
+    )
 
 async def get_user_stats(conn, user_id: str) -> DashboardStats:
     """Get user statistics"""
@@ -351,63 +384,36 @@ async def get_quick_actions(conn, user_id: str) -> List[QuickAction]:
 
 async def get_user_achievements(conn, user_id: str) -> List[Achievement]:
     """Get user achievements with progress"""
-    achievements = await conn.fetch(
-        """
-        SELECT 
-            a.id, a.name, a.description, a.icon, a.reward_points, a.criteria,
-            ua.earned_at
-        FROM achievements a
-        LEFT JOIN user_achievements ua ON a.id = ua.achievement_id AND ua.user_id = $1
-        ORDER BY 
-            CASE WHEN ua.earned_at IS NOT NULL THEN 0 ELSE 1 END,
-            ua.earned_at DESC,
-            a.id
-        """,
+    catalog = await get_achievement_catalog(conn)
+    earned_rows = await conn.fetch(
+        "SELECT achievement_id, earned_at FROM user_achievements WHERE user_id = $1",
         user_id
     )
-    
+    earned_at = {row['achievement_id']: row['earned_at'] for row in earned_rows}
+
+    # One aggregate query covers the progress of every unearned achievement
+    metrics = await get_user_metrics(conn, user_id) if len(earned_at) < len(catalog) else {}
+
     result = []
-    for achievement in achievements:
-        # Calculate progress for unearned achievements
-        progress_current = None
-        progress_target = None
-        
-        if not achievement['earned_at'] and achievement['criteria']:
-            criteria = achievement['criteria']
-            # Parse JSON string if needed
-            if isinstance(criteria, str):
-                criteria = json.loads(criteria)
-            
-            if criteria.get('type') == 'lessons_completed':
-                target = criteria.get('count', criteria.get('target', 1))  # Handle both count and target
-                current = await conn.fetchval(
-                    "SELECT COUNT(*) FROM user_progress WHERE user_id = $1 AND status = 'completed'",
-                    user_id
-                ) or 0
-                progress_current = current
-                progress_target = target
-            elif criteria.get('type') == 'practice_sessions':
-                target = criteria.get('count', criteria.get('target', 1))
-                current = await conn.fetchval(
-                    "SELECT total_sessions FROM practice_stats WHERE user_id = $1",
-                    user_id
-                ) or 0
-                progress_current = current
-                progress_target = target
-        
+    for rule in catalog:
+        earned = earned_at.get(rule.id)
+        progress_current, progress_target = (None, None) if earned else rule.progress(metrics)
+
         result.append(Achievement(
-            id=achievement['id'],
-            name=achievement['name'],
-            description=achievement['description'],
-            icon=achievement['icon'],
-            reward_points=achievement['reward_points'],
-            is_earned=achievement['earned_at'] is not None,
-            earned_at=achievement['earned_at'].isoformat() if achievement['earned_at'] else None,
+            id=rule.id,
+            name=rule.name,
+            description=rule.description,
+            icon=rule.icon,
+            reward_points=rule.reward_points,
+            is_earned=earned is not None,
+            earned_at=earned.isoformat() if earned else None,
             progress_current=progress_current,
             progress_target=progress_target
         ))
-    
-    return result
+
+    # Earned first (most recent first), then the rest in catalog order
+    earned_list = sorted((a for a in result if a.is_earned), key=lambda a: earned_at[a.id], reverse=True)
+    return earned_list + [a for a in result if not a.is_earned]
 
 async def get_recommended_lessons(conn, user_id: str) -> List[RecommendedLesson]:
     """Get personalized lesson recommendations"""
@@ -442,11 +448,6 @@ async def get_recommended_lessons(conn, user_id: str) -> List[RecommendedLesson]
         elif lesson['difficulty_level'] == 'advanced':
             reason = "Master advanced concepts"
         
-        if os.getenv('DB_LOCAL') == 'False':
-            learning_objectives = lesson['learning_objectives'] or []
-        else:
-            learning_objectives = json.loads(lesson['learning_objectives']) or []
-
         recommendations.append(RecommendedLesson(
             id=lesson['id'],
             title=lesson['title'],
@@ -455,7 +456,7 @@ async def get_recommended_lessons(conn, user_id: str) -> List[RecommendedLesson]
             difficulty_level=lesson['difficulty_level'],
             estimated_duration=lesson['estimated_duration'],
             reason=reason,
-            learning_objectives=learning_objectives,
+            learning_objectives=lesson['learning_objectives'] or [],
             progress_status=lesson['progress_status']
         ))
     
@@ -566,3 +567,414 @@ async def get_learning_streak(conn, user_id: str) -> LearningStreak:
         days_this_week=days_this_week
     )
 
+# Concurrent engine
+def empty_user_stats() -> DashboardStats:
+    return DashboardStats(
+        lessons_completed=0,
+        lessons_in_progress=0,
+        total_lessons=0,
+        categories_explored=0,
+        total_categories=0,
+        practice_sessions=0,
+        average_practice_score=0.0,
+        achievements_earned=0,
+        total_achievements=0,
+        current_learning_streak=0,
+        total_study_time_minutes=0,
+        bookmarked_lessons=0
+    )
+
+def empty_learning_streak() -> LearningStreak:
+    return LearningStreak(
+        current_streak=0,
+        longest_streak=0,
+        streak_goal=7,
+        last_activity_date=None,
+        is_today_completed=False,
+        days_this_week=[False] * 7
+    )
+
+# (field name, panel function, fallback used when the panel fails or times out)
+DASHBOARD_PANELS = [
+    ("stats", get_user_stats, empty_user_stats),
+    ("recent_activity", get_recent_activity, list),
+    ("quick_actions", get_quick_actions, list),
+    ("achievements", get_user_achievements, list),
+    ("recommended_lessons", get_recommended_lessons, list),
+    ("progress_overview", get_progress_overview, list),
+    ("learning_streak", get_learning_streak, empty_learning_streak),
+]
+
+async def run_panel(panel, user_id: str, limit: asyncio.Semaphore):
+    """Run one dashboard panel on its own pooled connection, at most `limit` at a time"""
+    async with limit, acquire() as conn:
+        return await panel(conn, user_id)
+
+async def get_dashboard_data_concurrent(user_id: str) -> DashboardData:
+    """Build the dashboard with every panel running in parallel under a per-panel timeout"""
+    limit = asyncio.Semaphore(DASHBOARD_PANEL_CONCURRENCY)
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(run_panel(panel, user_id, limit), timeout=DASHBOARD_PANEL_TIMEOUT)
+            for _, panel, _ in DASHBOARD_PANELS
+        ),
+        return_exceptions=True,
+    )
+
+    data = {}
+    partial_panels = []
+    for (name, _, fallback), result in zip(DASHBOARD_PANELS, results):
+        if isinstance(result, BaseException):
+            reason = "timed out" if isinstance(result, asyncio.TimeoutError) else f"failed: {result!r}"
+            logger.warning(f"Dashboard panel '{name}' {reason}", extra={"panel": name, "user_id": user_id})
+            data[name] = fallback()
+            partial_panels.append(name)
+        else:
+            data[name] = result
+
+    return DashboardData(**data, partial_panels=partial_panels)
+
+# Single-query engine
+# $1 = user id, $2 = today's date (passed in so streaks use the app's clock like get_learning_streak)
+DASHBOARD_JSON_QUERY = """
+WITH
+lesson_stats AS (
+    SELECT
+        COUNT(CASE WHEN up.status = 'completed' THEN 1 END) AS completed,
+        COUNT(CASE WHEN up.status = 'in_progress' THEN 1 END) AS in_progress,
+        (SELECT COUNT(*) FROM lessons WHERE is_published = true) AS total_lessons,
+        COUNT(DISTINCT l.category_id) AS categories_explored,
+        (SELECT COUNT(*) FROM categories) AS total_categories
+    FROM user_progress up
+    RIGHT JOIN lessons l ON up.lesson_id = l.id AND up.user_id = $1
+    WHERE l.is_published = true
+),
+user_metrics AS (
+    -- Same metrics as app.libs.achievements.USER_METRICS_QUERY
+    SELECT
+        (SELECT COUNT(*) FROM user_progress
+            WHERE user_id = $1 AND status = 'completed') AS lessons_completed,
+        (SELECT COUNT(DISTINCT l.category_id) FROM user_progress up
+            JOIN lessons l ON up.lesson_id = l.id
+            WHERE up.user_id = $1 AND up.status = 'completed') AS categories_explored,
+        (SELECT COUNT(DISTINCT lesson_id) FROM user_engagement
+            WHERE user_id = $1 AND action = 'preview') AS lesson_previews,
+        (SELECT COUNT(*) FROM user_bookmarks WHERE user_id = $1) AS bookmarks,
+        COALESCE((SELECT total_sessions FROM practice_stats WHERE user_id = $1), 0) AS practice_sessions,
+        COALESCE((SELECT current_streak_days FROM practice_stats WHERE user_id = $1), 0) AS learning_streak
+),
+practice AS (
+    SELECT * FROM practice_stats WHERE user_id = $1
+),
+achievement_stats AS (
+    SELECT
+        (SELECT COUNT(*) FROM user_achievements WHERE user_id = $1) AS earned,
+        (SELECT COUNT(*) FROM achievements) AS total
+),
+bookmarks AS (
+    SELECT COUNT(*) AS n FROM user_bookmarks WHERE user_id = $1
+),
+stats AS (
+    SELECT json_build_object(
+        'lessons_completed', ls.completed,
+        'lessons_in_progress', ls.in_progress,
+        'total_lessons', ls.total_lessons,
+        'categories_explored', ls.categories_explored,
+        'total_categories', ls.total_categories,
+        'practice_sessions', COALESCE(p.total_sessions, 0),
+        'average_practice_score', COALESCE(p.average_score, 0)::float8,
+        'achievements_earned', a.earned,
+        'total_achievements', a.total,
+        'current_learning_streak', COALESCE(p.current_streak_days, 0),
+        'total_study_time_minutes', COALESCE(p.total_practice_time_minutes, 0) + ls.completed * 15,
+        'bookmarked_lessons', b.n
+    ) AS value
+    FROM lesson_stats ls
+    CROSS JOIN achievement_stats a
+    CROSS JOIN bookmarks b
+    LEFT JOIN practice p ON true
+),
+recent_completions AS (
+    SELECT up.completed_at AS ts, l.title, l.id
+    FROM user_progress up
+    JOIN lessons l ON up.lesson_id = l.id
+    WHERE up.user_id = $1 AND up.status = 'completed' AND up.completed_at IS NOT NULL
+    ORDER BY up.completed_at DESC
+    LIMIT 5
+),
+recent_sessions AS (
+    SELECT ps.created_at AS ts, ps.total_score, pc.title, pc.max_score, ps.challenge_id
+    FROM practice_sessions ps
+    JOIN practice_challenges pc ON ps.challenge_id = pc.id
+    WHERE ps.user_id = $1
+    ORDER BY ps.created_at DESC
+    LIMIT 3
+),
+recent_achievements AS (
+    SELECT ua.earned_at AS ts, a.name, a.description, a.icon
+    FROM user_achievements ua
+    JOIN achievements a ON ua.achievement_id = a.id
+    WHERE ua.user_id = $1
+    ORDER BY ua.earned_at DESC
+    LIMIT 3
+),
+activity AS (
+    SELECT ts, json_build_object(
+        'id', row_number() OVER (ORDER BY ts DESC) - 1,
+        'activity_type', 'lesson_completed',
+        'title', 'Completed: ' || title,
+        'description', 'Great job finishing this lesson!',
+        'timestamp', ts,
+        'metadata', json_build_object('lesson_id', id)
+    ) AS value
+    FROM recent_completions
+    UNION ALL
+    SELECT ts, json_build_object(
+        'id', (SELECT COUNT(*) FROM recent_completions) + row_number() OVER (ORDER BY ts DESC) - 1,
+        'activity_type', 'practice_session',
+        'title', 'Practice: ' || title,
+        'description', 'Scored ' || total_score || '/' || max_score || ' ('
+            || CASE WHEN max_score > 0 THEN round(total_score * 100.0 / max_score) ELSE 0 END || '%)',
+        'timestamp', ts,
+        'metadata', json_build_object('challenge_id', challenge_id, 'score', total_score)
+    )
+    FROM recent_sessions
+    UNION ALL
+    SELECT ts, json_build_object(
+        'id', (SELECT COUNT(*) FROM recent_completions) + (SELECT COUNT(*) FROM recent_sessions)
+            + row_number() OVER (ORDER BY ts DESC) - 1,
+        'activity_type', 'achievement_earned',
+        'title', '🏆 ' || name,
+        'description', description,
+        'timestamp', ts,
+        'metadata', json_build_object('icon', icon)
+    )
+    FROM recent_achievements
+),
+recent_activity AS (
+    SELECT COALESCE(json_agg(value ORDER BY ts DESC), '[]'::json) AS value
+    FROM (SELECT ts, value FROM activity ORDER BY ts DESC LIMIT 10) latest
+),
+in_progress_lesson AS (
+    SELECT l.id, l.title, up.progress_percentage, l.estimated_duration
+    FROM user_progress up
+    JOIN lessons l ON up.lesson_id = l.id
+    WHERE up.user_id = $1 AND up.status = 'in_progress'
+    ORDER BY up.last_accessed_at DESC
+    LIMIT 1
+),
+next_lesson AS (
+    SELECT l.id, l.title, l.estimated_duration, c.name AS category_name
+    FROM lessons l
+    JOIN categories c ON l.category_id = c.id
+    LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $1
+    WHERE l.is_published = true AND (up.status IS NULL OR up.status = 'not_started')
+    ORDER BY c.order_index, l.order_index
+    LIMIT 1
+),
+quick_actions AS (
+    SELECT COALESCE(json_agg(value ORDER BY position), '[]'::json) AS value
+    FROM (
+        SELECT 1 AS position, json_build_object(
+            'action_type', 'continue_lesson',
+            'title', 'Continue: ' || title,
+            'description', progress_percentage || '% complete',
+            'target_url', '/lesson/' || id,
+            'progress_percentage', progress_percentage,
+            'estimated_time', estimated_duration
+        ) AS value
+        FROM in_progress_lesson
+        UNION ALL
+        SELECT 2, json_build_object(
+            'action_type', 'start_next',
+            'title', 'Start: ' || title,
+            'description', 'Next lesson in ' || category_name,
+            'target_url', '/lesson/' || id,
+            'progress_percentage', NULL,
+            'estimated_time', estimated_duration
+        )
+        FROM next_lesson
+        UNION ALL
+        SELECT 3, json_build_object(
+            'action_type', 'practice_challenge',
+            'title', 'Practice Prompting',
+            'description', 'Test your skills in the practice playground',
+            'target_url', '/practice-playground',
+            'progress_percentage', NULL,
+            'estimated_time', 15
+        )
+        UNION ALL
+        SELECT 4, json_build_object(
+            'action_type', 'review_bookmark',
+            'title', 'Review Bookmarks',
+            'description', n || ' saved lesson' || CASE WHEN n <> 1 THEN 's' ELSE '' END,
+            'target_url', '/lessons?filter=bookmarked',
+            'progress_percentage', NULL,
+            'estimated_time', NULL
+        )
+        FROM bookmarks
+        WHERE n > 0
+    ) actions
+),
+achievement_list AS (
+    SELECT COALESCE(json_agg(json_build_object(
+        'id', a.id,
+        'name', a.name,
+        'description', a.description,
+        'icon', a.icon,
+        'reward_points', a.reward_points,
+        'is_earned', ua.earned_at IS NOT NULL,
+        'earned_at', ua.earned_at,
+        'progress_current', CASE WHEN ua.earned_at IS NULL THEN
+            CASE a.criteria::jsonb->>'type'
+                WHEN 'lessons_completed' THEN m.lessons_completed
+                WHEN 'categories_explored' THEN m.categories_explored
+                WHEN 'lesson_previews' THEN m.lesson_previews
+                WHEN 'previews' THEN m.lesson_previews
+                WHEN 'bookmarks' THEN m.bookmarks
+                WHEN 'practice_sessions' THEN m.practice_sessions
+                WHEN 'learning_streak' THEN m.learning_streak
+            END
+        END,
+        'progress_target', CASE WHEN ua.earned_at IS NULL
+            AND a.criteria::jsonb->>'type' IN (
+                'lessons_completed', 'categories_explored', 'lesson_previews', 'previews',
+                'bookmarks', 'practice_sessions', 'learning_streak'
+            ) THEN
+            COALESCE(a.criteria::jsonb->>'count', a.criteria::jsonb->>'target', '1')::int
+        END
+    ) ORDER BY (ua.earned_at IS NULL), ua.earned_at DESC, a.id), '[]'::json) AS value
+    FROM achievements a
+    CROSS JOIN user_metrics m
+    LEFT JOIN user_achievements ua ON a.id = ua.achievement_id AND ua.user_id = $1
+),
+recommended AS (
+    SELECT COALESCE(json_agg(json_build_object(
+        'id', id,
+        'title', title,
+        'description', description,
+        'category_name', category_name,
+        'difficulty_level', difficulty_level,
+        'estimated_duration', estimated_duration,
+        'reason', CASE
+            WHEN progress_status = 'in_progress' THEN 'Pick up where you left off'
+            WHEN difficulty_level = 'beginner' THEN 'Perfect for building fundamentals'
+            WHEN difficulty_level = 'intermediate' THEN 'Ready for the next challenge'
+            WHEN difficulty_level = 'advanced' THEN 'Master advanced concepts'
+            ELSE 'Continue your learning journey'
+        END,
+        'learning_objectives', learning_objectives,
+        'progress_status', progress_status
+    ) ORDER BY position), '[]'::json) AS value
+    FROM (
+        SELECT
+            l.id, l.title, l.description, l.estimated_duration, l.difficulty_level,
+            COALESCE(to_json(l.learning_objectives), '[]'::json) AS learning_objectives,
+            c.name AS category_name,
+            COALESCE(up.status, 'not_started') AS progress_status,
+            row_number() OVER (ORDER BY c.order_index, l.order_index) AS position
+        FROM lessons l
+        JOIN categories c ON l.category_id = c.id
+        LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $1
+        WHERE l.is_published = true
+            AND (up.status IS NULL OR up.status IN ('not_started', 'in_progress'))
+        ORDER BY c.order_index, l.order_index
+        LIMIT 5
+    ) lessons_to_recommend
+),
+category_progress AS (
+    SELECT
+        c.id, c.name, c.color, c.icon, c.order_index,
+        COUNT(l.id) AS total_lessons,
+        COUNT(CASE WHEN up.status = 'completed' THEN 1 END) AS completed_lessons,
+        COUNT(CASE WHEN up.status = 'in_progress' THEN 1 END) AS in_progress_lessons
+    FROM categories c
+    LEFT JOIN lessons l ON c.id = l.category_id AND l.is_published = true
+    LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $1
+    GROUP BY c.id, c.name, c.color, c.icon, c.order_index
+),
+progress_overview AS (
+    SELECT COALESCE(json_agg(json_build_object(
+        'category_id', cp.id,
+        'category_name', cp.name,
+        'category_color', cp.color,
+        'category_icon', cp.icon,
+        'total_lessons', cp.total_lessons,
+        'completed_lessons', cp.completed_lessons,
+        'in_progress_lessons', cp.in_progress_lessons,
+        'progress_percentage', CASE WHEN cp.total_lessons > 0
+            THEN cp.completed_lessons * 100.0 / cp.total_lessons ELSE 0 END::float8,
+        'next_lesson_id', nl.id,
+        'next_lesson_title', nl.title
+    ) ORDER BY cp.order_index), '[]'::json) AS value
+    FROM category_progress cp
+    LEFT JOIN LATERAL (
+        SELECT l2.id, l2.title
+        FROM lessons l2
+        LEFT JOIN user_progress up2 ON l2.id = up2.lesson_id AND up2.user_id = $1
+        WHERE l2.category_id = cp.id AND l2.is_published = true
+            AND (up2.status IS NULL OR up2.status = 'not_started')
+        ORDER BY l2.order_index
+        LIMIT 1
+    ) nl ON true
+),
+activity_days AS (
+    SELECT DISTINCT DATE(created_at) AS day
+    FROM (
+        SELECT created_at FROM user_progress WHERE user_id = $1 AND status = 'completed'
+        UNION
+        SELECT created_at FROM practice_sessions WHERE user_id = $1
+        UNION
+        SELECT created_at FROM user_engagement WHERE user_id = $1
+    ) activities
+    WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
+),
+streak_runs AS (
+    -- Consecutive days share the same (day - rank) value
+    SELECT day, day - (row_number() OVER (ORDER BY day))::int AS run
+    FROM activity_days
+),
+streak_anchor AS (
+    -- The streak counts back from today, or from yesterday if today has no activity yet
+    SELECT CASE WHEN EXISTS (SELECT 1 FROM activity_days WHERE day = $2::date)
+        THEN $2::date ELSE $2::date - 1 END AS day
+),
+current_streak AS (
+    SELECT COUNT(*) AS n
+    FROM streak_runs
+    WHERE run = (SELECT sr.run FROM streak_runs sr JOIN streak_anchor sa ON sr.day = sa.day)
+        AND day <= (SELECT day FROM streak_anchor)
+),
+learning_streak AS (
+    SELECT json_build_object(
+        'current_streak', cs.n,
+        'longest_streak', cs.n,
+        'streak_goal', 7,
+        'last_activity_date', (SELECT MAX(day) FROM activity_days),
+        'is_today_completed', EXISTS (SELECT 1 FROM activity_days WHERE day = $2::date),
+        'days_this_week', (
+            SELECT json_agg(EXISTS (SELECT 1 FROM activity_days WHERE day = week_day::date) ORDER BY week_day)
+            FROM generate_series(
+                $2::date - (EXTRACT(ISODOW FROM $2::date)::int - 1),
+                $2::date - (EXTRACT(ISODOW FROM $2::date)::int - 1) + 6,
+                INTERVAL '1 day'
+            ) week_day
+        )
+    ) AS value
+    FROM current_streak cs
+)
+SELECT json_build_object(
+    'stats', (SELECT value FROM stats),
+    'recent_activity', (SELECT value FROM recent_activity),
+    'quick_actions', (SELECT value FROM quick_actions),
+    'achievements', (SELECT value FROM achievement_list),
+    'recommended_lessons', (SELECT value FROM recommended),
+    'progress_overview', (SELECT value FROM progress_overview),
+    'learning_streak', (SELECT value FROM learning_streak),
+    'partial_panels', '[]'::json
+)::text
+"""
+
+async def get_dashboard_json(conn, user_id: str) -> str:
+    """Fetch the complete DashboardData payload as a JSON document in one round trip"""
+    return await conn.fetchval(DASHBOARD_JSON_QUERY, user_id, datetime.now().date())
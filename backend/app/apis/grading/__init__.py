@@ -0,0 +1,69 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+import json
+from app.auth import AuthorizedUser
+from app.libs.grading_queue import GradingJob, grading_queue
+
+router = APIRouter(prefix="/grading")
+
+# Seconds between SSE comments that keep proxies from closing an idle stream
+SSE_KEEPALIVE_SECONDS = 15
+
+
+# Pydantic models
+class GradingJobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str
+    attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
+
+
+def get_user_job(job_id: str, user_id: str) -> GradingJob:
+    job = grading_queue.get_job(job_id)
+    # Other users' jobs are reported as missing rather than forbidden
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Grading job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_grading_job(job_id: str, user: AuthorizedUser) -> GradingJobStatus:
+    """Get the status of a grading job, including its result once completed"""
+    return GradingJobStatus(**get_user_job(job_id, user.sub).to_dict())
+
+
+async def job_events(job: GradingJob, request: Request):
+    yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+    while not job.done:
+        if await job.wait(SSE_KEEPALIVE_SECONDS):
+            break
+        if await request.is_disconnected():
+            return
+        yield ": keep-alive\n\n"
+    yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+
+@router.get("/jobs/{job_id}/events", tags=["stream"])
+async def stream_grading_job(job_id: str, user: AuthorizedUser, request: Request):
+    """
+    Server-sent events for a grading job: a `status` event straight away, then a
+    `completed` or `failed` event carrying the final job once grading finishes.
+    """
+    job = get_user_job(job_id, user.sub)
+    return StreamingResponse(
+        job_events(job, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def get_grading_stats(user: AuthorizedUser) -> Dict[str, float]:
+    """Queue depth and job counters for this worker process"""
+    return grading_queue.stats()
@@ -1,30 +1,19 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
-from typing import List, Optional, Union, Dict, Any
-import asyncpg
-import databutton as db
+from fastapi import APIRouter, HTTPException, Response
+from pydantic import BaseModel
+from typing import List, NamedTuple, Optional, Set, Tuple, Union, Dict, Any
 import json
-import os
-from openai import AzureOpenAI
+import logging
 from app.auth import AuthorizedUser
-from app.libs.database import get_db_connection
-
-router = APIRouter(prefix="/lesson-content")
-
-
-# Database connection
-async def get_db():
-    return await get_db_connection()
+from app.libs.cache import lesson_payload_cache
+from app.libs.database import DbConnection, acquire
+from app.libs.fast_json import dumps
+from app.libs.catalog import get_catalog
+from app.libs.grading_queue import GRADING_ASYNC, accept_grading_job, grading_queue
+from app.libs.llm import LLM_MODEL, record_usage, require_llm_client
 
+logger = logging.getLogger(__name__)
 
-# Azure OpenAI client
-def get_azure_openai_client():
-    return AzureOpenAI(
-        api_key=db.secrets.get("AZURE_OPENAI_API_KEY"),
-        api_version="2024-02-01",
-        azure_endpoint=db.secrets.get("AZURE_OPENAI_ENDPOINT")
-    )
-
+router = APIRouter(prefix="/lesson-content")
 
 # Pydantic models
 class LessonContentSection(BaseModel):
@@ -63,113 +52,151 @@ class SubmissionResult(BaseModel):
     feedback: str
 
 
+class LessonPayload(NamedTuple):
+    """Static JSON of a lesson, split where the per-user fields go"""
+    # `{"id":...,"order_index":N,"progress_status":`
+    head: bytes
+    # (section id, `{"id":...,"content":...,"is_completed":`) in display order
+    sections: List[Tuple[int, bytes]]
+
+
+PROGRESS_FIELDS = {"progress_status", "progress_percentage", "content_sections"}
+
+
+def render_lesson_payload(lesson: Dict[str, Any], sections: List[Dict[str, Any]]) -> LessonPayload:
+    """Validate and encode a lesson's static fields once, leaving the per-user ones open"""
+    # The models still validate the catalog rows; the placeholders are excluded
+    static = LessonWithContent(
+        **{field: lesson[field] for field in LessonWithContent.model_fields if field not in PROGRESS_FIELDS},
+        progress_status="not_started",
+        progress_percentage=0,
+        content_sections=[],
+    ).model_dump(mode="json", exclude=PROGRESS_FIELDS)
+    head = dumps(static)[:-1] + b',"progress_status":'
+
+    rendered_sections = []
+    for row in sections:
+        section = LessonContentSection(
+            id=row["id"],
+            section_type=row["section_type"],
+            order_index=row["order_index"],
+            title=row["title"],
+            content=row["content"],
+        ).model_dump(mode="json", exclude={"is_completed"})
+        rendered_sections.append((row["id"], dumps(section)[:-1] + b',"is_completed":'))
+    return LessonPayload(head, rendered_sections)
+
+
+def splice_lesson_payload(payload: LessonPayload, status: str, percentage: int, completed: Set[int]) -> bytes:
+    """Fill the user's progress into a rendered lesson without re-encoding its content"""
+    parts = [
+        payload.head, dumps(status),
+        b',"progress_percentage":', str(int(percentage)).encode(),
+        b',"content_sections":[',
+    ]
+    for index, (section_id, prefix) in enumerate(payload.sections):
+        if index:
+            parts.append(b",")
+        parts.append(prefix)
+        parts.append(b"true}" if section_id in completed else b"false}")
+    parts.append(b"]}")
+    # One copy of the content into the response body
+    return b"".join(parts)
+
+
 @router.get("/lessons/{lesson_id}", response_model=LessonWithContent)
-async def get_lesson_with_content(lesson_id: int, user: AuthorizedUser) -> LessonWithContent:
+async def get_lesson_with_content(lesson_id: int, user: AuthorizedUser, conn: DbConnection) -> Response:
     """Get a lesson with all its content sections and exercises"""
-    conn = await get_db()
-    try:
-        # Get lesson basic info
-        lesson_query = """
-        SELECT 
-            l.id, l.title, l.description, l.category_id, l.difficulty_level,
-            l.estimated_duration, l.learning_objectives, l.workplace_scenario, l.order_index,
-            COALESCE(up.status, 'not_started') as progress_status,
-            COALESCE(up.progress_percentage, 0) as progress_percentage
-        FROM lessons l
-        LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $2
-        WHERE l.id = $1
-        """
-
-        lesson_row = await conn.fetchrow(lesson_query, lesson_id, user.sub)
-        if not lesson_row:
-            raise HTTPException(status_code=404, detail="Lesson not found")
-
-        # Get lesson content sections
-        content_query = """
-        SELECT lc.id, lc.section_type, lc.order_index, lc.title, lc.content, upc.is_completed
-        FROM lesson_content lc
-        LEFT JOIN user_progress_content upc ON lc.id = upc.lesson_content_id AND upc.user_id = $2
-        WHERE lc.lesson_id = $1
-        ORDER BY lc.order_index
-        """
-
-        content_rows = await conn.fetch(content_query, lesson_id, user.sub)
-        content_sections = []
-        for row in content_rows:
-            content_data = row["content"]
-            # If the content is a JSON string, parse it
-            if isinstance(content_data, str):
-                try:
-                    content_data = json.loads(content_data)
-                except json.JSONDecodeError:
-                    pass  # Keep as string if not valid JSON
-
-            content_sections.append(
-                LessonContentSection(
-                    id=row["id"],
-                    section_type=row["section_type"],
-                    order_index=row["order_index"],
-                    title=row["title"],
-                    content=content_data,
-                    is_completed=row["is_completed"] or False,
-                )
-            )
-
-        return LessonWithContent(
-            id=lesson_row["id"],
-            title=lesson_row["title"],
-            description=lesson_row["description"],
-            category_id=lesson_row["category_id"],
-            difficulty_level=lesson_row["difficulty_level"],
-            estimated_duration=lesson_row["estimated_duration"],
-            learning_objectives=json.loads(lesson_row["learning_objectives"]) if os.getenv('DB_LOCAL') == 'True' else lesson_row["learning_objectives"],
-            workplace_scenario=lesson_row["workplace_scenario"],
-            order_index=lesson_row["order_index"],
-            progress_status=lesson_row["progress_status"],
-            progress_percentage=lesson_row["progress_percentage"],
-            content_sections=content_sections,
-        )
-    finally:
-        await conn.close()
+    # Lesson and sections come from the catalog; only the user's progress
+    # and completed sections are read from the database
+    catalog = await get_catalog(conn)
+    lesson = catalog.lessons_by_id.get(lesson_id)
+    if not lesson:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    sections = catalog.lesson_content_by_lesson.get(lesson_id, [])
+
+    # The static part is encoded once per catalog version and shared by all users
+    payload = lesson_payload_cache.get(lesson_id, catalog.version)
+    if payload is None:
+        payload = render_lesson_payload(lesson, sections)
+        lesson_payload_cache.put(lesson_id, catalog.version, payload)
+
+    progress_query = """
+    SELECT
+        up.status, up.progress_percentage,
+        ARRAY(
+            SELECT upc.lesson_content_id FROM user_progress_content upc
+            WHERE upc.user_id = $1 AND upc.lesson_content_id = ANY($3::int[]) AND upc.is_completed
+        ) as completed_sections
+    FROM (SELECT 1) as one
+    LEFT JOIN user_progress up ON up.user_id = $1 AND up.lesson_id = $2
+    """
+
+    progress_row = await conn.fetchrow(progress_query, user.sub, lesson_id, [section_id for section_id, _ in payload.sections])
+
+    return Response(
+        content=splice_lesson_payload(
+            payload,
+            progress_row["status"] or "not_started",
+            progress_row["progress_percentage"] or 0,
+            set(progress_row["completed_sections"]),
+        ),
+        media_type="application/json",
+    )
 
 
-@router.post("/exercises/submit", response_model=SubmissionResult)
+async def get_exercise_for_grading(lesson_content_id: int, lesson_id: int) -> Optional[Dict[str, Any]]:
+    """Exercise title and scenario from the catalog"""
+    catalog = await get_catalog()
+    exercise = catalog.lesson_content_by_id.get(lesson_content_id)
+    if not exercise or exercise["lesson_id"] != lesson_id or exercise["section_type"] != "practice_exercise":
+        return None
+    content = exercise["content"] if isinstance(exercise["content"], dict) else {}
+    return {"title": exercise["title"], "scenario": content.get("scenario")}
+
+
+@router.post(
+    "/exercises/submit",
+    response_model=SubmissionResult,
+    responses={202: {"description": "Queued for grading (GRADING_MODE=async)"}},
+)
 async def submit_exercise(submission: ExerciseSubmission, user: AuthorizedUser) -> SubmissionResult:
     """Submit a practice exercise and get AI-powered assessment"""
-    conn = await get_db()
-    try:
-        # Get exercise details from lesson_content
-        exercise_query = """
-        SELECT title, content
-        FROM lesson_content
-        WHERE id = $1 AND lesson_id = $2 AND section_type = 'practice_exercise'
-        """
-
-        exercise_row = await conn.fetchrow(exercise_query, submission.lesson_content_id, submission.lesson_id)
-        if not exercise_row:
+    if GRADING_ASYNC:
+        # Unknown exercises are rejected here rather than as a failed job
+        if not await get_exercise_for_grading(submission.lesson_content_id, submission.lesson_id):
             raise HTTPException(status_code=404, detail="Practice exercise not found")
+        return await accept_grading_job("exercise", user.sub, submission.model_dump())
 
-        exercise_details = json.loads(exercise_row["content"])
-        exercise_scenario = exercise_details.get("scenario")
+    return await grade_exercise_submission(user.sub, submission)
 
-        # Get AI assessment
-        ai_result = await assess_submission_with_ai(
-            submission.submitted_prompt,
-            exercise_row["title"],
-            exercise_scenario,
-        )
 
-        # Store submission in the new submissions table
-        submission_query = """
-        INSERT INTO submissions 
-        (user_id, lesson_id, lesson_content_id, submitted_prompt, score, feedback)
-        VALUES ($1, $2, $3, $4, $5, $6)
-        RETURNING id
-        """
+async def grade_exercise_submission(user_id: str, submission: ExerciseSubmission) -> SubmissionResult:
+    """Assess an exercise submission with the LLM and store it"""
+    # Get exercise details from lesson_content; no connection is held while grading
+    exercise = await get_exercise_for_grading(submission.lesson_content_id, submission.lesson_id)
+    if not exercise:
+        raise HTTPException(status_code=404, detail="Practice exercise not found")
+
+    # Get AI assessment
+    ai_result = await assess_submission_with_ai(
+        submission.submitted_prompt,
+        exercise["title"],
+        exercise["scenario"],
+    )
 
+    # Store submission in the new submissions table
+    submission_query = """
+    INSERT INTO submissions 
+    (user_id, lesson_id, lesson_content_id, submitted_prompt, score, feedback)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    RETURNING id
+    """
+
+    async with acquire() as conn:
         submission_id = await conn.fetchval(
             submission_query,
-            user.sub,
+            user_id,
             submission.lesson_id,
             submission.lesson_content_id,
             submission.submitted_prompt,
@@ -177,21 +204,27 @@ async def submit_exercise(submission: ExerciseSubmission, user: AuthorizedUser)
             ai_result["feedback"],
         )
 
-        if not submission_id:
-            raise HTTPException(status_code=500, detail="Failed to save submission")
+    if not submission_id:
+        raise HTTPException(status_code=500, detail="Failed to save submission")
 
-        return SubmissionResult(
-            id=submission_id,
-            score=ai_result["score"],
-            feedback=ai_result["feedback"],
-        )
-    finally:
-        await conn.close()
+    return SubmissionResult(
+        id=submission_id,
+        score=ai_result["score"],
+        feedback=ai_result["feedback"],
+    )
+
+
+async def run_exercise_grading_job(user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    result = await grade_exercise_submission(user_id, ExerciseSubmission(**payload))
+    return result.model_dump()
+
+
+grading_queue.register("exercise", run_exercise_grading_job)
 
 
 async def assess_submission_with_ai(submitted_prompt: str, exercise_title: str, scenario: str) -> dict:
     """Use Azure OpenAI to assess user submission for a practice exercise"""
-    client = get_azure_openai_client()
+    client = require_llm_client()
 
     assessment_prompt = f"""
 You are an AI tutor assessing a student's practice exercise submission.
@@ -216,8 +249,8 @@ Respond ONLY with a valid JSON object in the following format:
 """
 
     try:
-        response = client.chat.completions.create(
-            model="myvng-gpt4o-2ca9",
+        response = await client.chat.completions.create(
+            model=LLM_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -230,11 +263,12 @@ Respond ONLY with a valid JSON object in the following format:
             response_format={"type": "json_object"},
         )
 
+        record_usage(response)
         ai_response = response.choices[0].message.content
         result = json.loads(ai_response)
         return result
     except Exception as e:
-        print(f"AI assessment error: {e}")
+        logger.exception(f"AI assessment error: {e}")
         # Fallback assessment in case of API or parsing error
         return {
             "score": 75,
@@ -243,21 +277,17 @@ Respond ONLY with a valid JSON object in the following format:
 
 
 @router.get("/exercises/{exercise_id}/submissions", response_model=List[SubmissionResult])
-async def get_user_submissions(exercise_id: int, user: AuthorizedUser) -> List[SubmissionResult]:
+async def get_user_submissions(exercise_id: int, user: AuthorizedUser, conn: DbConnection) -> List[SubmissionResult]:
     """Get user's previous submissions for an exercise"""
-    conn = await get_db()
-    try:
-        query = """
-        SELECT id, score, feedback
-        FROM submissions
-        WHERE user_id = $1 AND lesson_content_id = $2
-        ORDER BY submitted_at DESC
-        LIMIT 5
-        """
-
-        rows = await conn.fetch(query, user.sub, exercise_id)
-
-        return [SubmissionResult(id=row["id"], score=row["score"], feedback=row["feedback"]) for row in rows]
-    finally:
-        await conn.close()
+    query = """
+    SELECT id, score, feedback
+    FROM submissions
+    WHERE user_id = $1 AND lesson_content_id = $2
+    ORDER BY submitted_at DESC
+    LIMIT 5
+    """
+
+    rows = await conn.fetch(query, user.sub, exercise_id)
+
+    return [SubmissionResult(id=row["id"], score=row["score"], feedback=row["feedback"]) for row in rows]
 
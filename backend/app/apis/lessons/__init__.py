@@ -1,19 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Response
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-import asyncpg
-import databutton as db
-import json
+import datetime
 import os
 from app.auth import AuthorizedUser
-from app.libs.database import get_db_connection
+from app.libs.database import DbConnection, acquire
+from app.libs.cache import invalidate_user
+from app.libs.catalog import get_catalog
+from app.libs.achievements import award_achievements, update_user_counters
+from app.libs.fast_json import FastJSONResponse
+from app.libs.engagement_buffer import (
+    ENGAGEMENT_WRITE_BEHIND,
+    MAX_ACTION_LENGTH,
+    EngagementBufferFull,
+    EngagementEvent,
+    engagement_buffer,
+    write_engagement_events,
+)
 
 router = APIRouter(prefix="/lessons")
 
-# Database connection
-async def get_db():
-    return await get_db_connection()
-
 # Pydantic models
 class Category(BaseModel):
     id: int
@@ -58,7 +64,7 @@ class Achievement(BaseModel):
 
 class UserEngagement(BaseModel):
     lesson_id: int
-    action: str
+    action: str = Field(max_length=MAX_ACTION_LENGTH)
     metadata: Optional[Dict[str, Any]] = None
 
 class UserStats(BaseModel):
@@ -70,309 +76,325 @@ class UserStats(BaseModel):
     bookmarked_lessons: int
 
 @router.get("/categories")
-async def get_categories(user: AuthorizedUser) -> List[Category]:
+async def get_categories(user: AuthorizedUser, conn: DbConnection) -> List[Category]:
     """Get all lesson categories with user progress"""
-    conn = await get_db()
-    try:
-        # Store/update user profile information
-        # await upsert_user_profile(conn, user)
+    # Store/update user profile information
+    # await upsert_user_profile(conn, user)
+    
+    # Categories and lesson counts come from the catalog; only the user's
+    # completed lessons are read from the database
+    catalog = await get_catalog(conn)
+    completed_ids = await conn.fetch(
+        "SELECT lesson_id FROM user_progress WHERE user_id = $1 AND status = 'completed'",
+        user.sub
+    )
+    completed_by_category: Dict[int, int] = {}
+    for row in completed_ids:
+        lesson = catalog.lessons_by_id.get(row['lesson_id'])
+        if lesson and lesson['is_published']:
+            completed_by_category[lesson['category_id']] = completed_by_category.get(lesson['category_id'], 0) + 1
+    
+    categories = []
+    for row in catalog.categories:
+        lesson_count = len(catalog.lessons_by_category.get(row['id'], []))
+        completed_lessons = completed_by_category.get(row['id'], 0)
+        progress_percentage = 0.0
+        if lesson_count > 0:
+            progress_percentage = (completed_lessons / lesson_count) * 100
         
-        # Get categories with lesson counts and user progress
-        query = """
-        SELECT 
-            c.id, c.name, c.description, c.icon, c.color, 
-            c.difficulty_level, c.order_index,
-            COUNT(l.id) as lesson_count,
-            COUNT(CASE WHEN up.status = 'completed' THEN 1 END) as completed_lessons
-        FROM categories c
-        LEFT JOIN lessons l ON c.id = l.category_id AND l.is_published = true
-        LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $1
-        GROUP BY c.id, c.name, c.description, c.icon, c.color, c.difficulty_level, c.order_index
-        ORDER BY c.order_index
+        categories.append(Category(
+            id=row['id'],
+            name=row['name'],
+            description=row['description'],
+            icon=row['icon'],
+            color=row['color'],
+            difficulty_level=row['difficulty_level'],
+            order_index=row['order_index'],
+            lesson_count=lesson_count,
+            completed_lessons=completed_lessons,
+            progress_percentage=round(progress_percentage, 1)
+        ))
+    
+    return categories
+
+async def get_lesson_overlay(conn, user_id: str, lesson_ids: List[int]) -> Dict[int, Any]:
+    """The user's progress and bookmark rows for the given lessons, keyed by lesson id"""
+    rows = await conn.fetch(
         """
-        
-        rows = await conn.fetch(query, user.sub)
-        
-        categories = []
-        for row in rows:
-            progress_percentage = 0.0
-            if row['lesson_count'] > 0:
-                progress_percentage = (row['completed_lessons'] / row['lesson_count']) * 100
-            
-            categories.append(Category(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                icon=row['icon'],
-                color=row['color'],
-                difficulty_level=row['difficulty_level'],
-                order_index=row['order_index'],
-                lesson_count=row['lesson_count'],
-                completed_lessons=row['completed_lessons'],
-                progress_percentage=round(progress_percentage, 1)
-            ))
-        
-        return categories
-    finally:
-        await conn.close()
+        SELECT 
+            COALESCE(up.lesson_id, ub.lesson_id) as lesson_id,
+            up.status, up.progress_percentage,
+            ub.lesson_id IS NOT NULL as is_bookmarked
+        FROM (
+            SELECT lesson_id, status, progress_percentage FROM user_progress
+            WHERE user_id = $1 AND lesson_id = ANY($2::int[])
+        ) up
+        FULL JOIN (
+            SELECT lesson_id FROM user_bookmarks
+            WHERE user_id = $1 AND lesson_id = ANY($2::int[])
+        ) ub ON up.lesson_id = ub.lesson_id
+        """,
+        user_id, lesson_ids
+    )
+    return {row['lesson_id']: row for row in rows}
 
-@router.get("/categories/{category_id}/lessons")
-async def get_lessons_by_category(category_id: int, user: AuthorizedUser) -> List[Lesson]:
+@router.get("/categories/{category_id}/lessons", response_model=List[Lesson])
+async def get_lessons_by_category(category_id: int, user: AuthorizedUser, conn: DbConnection) -> Response:
     """Get lessons for a specific category with user progress"""
-    conn = await get_db()
-    try:
-        # Store/update user profile information
-        # await upsert_user_profile(conn, user)
-        
-        query = """
-        SELECT 
+    # Store/update user profile information
+    # await upsert_user_profile(conn, user)
+    
+    catalog = await get_catalog(conn)
+    category_lessons = catalog.lessons_by_category.get(category_id, [])
+    if not category_lessons:
+        return FastJSONResponse([])
+    overlay = await get_lesson_overlay(conn, user.sub, [row['id'] for row in category_lessons])
+    
+    lessons = []
+    for row in category_lessons:
+        user_row = overlay.get(row['id'])
+        # Catalog rows are trusted: encode Lesson-shaped dicts without validation
+        lessons.append(dict(
+            id=row['id'],
+            title=row['title'],
+            description=row['description'],
+            category_id=row['category_id'],
+            difficulty_level=row['difficulty_level'],
+            estimated_duration=row['estimated_duration'],
+            preview_content=row['preview_content'],
+            learning_objectives=row['learning_objectives'],
+            workplace_scenario=row['workplace_scenario'],
+            order_index=row['order_index'],
+            is_bookmarked=user_row['is_bookmarked'] if user_row else False,
+            progress_status=(user_row and user_row['status']) or 'not_started',
+            progress_percentage=(user_row and user_row['progress_percentage']) or 0
+        ))
+    
+    return FastJSONResponse(lessons)
+
+@router.get("/recommendations")
+async def get_personalized_recommendations(user: AuthorizedUser, conn: DbConnection, limit: int = 6) -> List[Lesson]:
+    """Get personalized lesson recommendations based on user progress and engagement"""
+    # Algorithm: Recommend lessons from categories user has engaged with,
+    # prioritizing next lessons in sequence and similar difficulty levels
+    query = """
+    WITH user_categories AS (
+        SELECT DISTINCT l.category_id, COUNT(*) as engagement_count
+        FROM user_engagement ue
+        JOIN lessons l ON ue.lesson_id = l.id
+        WHERE ue.user_id = $1
+        GROUP BY l.category_id
+    ),
+    recommended_lessons AS (
+        SELECT DISTINCT
             l.id, l.title, l.description, l.category_id, l.difficulty_level,
             l.estimated_duration, l.preview_content, l.learning_objectives,
             l.workplace_scenario, l.order_index,
             COALESCE(up.status, 'not_started') as progress_status,
             COALESCE(up.progress_percentage, 0) as progress_percentage,
-            CASE WHEN ub.id IS NOT NULL THEN true ELSE false END as is_bookmarked
+            CASE WHEN ub.id IS NOT NULL THEN true ELSE false END as is_bookmarked,
+            CASE 
+                WHEN uc.category_id IS NOT NULL THEN uc.engagement_count * 2
+                ELSE 1
+            END as priority_score
         FROM lessons l
-        LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $2
-        LEFT JOIN user_bookmarks ub ON l.id = ub.lesson_id AND ub.user_id = $2
-        WHERE l.category_id = $1 AND l.is_published = true
-        ORDER BY l.order_index
-        """
-        
-        rows = await conn.fetch(query, category_id, user.sub)
-        
-        lessons = []
-        for row in rows:
-            lessons.append(Lesson(
-                id=row['id'],
-                title=row['title'],
-                description=row['description'],
-                category_id=row['category_id'],
-                difficulty_level=row['difficulty_level'],
-                estimated_duration=row['estimated_duration'],
-                preview_content=row['preview_content'],
-                learning_objectives=json.loads(row['learning_objectives']) if os.getenv('DB_LOCAL') == 'True' else row['learning_objectives'],
-                workplace_scenario=row['workplace_scenario'],
-                order_index=row['order_index'],
-                is_bookmarked=row['is_bookmarked'],
-                progress_status=row['progress_status'],
-                progress_percentage=row['progress_percentage']
-            ))
-        
-        return lessons
-    finally:
-        await conn.close()
-
-@router.get("/recommendations")
-async def get_personalized_recommendations(user: AuthorizedUser, limit: int = 6) -> List[Lesson]:
-    """Get personalized lesson recommendations based on user progress and engagement"""
-    conn = await get_db()
-    try:
-        # Algorithm: Recommend lessons from categories user has engaged with,
-        # prioritizing next lessons in sequence and similar difficulty levels
-        query = """
-        WITH user_categories AS (
-            SELECT DISTINCT l.category_id, COUNT(*) as engagement_count
-            FROM user_engagement ue
-            JOIN lessons l ON ue.lesson_id = l.id
-            WHERE ue.user_id = $1
-            GROUP BY l.category_id
-        ),
-        recommended_lessons AS (
-            SELECT DISTINCT
-                l.id, l.title, l.description, l.category_id, l.difficulty_level,
-                l.estimated_duration, l.preview_content, l.learning_objectives,
-                l.workplace_scenario, l.order_index,
-                COALESCE(up.status, 'not_started') as progress_status,
-                COALESCE(up.progress_percentage, 0) as progress_percentage,
-                CASE WHEN ub.id IS NOT NULL THEN true ELSE false END as is_bookmarked,
-                CASE 
-                    WHEN uc.category_id IS NOT NULL THEN uc.engagement_count * 2
-                    ELSE 1
-                END as priority_score
-            FROM lessons l
-            LEFT JOIN user_categories uc ON l.category_id = uc.category_id
-            LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $1
-            LEFT JOIN user_bookmarks ub ON l.id = ub.lesson_id AND ub.user_id = $1
-            WHERE l.is_published = true 
-            AND (up.status IS NULL OR up.status = 'not_started')
-            ORDER BY priority_score DESC, l.order_index
-            LIMIT $2
-        )
-        SELECT * FROM recommended_lessons
-        """
-        
-        rows = await conn.fetch(query, user.sub, limit)
-        
-        recommendations = []
-        for row in rows:
-            recommendations.append(Lesson(
-                id=row['id'],
-                title=row['title'],
-                description=row['description'],
-                category_id=row['category_id'],
-                difficulty_level=row['difficulty_level'],
-                estimated_duration=row['estimated_duration'],
-                preview_content=row['preview_content'],
-                learning_objectives=row['learning_objectives'],
-                workplace_scenario=row['workplace_scenario'],
-                order_index=row['order_index'],
-                is_bookmarked=row['is_bookmarked'],
-                progress_status=row['progress_status'],
-                progress_percentage=row['progress_percentage']
-            ))
-        
-        return recommendations
-    finally:
-        await conn.close()
+        LEFT JOIN user_categories uc ON l.category_id = uc.category_id
+        LEFT JOIN user_progress up ON l.id = up.lesson_id AND up.user_id = $1
+        LEFT JOIN user_bookmarks ub ON l.id = ub.lesson_id AND ub.user_id = $1
+        WHERE l.is_published = true 
+        AND (up.status IS NULL OR up.status = 'not_started')
+        ORDER BY priority_score DESC, l.order_index
+        LIMIT $2
+    )
+    SELECT * FROM recommended_lessons
+    """
+    
+    rows = await conn.fetch(query, user.sub, limit)
+    
+    recommendations = []
+    for row in rows:
+        recommendations.append(Lesson(
+            id=row['id'],
+            title=row['title'],
+            description=row['description'],
+            category_id=row['category_id'],
+            difficulty_level=row['difficulty_level'],
+            estimated_duration=row['estimated_duration'],
+            preview_content=row['preview_content'],
+            learning_objectives=row['learning_objectives'],
+            workplace_scenario=row['workplace_scenario'],
+            order_index=row['order_index'],
+            is_bookmarked=row['is_bookmarked'],
+            progress_status=row['progress_status'],
+            progress_percentage=row['progress_percentage']
+        ))
+    
+    return recommendations
 
-@router.get("/achievements")
-async def get_user_achievements(user: AuthorizedUser) -> List[Achievement]:
+@router.get("/achievements", response_model=List[Achievement])
+async def get_user_achievements(user: AuthorizedUser, conn: DbConnection) -> Response:
     """Get all achievements with user's earned status"""
-    conn = await get_db()
-    try:
-        query = """
-        SELECT 
-            a.id, a.name, a.description, a.icon, a.reward_points,
-            CASE WHEN ua.id IS NOT NULL THEN true ELSE false END as is_earned,
-            ua.earned_at
-        FROM achievements a
-        LEFT JOIN user_achievements ua ON a.id = ua.achievement_id AND ua.user_id = $1
-        ORDER BY a.id
-        """
-        
-        rows = await conn.fetch(query, user.sub)
-        
-        achievements = []
-        for row in rows:
-            achievements.append(Achievement(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                icon=row['icon'],
-                reward_points=row['reward_points'],
-                is_earned=row['is_earned'],
-                earned_at=str(row['earned_at']) if row['earned_at'] else None
-            ))
-        
-        return achievements
-    finally:
-        await conn.close()
+    query = """
+    SELECT 
+        a.id, a.name, a.description, a.icon, a.reward_points,
+        CASE WHEN ua.id IS NOT NULL THEN true ELSE false END as is_earned,
+        ua.earned_at
+    FROM achievements a
+    LEFT JOIN user_achievements ua ON a.id = ua.achievement_id AND ua.user_id = $1
+    ORDER BY a.id
+    """
+    
+    rows = await conn.fetch(query, user.sub)
+    
+    achievements = []
+    for row in rows:
+        achievements.append(dict(
+            id=row['id'],
+            name=row['name'],
+            description=row['description'],
+            icon=row['icon'],
+            reward_points=row['reward_points'],
+            is_earned=row['is_earned'],
+            earned_at=str(row['earned_at']) if row['earned_at'] else None
+        ))
+    
+    return FastJSONResponse(achievements)
 
 @router.get("/stats")
-async def get_user_stats(user: AuthorizedUser) -> UserStats:
+async def get_user_stats(user: AuthorizedUser, conn: DbConnection) -> UserStats:
     """Get user learning statistics"""
-    conn = await get_db()
-    try:
-        # Get comprehensive user statistics
-        stats_query = """
-        WITH user_stats AS (
-            SELECT 
-                COUNT(CASE WHEN up.status = 'completed' THEN 1 END) as completed_lessons,
-                COUNT(DISTINCT l.category_id) FILTER (WHERE up.status = 'completed') as categories_explored,
-                COUNT(ub.id) as bookmarked_lessons
-            FROM user_progress up
-            RIGHT JOIN lessons l ON up.lesson_id = l.id
-            LEFT JOIN user_bookmarks ub ON ub.user_id = up.user_id
-            WHERE up.user_id = $1 OR up.user_id IS NULL
-        ),
-        achievement_stats AS (
-            SELECT 
-                COUNT(*) as achievements_earned,
-                COALESCE(SUM(a.reward_points), 0) as total_points
-            FROM user_achievements ua
-            JOIN achievements a ON ua.achievement_id = a.id
-            WHERE ua.user_id = $1
-        )
+    # Get comprehensive user statistics
+    stats_query = """
+    WITH user_stats AS (
         SELECT 
-            COALESCE(us.completed_lessons, 0) as total_lessons_completed,
-            COALESCE(us.categories_explored, 0) as total_categories_explored,
-            COALESCE(us.bookmarked_lessons, 0) as bookmarked_lessons,
-            COALESCE(ach.achievements_earned, 0) as achievements_earned,
-            COALESCE(ach.total_points, 0) as total_points
-        FROM user_stats us
-        CROSS JOIN achievement_stats ach
-        """
-        
-        row = await conn.fetchrow(stats_query, user.sub)
-        
-        # Calculate current streak (simplified - days with any lesson activity)
-        streak_query = """
-        SELECT COUNT(*) as streak
-        FROM (
-            SELECT DISTINCT DATE(created_at) as activity_date
-            FROM user_engagement
-            WHERE user_id = $1 
-            AND created_at >= CURRENT_DATE - INTERVAL '30 days'
-            ORDER BY activity_date DESC
-        ) daily_activity
-        """
-        
-        streak_row = await conn.fetchrow(streak_query, user.sub)
-        current_streak = streak_row['streak'] if streak_row else 0
-        
-        return UserStats(
-            total_lessons_completed=row['total_lessons_completed'],
-            total_categories_explored=row['total_categories_explored'],
-            current_streak=current_streak,
-            total_points=row['total_points'],
-            achievements_earned=row['achievements_earned'],
-            bookmarked_lessons=row['bookmarked_lessons']
-        )
-    finally:
-        await conn.close()
+            COUNT(CASE WHEN up.status = 'completed' THEN 1 END) as completed_lessons,
+            COUNT(DISTINCT l.category_id) FILTER (WHERE up.status = 'completed') as categories_explored,
+            COUNT(ub.id) as bookmarked_lessons
+        FROM user_progress up
+        RIGHT JOIN lessons l ON up.lesson_id = l.id
+        LEFT JOIN user_bookmarks ub ON ub.user_id = up.user_id
+        WHERE up.user_id = $1 OR up.user_id IS NULL
+    ),
+    achievement_stats AS (
+        SELECT 
+            COUNT(*) as achievements_earned,
+            COALESCE(SUM(a.reward_points), 0) as total_points
+        FROM user_achievements ua
+        JOIN achievements a ON ua.achievement_id = a.id
+        WHERE ua.user_id = $1
+    )
+    SELECT 
+        COALESCE(us.completed_lessons, 0) as total_lessons_completed,
+        COALESCE(us.categories_explored, 0) as total_categories_explored,
+        COALESCE(us.bookmarked_lessons, 0) as bookmarked_lessons,
+        COALESCE(ach.achievements_earned, 0) as achievements_earned,
+        COALESCE(ach.total_points, 0) as total_points
+    FROM user_stats us
+    CROSS JOIN achievement_stats ach
+    """
+    
+    row = await conn.fetchrow(stats_query, user.sub)
+    
+    # Calculate current streak (simplified - days with any lesson activity)
+    streak_query = """
+    SELECT COUNT(*) as streak
+    FROM (
+        SELECT DISTINCT DATE(created_at) as activity_date
+        FROM user_engagement
+        WHERE user_id = $1 
+        AND created_at >= CURRENT_DATE - INTERVAL '30 days'
+        ORDER BY activity_date DESC
+    ) daily_activity
+    """
+    
+    streak_row = await conn.fetchrow(streak_query, user.sub)
+    current_streak = streak_row['streak'] if streak_row else 0
+    
+    return UserStats(
+        total_lessons_completed=row['total_lessons_completed'],
+        total_categories_explored=row['total_categories_explored'],
+        current_streak=current_streak,
+        total_points=row['total_points'],
+        achievements_earned=row['achievements_earned'],
+        bookmarked_lessons=row['bookmarked_lessons']
+    )
 
 @router.post("/engagement")
 async def track_engagement(engagement: UserEngagement, user: AuthorizedUser):
     """Track user engagement with lessons"""
-    conn = await get_db()
-    try:
-        # Insert engagement record
-        await conn.execute(
-            """
-            INSERT INTO user_engagement (user_id, lesson_id, action, metadata)
-            VALUES ($1, $2, $3, $4)
-            """,
-            user.sub, engagement.lesson_id, engagement.action, engagement.metadata
-        )
-        
-        # Check for new achievements
-        await check_and_award_achievements(conn, user.sub)
-        
+    # Events are written in batches after the response, where a bad one would
+    # fail its whole batch; reject unknown lessons up front
+    catalog = await get_catalog()
+    if engagement.lesson_id not in catalog.lessons_by_id:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+
+    event = EngagementEvent(
+        user_id=user.sub,
+        lesson_id=engagement.lesson_id,
+        action=engagement.action,
+        metadata=engagement.metadata,
+        created_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+
+    if ENGAGEMENT_WRITE_BEHIND and engagement_buffer.running:
+        # Written in bulk by the buffer, which also checks achievements per batch
+        try:
+            await engagement_buffer.submit(event)
+        except EngagementBufferFull:
+            raise HTTPException(status_code=503, detail="Too many engagement events, retry shortly", headers={"Retry-After": "1"})
         return {"success": True, "message": "Engagement tracked successfully"}
-    finally:
-        await conn.close()
+
+    async with acquire() as conn:
+        await write_engagement_events(conn, [event])
+    
+    return {"success": True, "message": "Engagement tracked successfully"}
 
 @router.post("/progress")
-async def update_lesson_progress(progress: LessonProgress, user: AuthorizedUser):
+async def update_lesson_progress(progress: LessonProgress, user: AuthorizedUser, conn: DbConnection):
     """Update user's lesson progress"""
-    conn = await get_db()
-    try:
-        # Upsert progress record
-        await conn.execute(
+    async with conn.transaction():
+        # Upsert progress record, capturing the previous status so the
+        # completion counters can be adjusted by the transition alone
+        transition = await conn.fetchrow(
             """
-            INSERT INTO user_progress (user_id, lesson_id, status, progress_percentage, started_at, completed_at, last_accessed_at)
-            VALUES ($1, $2, $3::text, $4, 
-                CASE WHEN $3::text != 'not_started' THEN CURRENT_TIMESTAMP ELSE NULL END,
-                CASE WHEN $3::text = 'completed' THEN CURRENT_TIMESTAMP ELSE NULL END,
-                CURRENT_TIMESTAMP
+            WITH previous AS (
+                SELECT status FROM user_progress
+                WHERE user_id = $1 AND lesson_id = $2
+                FOR UPDATE
+            ),
+            upserted AS (
+                INSERT INTO user_progress (user_id, lesson_id, status, progress_percentage, started_at, completed_at, last_accessed_at)
+                VALUES ($1, $2, $3::text, $4, 
+                    CASE WHEN $3::text != 'not_started' THEN CURRENT_TIMESTAMP ELSE NULL END,
+                    CASE WHEN $3::text = 'completed' THEN CURRENT_TIMESTAMP ELSE NULL END,
+                    CURRENT_TIMESTAMP
+                )
+                ON CONFLICT (user_id, lesson_id)
+                DO UPDATE SET
+                    status = $3::text,
+                    progress_percentage = $4,
+                    started_at = CASE 
+                        WHEN user_progress.started_at IS NULL AND $3::text != 'not_started' 
+                        THEN CURRENT_TIMESTAMP 
+                        ELSE user_progress.started_at 
+                    END,
+                    completed_at = CASE 
+                        WHEN $3::text = 'completed' AND user_progress.completed_at IS NULL 
+                        THEN CURRENT_TIMESTAMP 
+                        ELSE user_progress.completed_at 
+                    END,
+                    last_accessed_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING status
             )
-            ON CONFLICT (user_id, lesson_id)
-            DO UPDATE SET
-                status = $3::text,
-                progress_percentage = $4,
-                started_at = CASE 
-                    WHEN user_progress.started_at IS NULL AND $3::text != 'not_started' 
-                    THEN CURRENT_TIMESTAMP 
-                    ELSE user_progress.started_at 
-                END,
-                completed_at = CASE 
-                    WHEN $3::text = 'completed' AND user_progress.completed_at IS NULL 
-                    THEN CURRENT_TIMESTAMP 
-                    ELSE user_progress.completed_at 
-                END,
-                last_accessed_at = CURRENT_TIMESTAMP,
-                updated_at = CURRENT_TIMESTAMP
+            SELECT
+                (SELECT status FROM previous) AS previous_status,
+                NOT EXISTS (
+                    SELECT 1 FROM user_progress up
+                    JOIN lessons l ON up.lesson_id = l.id
+                    WHERE up.user_id = $1 AND up.status = 'completed' AND up.lesson_id <> $2
+                        AND l.category_id = (SELECT category_id FROM lessons WHERE id = $2)
+                ) AS only_completion_in_category
             """,
             user.sub, progress.lesson_id, progress.status, progress.progress_percentage
         )
@@ -385,21 +407,25 @@ async def update_lesson_progress(progress: LessonProgress, user: AuthorizedUser)
             """,
             user.sub, progress.lesson_id, 
             'complete' if progress.status == 'completed' else 'progress',
-            json.dumps({"progress_percentage": progress.progress_percentage})
+            {"progress_percentage": progress.progress_percentage}
         )
         
         # Check for new achievements
-        await check_and_award_achievements(conn, user.sub)
-        
-        return {"success": True, "message": "Progress updated successfully"}
-    finally:
-        await conn.close()
+        completed_delta = int(progress.status == 'completed') - int(transition['previous_status'] == 'completed')
+        counters = await update_user_counters(
+            conn, user.sub,
+            lessons_completed=completed_delta,
+            categories_explored=completed_delta if transition['only_completion_in_category'] else 0,
+        )
+        await award_achievements(conn, user.sub, counters)
+    invalidate_user(user.sub)
+    
+    return {"success": True, "message": "Progress updated successfully"}
 
 @router.post("/bookmark/{lesson_id}")
-async def toggle_bookmark(lesson_id: int, user: AuthorizedUser):
+async def toggle_bookmark(lesson_id: int, user: AuthorizedUser, conn: DbConnection):
     """Toggle bookmark status for a lesson"""
-    conn = await get_db()
-    try:
+    async with conn.transaction():
         # Check if bookmark exists
         existing = await conn.fetchrow(
             "SELECT id FROM user_bookmarks WHERE user_id = $1 AND lesson_id = $2",
@@ -433,57 +459,12 @@ async def toggle_bookmark(lesson_id: int, user: AuthorizedUser):
         )
         
         # Check for new achievements
-        await check_and_award_achievements(conn, user.sub)
-        
-        return {
-            "success": True, 
-            "is_bookmarked": is_bookmarked,
-            "message": f"Lesson {'bookmarked' if is_bookmarked else 'unbookmarked'} successfully"
-        }
-    finally:
-        await conn.close()
-
-async def check_and_award_achievements(conn, user_id: str):
-    """Check and award achievements based on user activity"""
-    # Get user stats for achievement checking
-    stats = await conn.fetchrow(
-        """
-        SELECT 
-            COUNT(CASE WHEN up.status = 'completed' THEN 1 END) as completed_lessons,
-            COUNT(DISTINCT l.category_id) FILTER (WHERE up.status = 'completed') as categories_explored,
-            COUNT(DISTINCT ue.lesson_id) FILTER (WHERE ue.action = 'preview') as previews,
-            COUNT(ub.id) as bookmarks
-        FROM user_progress up
-        RIGHT JOIN lessons l ON up.lesson_id = l.id
-        LEFT JOIN user_engagement ue ON ue.user_id = up.user_id
-        LEFT JOIN user_bookmarks ub ON ub.user_id = up.user_id
-        WHERE up.user_id = $1 OR up.user_id IS NULL
-        """,
-        user_id
-    )
-    
-    # Check each achievement criteria
-    achievement_checks = [
-        (1, stats['completed_lessons'] >= 1),  # First Steps
-        (3, stats['completed_lessons'] >= 5),  # Quick Learner (simplified)
-        (5, stats['previews'] >= 10),  # Preview Master
-        (6, stats['bookmarks'] >= 15),  # Bookworm
-        (7, stats['completed_lessons'] >= 10),  # AI Apprentice
-        (8, stats['categories_explored'] >= 5),  # AI Master
-    ]
+        counters = await update_user_counters(conn, user.sub, bookmarks=1 if is_bookmarked else -1)
+        await award_achievements(conn, user.sub, counters)
+    invalidate_user(user.sub)
     
-    for achievement_id, criteria_met in achievement_checks:
-        if criteria_met:
-            # Check if user already has this achievement
-            existing = await conn.fetchrow(
-                "SELECT id FROM user_achievements WHERE user_id = $1 AND achievement_id = $2",
-                user_id, achievement_id
-            )
-            
-            if not existing:
-                # Award achievement
-                await conn.execute(
-                    "INSERT INTO user_achievements (user_id, achievement_id) VALUES ($1, $2)",
-                    user_id, achievement_id
-                )
-
+    return {
+        "success": True, 
+        "is_bookmarked": is_bookmarked,
+        "message": f"Lesson {'bookmarked' if is_bookmarked else 'unbookmarked'} successfully"
+    }
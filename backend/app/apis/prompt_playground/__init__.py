@@ -1,10 +1,14 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import databutton as db
-from openai import AzureOpenAI
+import anyio
+import logging
+import time
+from app.libs.llm import LLM_MODEL, get_llm_client, record_first_token, record_streamed_tokens
 
 # --- API Router ---
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -13,39 +17,25 @@ class PromptPlaygroundRequest(BaseModel):
     prompt: str
 
 
-# --- Azure OpenAI Client ---
-def get_azure_openai_client():
-    try:
-        api_key = db.secrets.get("AZURE_OPENAI_API_KEY")
-        azure_endpoint = db.secrets.get("AZURE_OPENAI_ENDPOINT")
-        if not api_key or not azure_endpoint:
-            raise ValueError("Azure OpenAI credentials are not fully configured.")
-
-        return AzureOpenAI(
-            api_key=api_key,
-            api_version="2024-02-01",
-            azure_endpoint=azure_endpoint,
-        )
-    except Exception as e:
-        print(f"Error initializing Azure OpenAI client: {e}")
-        return None
-
-
 # --- Streaming Logic ---
-async def generate_responses(prompt: str):
+async def generate_responses(prompt: str, request: Request):
     """
     Asynchronously generates responses from the AI model and yields them chunk by chunk.
+    The upstream stream is closed as soon as the HTTP client goes away.
     """
-    client = get_azure_openai_client()
+    client = get_llm_client()
     if not client:
         yield "Error: The AI service is not configured. Please contact support."
         return
 
     system_prompt = "You are a helpful AI assistant. The user is in a 'playground' environment, so feel free to be creative and helpful in your responses."
 
+    response = None
+    chunks = 0
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
-            model="myvng-gpt4o-2ca9",
+        response = await client.chat.completions.create(
+            model=LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt},
@@ -54,20 +44,34 @@ async def generate_responses(prompt: str):
             temperature=0.7,
         )
 
-        for chunk in response:
+        async for chunk in response:
+            if await request.is_disconnected():
+                break
             if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                if chunks == 0:
+                    record_first_token(started)
+                chunks += 1
                 yield chunk.choices[0].delta.content
 
     except Exception as e:
-        print(f"An error occurred during AI generation: {e}")
+        logger.exception(f"An error occurred during AI generation: {e}")
         yield f"An unexpected error occurred: {e}"
 
+    finally:
+        record_streamed_tokens(chunks)
+        # Runs on normal completion, on errors and when the response task is
+        # cancelled by a client disconnect; shielded so cleanup is not cancelled too.
+        # Closing the stream returns its connection to the shared client's pool
+        if response is not None:
+            with anyio.CancelScope(shield=True):
+                await response.close()
+
 
 # --- API Endpoint ---
 @router.post("/playground", tags=["stream"])
-async def run_prompt_playground(request: PromptPlaygroundRequest):
+async def run_prompt_playground(body: PromptPlaygroundRequest, request: Request):
     """
     Accepts a user's prompt and streams a response from the AI model.
     This endpoint is designed for the open-ended prompt playground.
     """
-    return StreamingResponse(generate_responses(request.prompt), media_type="text/plain")
+    return StreamingResponse(generate_responses(body.prompt, request), media_type="text/plain")
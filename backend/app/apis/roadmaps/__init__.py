@@ -1,18 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 import asyncpg
-import databutton as db
 from app.auth import AuthorizedUser
 import datetime
-from app.libs.database import get_db_connection
+from app.libs.database import DbConnection
+from app.libs.cache import invalidate_user
+from app.libs.catalog import get_catalog, invalidate_catalog
 
 router = APIRouter(prefix="/roadmaps")
 
-# Database connection
-async def get_db():
-    return await get_db_connection()
-
 # Pydantic Models
 class Roadmap(BaseModel):
     id: int
@@ -52,98 +49,90 @@ class UserRoadmap(BaseModel):
 # API Endpoints
 
 @router.get("/", response_model=List[Roadmap])
-async def get_all_roadmaps(conn: asyncpg.Connection = Depends(get_db)):
+async def get_all_roadmaps():
     """
     Retrieves a list of all available learning roadmaps.
     """
-    try:
-        rows = await conn.fetch("SELECT * FROM roadmaps ORDER BY id;")
-        return [Roadmap(**row) for row in rows]
-    finally:
-        await conn.close()
+    catalog = await get_catalog()
+    return [Roadmap(**row) for row in catalog.roadmaps]
 
 @router.get("/my-roadmap", response_model=Optional[UserRoadmapProgress])
-async def get_my_roadmap(user: AuthorizedUser, conn: asyncpg.Connection = Depends(get_db)):
+async def get_my_roadmap(user: AuthorizedUser, conn: DbConnection):
     """
     Gets the active roadmap, progress, and current item for the authenticated user.
     """
     user_id = user.sub
-    try:
-        # Find the user's most recent active roadmap
-        enrollment = await conn.fetchrow(
-            "SELECT * FROM user_roadmaps WHERE user_id = $1 AND status = 'in_progress' ORDER BY started_at DESC LIMIT 1",
-            user_id,
-        )
-        if not enrollment:
-            return None
-
-        # Get roadmap details
-        roadmap_details = await conn.fetchrow("SELECT * FROM roadmaps WHERE id = $1", enrollment['roadmap_id'])
-
-        # Get total and completed item counts
-        counts = await conn.fetchrow(
-            """
-            SELECT
-                COUNT(i.id) AS total_items,
-                COUNT(p.id) AS completed_items
-            FROM roadmap_items i
-            LEFT JOIN user_roadmap_item_progress p ON i.id = p.roadmap_item_id AND p.user_roadmap_id = $2 AND p.is_completed = TRUE
-            WHERE i.roadmap_id = $1
-            """,
-            enrollment['roadmap_id'],
-            enrollment['id']
-        )
-
-        # Get current item details
-        current_item = None
-        if enrollment['current_item_id']:
-            current_item_row = await conn.fetchrow("SELECT * FROM roadmap_items WHERE id = $1", enrollment['current_item_id'])
-            if current_item_row:
-                current_item = RoadmapItem(**current_item_row)
-
-        return UserRoadmapProgress(
-            roadmap=Roadmap(**roadmap_details),
-            total_items=counts['total_items'],
-            completed_items=counts['completed_items'],
-            current_item=current_item,
-        )
-    finally:
-        await conn.close()
+    catalog = await get_catalog(conn)
+    # Find the user's most recent active roadmap and how many of its items they completed;
+    # the roadmap and its items come from the catalog
+    enrollment = await conn.fetchrow(
+        """
+        SELECT
+            ur.roadmap_id,
+            ur.current_item_id,
+            (
+                SELECT COUNT(*) FROM user_roadmap_item_progress p
+                JOIN roadmap_items i ON i.id = p.roadmap_item_id AND i.roadmap_id = ur.roadmap_id
+                WHERE p.user_roadmap_id = ur.id AND p.is_completed = TRUE
+            ) AS completed_items
+        FROM user_roadmaps ur
+        WHERE ur.user_id = $1 AND ur.status = 'in_progress'
+        ORDER BY ur.started_at DESC
+        LIMIT 1
+        """,
+        user_id,
+    )
+    if not enrollment:
+        return None
+
+    if enrollment['roadmap_id'] not in catalog.roadmaps_by_id:
+        # Enrolled in a roadmap added since the catalog was loaded
+        invalidate_catalog()
+        catalog = await get_catalog(conn)
+    roadmap_details = catalog.roadmaps_by_id[enrollment['roadmap_id']]
+
+    # Get current item details
+    current_item = None
+    if enrollment['current_item_id']:
+        current_item_row = catalog.roadmap_items_by_id.get(enrollment['current_item_id'])
+        if current_item_row:
+            current_item = RoadmapItem(**current_item_row)
+
+    return UserRoadmapProgress(
+        roadmap=Roadmap(**roadmap_details),
+        total_items=len(catalog.roadmap_items_by_roadmap.get(enrollment['roadmap_id'], [])),
+        completed_items=enrollment['completed_items'],
+        current_item=current_item,
+    )
 
 @router.get("/{roadmap_id}", response_model=RoadmapDetail)
-async def get_roadmap_details(roadmap_id: int, conn: asyncpg.Connection = Depends(get_db)):
+async def get_roadmap_details(roadmap_id: int):
     """
     Retrieves the details and items for a specific roadmap.
     """
-    try:
-        # Fetch roadmap details
-        roadmap_row = await conn.fetchrow("SELECT * FROM roadmaps WHERE id = $1", roadmap_id)
-        if not roadmap_row:
-            raise HTTPException(status_code=404, detail="Roadmap not found")
-
-        # Fetch roadmap items
-        item_rows = await conn.fetch(
-            "SELECT * FROM roadmap_items WHERE roadmap_id = $1 ORDER BY order_index",
-            roadmap_id,
-        )
-
-        return RoadmapDetail(
-            **roadmap_row,
-            items=[RoadmapItem(**row) for row in item_rows]
-        )
-    finally:
-        await conn.close()
+    catalog = await get_catalog()
+    roadmap_row = catalog.roadmaps_by_id.get(roadmap_id)
+    if not roadmap_row:
+        raise HTTPException(status_code=404, detail="Roadmap not found")
+
+    return RoadmapDetail(
+        **roadmap_row,
+        items=[RoadmapItem(**row) for row in catalog.roadmap_items_by_roadmap.get(roadmap_id, [])]
+    )
 
 @router.post("/{roadmap_id}/enroll")
 async def enroll_in_roadmap(
     roadmap_id: int,
     user: AuthorizedUser,
-    conn: asyncpg.Connection = Depends(get_db),
+    conn: DbConnection,
 ):
     """
     Enrolls the authenticated user in a specific roadmap.
     """
     user_id = user.sub
+    # Looked up before the transaction: a catalog refresh runs on this
+    # connection in its own snapshot
+    catalog = await get_catalog(conn)
     try:
         async with conn.transaction():
             # Check if user is already enrolled
@@ -156,10 +145,8 @@ async def enroll_in_roadmap(
                 raise HTTPException(status_code=409, detail="User already enrolled in this roadmap.")
 
             # Find the first item in the roadmap
-            first_item = await conn.fetchrow(
-                "SELECT id FROM roadmap_items WHERE roadmap_id = $1 ORDER BY order_index ASC LIMIT 1",
-                roadmap_id,
-            )
+            items = catalog.roadmap_items_by_roadmap.get(roadmap_id)
+            first_item = items[0] if items else None
             if not first_item:
                 raise HTTPException(status_code=404, detail="Roadmap has no items to start.")
 
@@ -173,10 +160,9 @@ async def enroll_in_roadmap(
                 roadmap_id,
                 first_item['id'],
             )
+        invalidate_user(user_id)
         return {"message": "Successfully enrolled in roadmap."}
     except asyncpg.exceptions.UniqueViolationError:
          raise HTTPException(status_code=409, detail="User already enrolled in this roadmap.")
-    finally:
-        await conn.close()
 
 
@@ -0,0 +1,191 @@
+"""Achievement progress engine.
+
+The achievements catalog (with its JSON `criteria`) is loaded and compiled
+once per process and refreshed every ACHIEVEMENT_CATALOG_TTL seconds. Every
+metric a criterion can reference is computed for a user in one aggregate
+query, and all achievements are then evaluated in memory, so the number of
+queries does not grow with the size of the catalog.
+
+Awarding works the same way on the write path: writes apply deltas to the
+user's row in `user_counters`, and the returned counters are checked against
+the catalog, with every newly earned achievement inserted in one statement.
+
+Usage:
+
+    from app.libs.achievements import get_achievement_catalog, get_user_metrics
+
+    catalog = await get_achievement_catalog(conn)
+    metrics = await get_user_metrics(conn, user.sub)
+    for rule in catalog:
+        current, target = rule.progress(metrics)
+
+    counters = await update_user_counters(conn, user.sub, bookmarks=1)
+    await award_achievements(conn, user.sub, counters)
+"""
+
+import os
+import time
+from typing import Any, NamedTuple
+
+# Criterion types understood by the engine, mapped to the metric they read
+METRIC_ALIASES = {
+    "lessons_completed": "lessons_completed",
+    "lesson_previews": "lesson_previews",
+    "previews": "lesson_previews",
+    "bookmarks": "bookmarks",
+    "categories_explored": "categories_explored",
+    "practice_sessions": "practice_sessions",
+    "learning_streak": "learning_streak",
+}
+
+USER_METRICS_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM user_progress
+        WHERE user_id = $1 AND status = 'completed') AS lessons_completed,
+    (SELECT COUNT(DISTINCT l.category_id) FROM user_progress up
+        JOIN lessons l ON up.lesson_id = l.id
+        WHERE up.user_id = $1 AND up.status = 'completed') AS categories_explored,
+    (SELECT COUNT(DISTINCT lesson_id) FROM user_engagement
+        WHERE user_id = $1 AND action = 'preview') AS lesson_previews,
+    (SELECT COUNT(*) FROM user_bookmarks WHERE user_id = $1) AS bookmarks,
+    (SELECT total_sessions FROM practice_stats WHERE user_id = $1) AS practice_sessions,
+    (SELECT current_streak_days FROM practice_stats WHERE user_id = $1) AS learning_streak
+"""
+
+ACHIEVEMENT_CATALOG_TTL = float(os.environ.get("ACHIEVEMENT_CATALOG_TTL", "300"))
+
+
+class AchievementRule(NamedTuple):
+    id: int
+    name: str
+    description: str
+    icon: str
+    reward_points: int
+    # None when the criteria are missing or reference an unknown metric
+    metric: str | None
+    target: int | None
+
+    def progress(self, metrics: dict[str, int]) -> tuple[int | None, int | None]:
+        """Return (current, target) for this achievement, or (None, None) if untracked"""
+        if self.metric is None:
+            return None, None
+        return metrics.get(self.metric, 0), self.target
+
+    def is_met(self, metrics: dict[str, int]) -> bool:
+        current, target = self.progress(metrics)
+        return current is not None and current >= target
+
+
+def compile_criteria(criteria: Any) -> tuple[str | None, int | None]:
+    """Parse an achievements.criteria value into (metric, target)"""
+    if not criteria:
+        return None, None
+    if not isinstance(criteria, dict):
+        return None, None
+
+    metric = METRIC_ALIASES.get(criteria.get("type"))
+    if metric is None:
+        return None, None
+    return metric, int(criteria.get("count", criteria.get("target", 1)))
+
+
+_catalog: list[AchievementRule] | None = None
+_catalog_loaded_at = 0.0
+
+
+async def get_achievement_catalog(conn) -> list[AchievementRule]:
+    """Compiled achievements ordered by id, loaded at most once per TTL"""
+    global _catalog, _catalog_loaded_at
+    if _catalog is None or time.monotonic() - _catalog_loaded_at > ACHIEVEMENT_CATALOG_TTL:
+        rows = await conn.fetch(
+            "SELECT id, name, description, icon, reward_points, criteria FROM achievements ORDER BY id"
+        )
+        _catalog = [
+            AchievementRule(
+                row["id"], row["name"], row["description"], row["icon"], row["reward_points"],
+                *compile_criteria(row["criteria"]),
+            )
+            for row in rows
+        ]
+        _catalog_loaded_at = time.monotonic()
+    return _catalog
+
+
+def reset_achievement_catalog():
+    """Force the next lookup to reload the catalog (e.g. after editing achievements)"""
+    global _catalog
+    _catalog = None
+
+
+async def get_user_metrics(conn, user_id: str) -> dict[str, int]:
+    """Every metric an achievement criterion can reference, in a single query"""
+    row = await conn.fetchrow(USER_METRICS_QUERY, user_id)
+    return {key: value or 0 for key, value in row.items()}
+
+
+# Counters kept in user_counters; practice_sessions and learning_streak are
+# already maintained incrementally in practice_stats
+COUNTER_COLUMNS = ("lessons_completed", "categories_explored", "lesson_previews", "bookmarks")
+
+_PRACTICE_METRICS = """
+    COALESCE((SELECT total_sessions FROM practice_stats WHERE user_id = $1), 0) AS practice_sessions,
+    COALESCE((SELECT current_streak_days FROM practice_stats WHERE user_id = $1), 0) AS learning_streak
+"""
+
+UPDATE_COUNTERS_QUERY = f"""
+UPDATE user_counters SET
+    lessons_completed = GREATEST(lessons_completed + $2, 0),
+    categories_explored = GREATEST(categories_explored + $3, 0),
+    lesson_previews = GREATEST(lesson_previews + $4, 0),
+    bookmarks = GREATEST(bookmarks + $5, 0)
+WHERE user_id = $1
+RETURNING lessons_completed, categories_explored, lesson_previews, bookmarks, {_PRACTICE_METRICS}
+"""
+
+SEED_COUNTERS_QUERY = f"""
+INSERT INTO user_counters (user_id, lessons_completed, categories_explored, lesson_previews, bookmarks)
+VALUES ($1, $2, $3, $4, $5)
+ON CONFLICT (user_id) DO NOTHING
+RETURNING lessons_completed, categories_explored, lesson_previews, bookmarks, {_PRACTICE_METRICS}
+"""
+
+
+async def update_user_counters(
+    conn,
+    user_id: str,
+    lessons_completed: int = 0,
+    categories_explored: int = 0,
+    lesson_previews: int = 0,
+    bookmarks: int = 0,
+) -> dict[str, int]:
+    """Apply counter deltas for a write that has already happened and return all metrics"""
+    deltas = (lessons_completed, categories_explored, lesson_previews, bookmarks)
+    row = await conn.fetchrow(UPDATE_COUNTERS_QUERY, user_id, *deltas)
+    if row is None:
+        # First write since the user got a counters row: seed it from the
+        # source tables, which already include this write
+        metrics = await get_user_metrics(conn, user_id)
+        row = await conn.fetchrow(
+            SEED_COUNTERS_QUERY, user_id, *(metrics[column] for column in COUNTER_COLUMNS)
+        )
+        if row is None:
+            # A concurrent first write seeded the row without seeing ours
+            # (still uncommitted); add this write's deltas on top of it
+            row = await conn.fetchrow(UPDATE_COUNTERS_QUERY, user_id, *deltas)
+    return dict(row.items())
+
+
+async def award_achievements(conn, user_id: str, metrics: dict[str, int]) -> list[int]:
+    """Insert every achievement whose threshold the metrics reach; returns the ids that qualified"""
+    catalog = await get_achievement_catalog(conn)
+    qualified = [rule.id for rule in catalog if rule.is_met(metrics)]
+    if qualified:
+        await conn.execute(
+            """
+            INSERT INTO user_achievements (user_id, achievement_id)
+            SELECT $1, unnest($2::int[])
+            ON CONFLICT (user_id, achievement_id) DO NOTHING
+            """,
+            user_id, qualified
+        )
+    return qualified
@@ -0,0 +1,141 @@
+"""In-process caches shared by the API routers.
+
+Usage:
+
+    from app.libs.cache import dashboard_cache, invalidate_user
+
+    version = dashboard_cache.version(user.sub)
+    payload = dashboard_cache.get(user.sub, version)
+    if payload is None:
+        payload = await build_payload()
+        dashboard_cache.put(user.sub, version, payload)
+
+    # after any write that changes what the user sees
+    invalidate_user(user.sub)
+
+Entries are tagged with the key's version at the time the value was computed.
+A write bumps the version, so any entry computed before the write (including
+one still being computed while the write lands) is never served again.
+Caches are per process; every instance is listed in `caches` so their
+counters can be reported. A write only bumps the version in the worker that
+handled it, so with several workers (or pods) the others keep serving their
+copy: caches holding per-user data set `ttl` to bound how stale that copy
+can get (DASHBOARD_CACHE_TTL for the dashboard).
+"""
+
+import itertools
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+caches: dict[str, "VersionedLRUCache"] = {}
+
+# Versions come from one global counter so a forgotten (pruned) version can
+# never be handed out again for the same key
+_version_counter = itertools.count(1)
+
+
+class VersionedLRUCache:
+    """Bounded LRU cache whose entries are invalidated by bumping a per-key version"""
+
+    def __init__(self, name: str, max_entries: int, ttl: float | None = None):
+        self.name = name
+        self.max_entries = max_entries
+        # Seconds an entry is served for, whatever its version; None keeps it until invalidated
+        self.ttl = ttl
+        # key -> (version, value, expiry time)
+        self._entries: OrderedDict[Hashable, tuple[Any, Any, float]] = OrderedDict()
+        # Versions outlive entries (a write may land before the next read),
+        # so they get their own, larger bound
+        self._versions: OrderedDict[Hashable, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        caches[name] = self
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, key: Hashable) -> int:
+        """Current version of a key; capture it before computing a value to put()"""
+        return self._versions.get(key, 0)
+
+    def get(self, key: Hashable, version: Any) -> Any | None:
+        """Return the cached value if it was computed at `version`, else None"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        if time.monotonic() >= entry[2]:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, version: Any, value: Any):
+        if not self.enabled:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else float("inf")
+        self._entries[key] = (version, value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def bump(self, key: Hashable):
+        """Invalidate the key: entries computed at any earlier version become unreachable"""
+        self._entries.pop(key, None)
+        self._versions[key] = next(_version_counter)
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.max_entries * 4:
+            self._versions.popitem(last=False)
+        self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._versions.clear()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# Serialized DashboardData per user; 0 disables caching. Writes handled by
+# other workers are picked up once the entry expires
+dashboard_cache = VersionedLRUCache(
+    "dashboard",
+    max_entries=int(os.environ.get("DASHBOARD_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.environ.get("DASHBOARD_CACHE_TTL", "30")),
+)
+
+# Pre-rendered static JSON of each lesson, tagged with the catalog version
+lesson_payload_cache = VersionedLRUCache(
+    "lesson_payload", max_entries=int(os.environ.get("LESSON_PAYLOAD_CACHE_MAX_ENTRIES", "1000"))
+)
+
+
+def invalidate_user(user_id: str):
+    """Drop everything cached for a user; call after any write that changes their data"""
+    dashboard_cache.bump(user_id)
+
+
+def cache_stats() -> dict[str, dict[str, float]]:
+    return {name: cache.stats() for name, cache in caches.items()}
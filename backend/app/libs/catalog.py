@@ -0,0 +1,162 @@
+"""In-process cache of the course catalog.
+
+Categories, lessons, lesson content, practice challenges and roadmaps change
+only when content is edited, yet almost every request reads them. They are
+loaded together once per process, indexed in memory, and endpoints only query
+the database for the current user's own rows (progress, bookmarks, completion)
+and merge them in.
+
+Usage:
+
+    from app.libs.catalog import get_catalog
+
+    catalog = await get_catalog(conn)
+    lesson = catalog.lessons_by_id.get(lesson_id)
+    for lesson in catalog.lessons_by_category.get(category_id, []):
+        ...
+
+Every CATALOG_REFRESH_INTERVAL seconds (default 30) the next reader runs a
+cheap version query (row count and newest row version per table) and the
+catalog is reloaded only if it changed. Endpoints that hold a connection pass
+it in so the check runs on it: taking a second connection from the pool while
+holding one can exhaust the pool when many requests refresh at once. The
+connection must not be inside a transaction, as the reload reads all tables in
+its own repeatable-read snapshot; look the catalog up before starting one.
+Call `invalidate_catalog()` after editing catalog tables from this process to
+pick the change up immediately. Rows are plain dicts and must be treated as
+read-only: they are shared by every request.
+"""
+
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import Any
+
+from app.libs.database import acquire
+
+CATALOG_REFRESH_INTERVAL = float(os.environ.get("CATALOG_REFRESH_INTERVAL", "30"))
+
+CATALOG_TABLES = ("categories", "lessons", "lesson_content", "practice_challenges", "roadmaps", "roadmap_items")
+
+# xmin changes whenever a row is inserted or updated and the count catches
+# deletes, so together they move on any edit to the table
+CATALOG_VERSION_QUERY = "SELECT " + ", ".join(
+    f"(SELECT ARRAY[COUNT(*), COALESCE(MAX(xmin::text::bigint), 0)] FROM {table})"
+    for table in CATALOG_TABLES
+)
+
+Row = dict[str, Any]
+
+
+class Catalog:
+    """Immutable snapshot of the catalog tables with lookup indexes"""
+
+    def __init__(self, version: tuple, tables: dict[str, list[Row]]):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        self.categories = tables["categories"]
+        self.categories_by_id = {row["id"]: row for row in self.categories}
+
+        self.lessons_by_id = {row["id"]: row for row in tables["lessons"]}
+        # Published lessons only, in display order
+        self.lessons_by_category: dict[int, list[Row]] = defaultdict(list)
+        for row in tables["lessons"]:
+            if row["is_published"]:
+                self.lessons_by_category[row["category_id"]].append(row)
+
+        self.lesson_content_by_id = {row["id"]: row for row in tables["lesson_content"]}
+        self.lesson_content_by_lesson: dict[int, list[Row]] = defaultdict(list)
+        for row in tables["lesson_content"]:
+            self.lesson_content_by_lesson[row["lesson_id"]].append(row)
+
+        self.challenges_by_id = {row["id"]: row for row in tables["practice_challenges"]}
+        self.active_challenges = sorted(
+            (row for row in tables["practice_challenges"] if row["is_active"]),
+            key=lambda row: (row["difficulty_level"] or "", row["id"]),
+        )
+
+        self.roadmaps = tables["roadmaps"]
+        self.roadmaps_by_id = {row["id"]: row for row in self.roadmaps}
+        self.roadmap_items_by_id = {row["id"]: row for row in tables["roadmap_items"]}
+        self.roadmap_items_by_roadmap: dict[int, list[Row]] = defaultdict(list)
+        for row in tables["roadmap_items"]:
+            self.roadmap_items_by_roadmap[row["roadmap_id"]].append(row)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "categories": len(self.categories),
+            "lessons": len(self.lessons_by_id),
+            "lesson_content": len(self.lesson_content_by_id),
+            "practice_challenges": len(self.challenges_by_id),
+            "roadmaps": len(self.roadmaps),
+            "roadmap_items": len(self.roadmap_items_by_id),
+        }
+
+
+CATALOG_QUERIES = {
+    "categories": "SELECT * FROM categories ORDER BY order_index, id",
+    "lessons": "SELECT * FROM lessons ORDER BY category_id, order_index, id",
+    "lesson_content": "SELECT * FROM lesson_content ORDER BY lesson_id, order_index, id",
+    "practice_challenges": "SELECT * FROM practice_challenges ORDER BY id",
+    "roadmaps": "SELECT * FROM roadmaps ORDER BY id",
+    "roadmap_items": "SELECT * FROM roadmap_items ORDER BY roadmap_id, order_index, id",
+}
+
+_catalog: Catalog | None = None
+_next_check = 0.0
+_lock = asyncio.Lock()
+loads = 0
+
+
+async def _fetch_version(conn) -> tuple:
+    row = await conn.fetchrow(CATALOG_VERSION_QUERY)
+    return tuple(tuple(value) for value in row.values())
+
+
+async def _load(conn) -> Catalog:
+    global loads
+    # One snapshot so the indexes never mix rows from before and after an edit
+    async with conn.transaction(isolation="repeatable_read", readonly=True):
+        version = await _fetch_version(conn)
+        tables = {
+            table: [dict(row) for row in await conn.fetch(query)]
+            for table, query in CATALOG_QUERIES.items()
+        }
+    loads += 1
+    return Catalog(version, tables)
+
+
+async def _refresh(conn):
+    global _catalog
+    if _catalog is None or await _fetch_version(conn) != _catalog.version:
+        _catalog = await _load(conn)
+
+
+async def get_catalog(conn=None) -> Catalog:
+    """The current catalog, loading it or checking it for changes when due (on `conn` if given)"""
+    global _next_check
+    if _catalog is not None and time.monotonic() < _next_check:
+        return _catalog
+
+    async with _lock:
+        if _catalog is None or time.monotonic() >= _next_check:
+            if conn is not None:
+                await _refresh(conn)
+            else:
+                async with acquire() as conn:
+                    await _refresh(conn)
+            _next_check = time.monotonic() + CATALOG_REFRESH_INTERVAL
+    return _catalog
+
+
+def invalidate_catalog():
+    """Make the next reader reload the catalog"""
+    global _catalog
+    _catalog = None
+
+
+def catalog_stats() -> dict[str, int]:
+    stats = _catalog.stats() if _catalog is not None else {}
+    return {**stats, "loads": loads}
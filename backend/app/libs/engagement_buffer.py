@@ -0,0 +1,268 @@
+"""Write-behind buffer for lesson engagement events.
+
+`/lessons/engagement` is the highest-volume write. Instead of one INSERT and
+one achievement check per event, events are accepted into a bounded in-memory
+queue and a background task writes them in bulk with COPY, flushing when
+ENGAGEMENT_BATCH_SIZE events are waiting or ENGAGEMENT_FLUSH_INTERVAL seconds
+have passed. Counters, achievements and cache invalidation are applied once
+per user per batch.
+
+Usage:
+
+    from app.libs.engagement_buffer import engagement_buffer
+
+    await engagement_buffer.start()      # app startup
+    await engagement_buffer.submit(EngagementEvent(...))
+    await engagement_buffer.stop()       # app shutdown, flushes what is left
+
+When the queue is full, submit() waits up to ENGAGEMENT_ENQUEUE_TIMEOUT
+seconds for room and then raises EngagementBufferFull so the endpoint can
+shed load.
+
+Events are accepted before they are written, so the endpoint validates them
+first (known lesson, action length). A batch that still fails on bad data is
+split in halves until the offending events are isolated; only those are
+dropped (and counted in events_dropped), the rest of the batch is written.
+"""
+
+import asyncio
+import datetime
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, NamedTuple
+
+import asyncpg
+
+from app.libs.achievements import award_achievements, update_user_counters
+from app.libs.cache import invalidate_user
+from app.libs.database import acquire
+
+logger = logging.getLogger(__name__)
+
+ENGAGEMENT_COLUMNS = ("user_id", "lesson_id", "action", "metadata", "created_at")
+# user_engagement.action is VARCHAR(100)
+MAX_ACTION_LENGTH = 100
+
+# Errors caused by the rows themselves (bad values, foreign keys), which no retry fixes
+INVALID_ROW_ERRORS = (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
+
+
+class EngagementEvent(NamedTuple):
+    user_id: str
+    lesson_id: int
+    action: str
+    metadata: dict[str, Any] | None
+    created_at: datetime.datetime
+
+
+class EngagementBufferFull(Exception):
+    pass
+
+
+async def write_engagement_events(conn, events: list[EngagementEvent]):
+    """Persist events and apply their downstream effects once per user"""
+    async with conn.transaction():
+        # Previews only count the first time a lesson is previewed, so work out
+        # which (user, lesson) pairs are new before the batch is written
+        previews = {(e.user_id, e.lesson_id) for e in events if e.action == "preview"}
+        new_previews: Counter[str] = Counter()
+        if previews:
+            rows = await conn.fetch(
+                """
+                SELECT b.user_id, COUNT(*) AS n
+                FROM unnest($1::text[], $2::int[]) AS b(user_id, lesson_id)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM user_engagement ue
+                    WHERE ue.user_id = b.user_id AND ue.lesson_id = b.lesson_id AND ue.action = 'preview'
+                )
+                GROUP BY b.user_id
+                """,
+                [user_id for user_id, _ in previews],
+                [lesson_id for _, lesson_id in previews],
+            )
+            new_previews.update({row["user_id"]: row["n"] for row in rows})
+
+        await conn.copy_records_to_table(
+            "user_engagement",
+            records=[
+                (
+                    e.user_id,
+                    e.lesson_id,
+                    e.action,
+                    e.metadata,
+                    e.created_at,
+                )
+                for e in events
+            ],
+            columns=ENGAGEMENT_COLUMNS,
+        )
+
+        user_ids = sorted({e.user_id for e in events})
+        for user_id in user_ids:
+            counters = await update_user_counters(conn, user_id, lesson_previews=new_previews[user_id])
+            await award_achievements(conn, user_id, counters)
+
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+class EngagementBuffer:
+    """Bounded queue of engagement events flushed to Postgres by a background task"""
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, enqueue_timeout: float):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: asyncio.Queue[EngagementEvent] | None = None
+        self._task: asyncio.Task | None = None
+        # Events taken off the queue for the next flush, kept here so that
+        # stop() can write them if it interrupts the wait for more
+        self._batch: list[EngagementEvent] = []
+        self._current_flush: asyncio.Future | None = None
+
+        self.events_accepted = 0
+        self.events_rejected = 0
+        self.events_flushed = 0
+        self.events_dropped = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="engagement-buffer")
+
+    async def stop(self):
+        """Stop the flusher and write everything still queued"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # A flush in progress is shielded from the cancellation; let it finish
+        if self._current_flush is not None:
+            await self._current_flush
+
+        batch, self._batch = self._batch, []
+        await self._flush(batch)
+        while not self._queue.empty():
+            await self._flush(self._take(self.batch_size))
+
+    async def submit(self, event: EngagementEvent):
+        try:
+            await asyncio.wait_for(self._queue.put(event), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.events_rejected += 1
+            raise EngagementBufferFull("Engagement buffer is full")
+        self.events_accepted += 1
+
+    def _take(self, limit: int) -> list[EngagementEvent]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            # Block for the first event, then give the batch until the
+            # deadline (or until it is full) to fill up
+            batch = self._batch
+            batch.append(await self._queue.get())
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+                batch.extend(self._take(self.batch_size - len(batch)))
+
+            # Shielded so shutdown never abandons a batch half way through
+            self._batch = []
+            self._current_flush = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._current_flush)
+            self._current_flush = None
+
+    async def _flush(self, batch: list[EngagementEvent]):
+        if not batch:
+            return
+        started = time.perf_counter()
+        written = await self._write(batch)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.events_flushed += written
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    async def _write(self, batch: list[EngagementEvent], attempts: int = 3) -> int:
+        """Write a batch, retrying transient failures; returns the number of events written"""
+        for attempt in range(1, attempts + 1):
+            try:
+                async with acquire() as conn:
+                    await write_engagement_events(conn, batch)
+                return len(batch)
+            except INVALID_ROW_ERRORS as e:
+                # A bad row fails the whole COPY and would fail every retry;
+                # split the batch until it is isolated, so only it is dropped
+                if len(batch) == 1:
+                    logger.warning(
+                        f"Dropping invalid engagement event: {e}",
+                        extra={"user_id": batch[0].user_id, "lesson_id": batch[0].lesson_id, "action": batch[0].action},
+                    )
+                    self.events_dropped += 1
+                    return 0
+                middle = len(batch) // 2
+                return await self._write(batch[:middle], attempts) + await self._write(batch[middle:], attempts)
+            except Exception as e:
+                logger.warning(
+                    f"Engagement flush of {len(batch)} events failed (attempt {attempt}/{attempts}): {e}",
+                    extra={"events": len(batch), "attempt": attempt},
+                )
+                if attempt == attempts:
+                    self.events_dropped += len(batch)
+                    return 0
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        return 0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "events_accepted": self.events_accepted,
+            "events_rejected": self.events_rejected,
+            "events_flushed": self.events_flushed,
+            "events_dropped": self.events_dropped,
+            "flushes": self.flushes,
+            "flush_seconds_total": self.flush_seconds_total,
+            "flush_seconds_max": self.flush_seconds_max,
+        }
+
+
+engagement_buffer = EngagementBuffer(
+    max_queue=int(os.environ.get("ENGAGEMENT_MAX_QUEUE", "10000")),
+    batch_size=int(os.environ.get("ENGAGEMENT_BATCH_SIZE", "500")),
+    flush_interval=float(os.environ.get("ENGAGEMENT_FLUSH_INTERVAL", "1.0")),
+    enqueue_timeout=float(os.environ.get("ENGAGEMENT_ENQUEUE_TIMEOUT", "0.5")),
+)
+
+# Set ENGAGEMENT_WRITE_BEHIND=false to write every event synchronously
+ENGAGEMENT_WRITE_BEHIND = os.environ.get("ENGAGEMENT_WRITE_BEHIND", "true").lower() == "true"
@@ -0,0 +1,81 @@
+"""JSON encoding to bytes, using orjson when it is installed.
+
+Usage:
+
+    from app.libs.fast_json import dumps, loads
+
+    body = dumps({"id": 1, "title": "Intro"})   # b'{"id":1,"title":"Intro"}'
+    value = loads(body)                          # str, bytes or memoryview
+
+`FastJSONResponse` is the app's default response class (see
+`main.create_app`), so every endpoint returning plain data is rendered with
+`dumps`. List endpoints whose rows are already trusted (straight from the
+database or the catalog) can also skip Pydantic entirely: build plain dicts
+with the response model's fields, in its field order, and return them in a
+FastJSONResponse. FastAPI does not validate a returned Response, and
+response_model keeps the OpenAPI schema:
+
+    @router.get("/items", response_model=List[Item])
+    async def get_items(conn: DbConnection) -> Response:
+        rows = await conn.fetch("SELECT id, title, created_at FROM items")
+        return FastJSONResponse([
+            dict(id=row["id"], title=row["title"], created_at=row["created_at"].isoformat())
+            for row in rows
+        ])
+
+Nothing checks these dicts, so every value must already have its field's
+JSON type (e.g. isoformat() datetimes for str fields, no Decimals for int).
+Plain dicts are used rather than `model_construct()`, which runs in Python
+and is slower than validating (see benchmarks/serialization.py).
+
+Output is compact UTF-8. orjson is several times faster than the standard
+library and allocates less; without it `json` is used with the same
+separators, so the bytes are identical for the types both support (datetimes
+are written as ISO 8601 strings either way).
+"""
+
+import datetime
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from app.libs.request_timing import span
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+def loads(data: str | bytes | bytearray | memoryview) -> Any:
+    """Parse JSON from text or UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with `dumps`, timed as `serialization`"""
+
+    def render(self, content: Any) -> bytes:
+        with span("serialization"):
+            return dumps(content)
+
@@ -0,0 +1,358 @@
+"""Background queue for LLM grading jobs.
+
+With GRADING_MODE=async, submit endpoints enqueue a job and answer 202 with
+its id instead of holding the request open for the multi-second LLM call.
+A bounded pool of worker tasks runs the jobs; clients poll
+`/grading/jobs/{job_id}` or follow `/grading/jobs/{job_id}/events` (SSE).
+
+Usage:
+
+    from app.libs.grading_queue import grading_queue
+
+    # at import time, next to the code that does the work
+    grading_queue.register("practice", grade_practice_job)
+
+    job = await grading_queue.submit("practice", user.sub, {"challenge_id": 1, ...})
+    # or, from an endpoint: return await accept_grading_job("practice", user.sub, payload)
+    job = grading_queue.get_job(job.id)
+
+Handlers receive the submitting user's id and the payload and return a
+JSON-serialisable dict. A handler that raises HTTPException fails the job
+immediately; any other exception is retried with backoff up to
+GRADING_MAX_ATTEMPTS times, after which the job is moved to the dead-letter
+list.
+
+Jobs live in a QueueBackend. Only the in-process backend ships today, so jobs
+do not survive a restart and each worker process has its own queue: a job can
+only be polled on the worker that accepted it, and any other worker answers
+404. Run GRADING_MODE=async with a single worker process, or route each
+client to the same worker (sticky sessions). GRADING_QUEUE_BACKEND selects an
+entry in QUEUE_BACKENDS so a shared backend (e.g. Redis or a Postgres table)
+can be added without touching the routers.
+
+Settings:
+
+    GRADING_MODE                sync | async (default sync)
+    GRADING_CONCURRENCY         worker tasks per process (default 4)
+    GRADING_MAX_QUEUE           queued jobs before submits get 503 (default 1000)
+    GRADING_MAX_ATTEMPTS        tries per job before dead-lettering (default 3)
+    GRADING_JOB_TIMEOUT         seconds per attempt (default 120)
+    GRADING_JOB_TTL             seconds finished jobs stay queryable (default 3600)
+    GRADING_QUEUE_BACKEND       backend name in QUEUE_BACKENDS (default memory)
+"""
+
+import abc
+import asyncio
+import datetime
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# handler(user_id, payload) -> result
+JobHandler = Callable[[str, dict[str, Any]], Awaitable[dict[str, Any]]]
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class GradingQueueFull(Exception):
+    pass
+
+
+class GradingJob:
+    """One grading request and its progress"""
+
+    def __init__(self, kind: str, user_id: str, payload: dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.payload = payload
+        self.status = QUEUED
+        self.attempts = 0
+        self.result: dict[str, Any] | None = None
+        self.error: str | None = None
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.finished_at: datetime.datetime | None = None
+        self.enqueued_monotonic = time.monotonic()
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    async def wait(self, timeout: float | None = None) -> bool:
+        """Wait until the job has finished; returns False if the timeout expired first"""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def finish(self, status: str, result: dict[str, Any] | None = None, error: str | None = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = datetime.datetime.now(datetime.timezone.utc)
+        self._done.set()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class QueueBackend(abc.ABC):
+    """Where queued jobs and their state are kept"""
+
+    @abc.abstractmethod
+    async def put(self, job: GradingJob):
+        """Store the job and queue it; raise GradingQueueFull when there is no room"""
+
+    @abc.abstractmethod
+    async def get(self) -> GradingJob:
+        """Wait for the next queued job"""
+
+    @abc.abstractmethod
+    async def requeue(self, job: GradingJob):
+        """Queue a job again for a retry (must not be refused for lack of room)"""
+
+    @abc.abstractmethod
+    def load(self, job_id: str) -> GradingJob | None:
+        """The job with this id, None if unknown or expired"""
+
+    @abc.abstractmethod
+    def depth(self) -> int:
+        """Number of jobs waiting to run"""
+
+
+class InMemoryQueueBackend(QueueBackend):
+    """Per-process asyncio queue with finished jobs kept for `job_ttl` seconds"""
+
+    def __init__(self, max_queue: int, job_ttl: float):
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self._queue: asyncio.Queue[GradingJob] | None = None
+        self._jobs: OrderedDict[str, GradingJob] = OrderedDict()
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # Created lazily so it binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def put(self, job: GradingJob):
+        if self.queue.qsize() >= self.max_queue:
+            raise GradingQueueFull("Grading queue is full")
+        self._prune()
+        self._jobs[job.id] = job
+        self.queue.put_nowait(job)
+
+    async def get(self) -> GradingJob:
+        return await self.queue.get()
+
+    async def requeue(self, job: GradingJob):
+        self.queue.put_nowait(job)
+
+    def load(self, job_id: str) -> GradingJob | None:
+        return self._jobs.get(job_id)
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def _prune(self):
+        # Jobs are stored in submission order; drop finished ones past their TTL
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.job_ttl)
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.created_at > cutoff:
+                break
+            if job.done and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+QUEUE_BACKENDS: dict[str, Callable[..., QueueBackend]] = {
+    "memory": InMemoryQueueBackend,
+}
+
+
+class GradingQueue:
+    """Runs registered grading handlers on a bounded pool of worker tasks"""
+
+    def __init__(self, backend: QueueBackend, concurrency: int, max_attempts: int, job_timeout: float):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.job_timeout = job_timeout
+        self.handlers: dict[str, JobHandler] = {}
+        self.dead_letter: deque[GradingJob] = deque(maxlen=1000)
+        self._workers: list[asyncio.Task] = []
+        self._retries: set[asyncio.Task] = set()
+
+        self.jobs_enqueued = 0
+        self.jobs_rejected = 0
+        self.jobs_running = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.jobs_retried = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._workers)
+
+    def register(self, kind: str, handler: JobHandler):
+        self.handlers[kind] = handler
+
+    async def start(self):
+        if self.running:
+            return
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"grading-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """Cancel the workers; jobs still queued in memory are lost"""
+        tasks = self._workers + list(self._retries)
+        self._workers = []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, kind: str, user_id: str, payload: dict[str, Any]) -> GradingJob:
+        if kind not in self.handlers:
+            raise ValueError(f"No grading handler registered for {kind!r}")
+        job = GradingJob(kind, user_id, payload)
+        try:
+            await self.backend.put(job)
+        except GradingQueueFull:
+            self.jobs_rejected += 1
+            raise
+        self.jobs_enqueued += 1
+        return job
+
+    def get_job(self, job_id: str) -> GradingJob | None:
+        return self.backend.load(job_id)
+
+    async def _work(self):
+        while True:
+            job = await self.backend.get()
+            await self._run(job)
+
+    async def _run(self, job: GradingJob):
+        job.status = RUNNING
+        job.attempts += 1
+        if job.attempts == 1:
+            self.wait_seconds_total += time.monotonic() - job.enqueued_monotonic
+
+        self.jobs_running += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                self.handlers[job.kind](job.user_id, job.payload), timeout=self.job_timeout
+            )
+        except HTTPException as e:
+            # The request itself is invalid; retrying will not help
+            self._fail(job, str(e.detail))
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.warning(
+                f"Grading job {job.id} ({job.kind}) failed (attempt {job.attempts}/{self.max_attempts}): {error}",
+                extra={"job_id": job.id, "job_kind": job.kind, "user_id": job.user_id, "attempt": job.attempts},
+            )
+            if job.attempts >= self.max_attempts:
+                self._fail(job, error)
+            else:
+                self.jobs_retried += 1
+                job.status = RETRYING
+                job.error = error
+                task = asyncio.create_task(self._retry_later(job, 0.5 * 2 ** job.attempts))
+                self._retries.add(task)
+                task.add_done_callback(self._retries.discard)
+        else:
+            job.finish(COMPLETED, result=result)
+            self.jobs_completed += 1
+        finally:
+            self.jobs_running -= 1
+            self.run_seconds_total += time.perf_counter() - started
+
+    async def _retry_later(self, job: GradingJob, delay: float):
+        await asyncio.sleep(delay)
+        await self.backend.requeue(job)
+
+    def _fail(self, job: GradingJob, error: str):
+        job.finish(FAILED, error=error)
+        self.jobs_failed += 1
+        self.dead_letter.append(job)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "queue_depth": self.backend.depth(),
+            "workers": self.concurrency,
+            "jobs_running": self.jobs_running,
+            "jobs_enqueued": self.jobs_enqueued,
+            "jobs_rejected": self.jobs_rejected,
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "jobs_retried": self.jobs_retried,
+            "dead_letter": len(self.dead_letter),
+            "wait_seconds_total": self.wait_seconds_total,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+
+def job_status_url(job_id: str) -> str:
+    return f"/routes/grading/jobs/{job_id}"
+
+
+async def accept_grading_job(kind: str, user_id: str, payload: dict[str, Any]) -> JSONResponse:
+    """Queue a job and answer 202 Accepted with where to follow it"""
+    try:
+        job = await grading_queue.submit(kind, user_id, payload)
+    except GradingQueueFull:
+        raise HTTPException(status_code=503, detail="Too many submissions being graded, retry shortly", headers={"Retry-After": "5"})
+
+    status_url = job_status_url(job.id)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": status_url,
+            "events_url": f"{status_url}/events",
+        },
+        headers={"Location": status_url},
+    )
+
+
+GRADING_ASYNC = os.environ.get("GRADING_MODE", "sync").lower() == "async"
+
+grading_queue = GradingQueue(
+    backend=QUEUE_BACKENDS[os.environ.get("GRADING_QUEUE_BACKEND", "memory")](
+        max_queue=int(os.environ.get("GRADING_MAX_QUEUE", "1000")),
+        job_ttl=float(os.environ.get("GRADING_JOB_TTL", "3600")),
+    ),
+    concurrency=int(os.environ.get("GRADING_CONCURRENCY", "4")),
+    max_attempts=int(os.environ.get("GRADING_MAX_ATTEMPTS", "3")),
+    job_timeout=float(os.environ.get("GRADING_JOB_TIMEOUT", "120")),
+)
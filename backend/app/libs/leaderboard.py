@@ -0,0 +1,215 @@
+"""In-memory leaderboard index for practice challenges.
+
+Each challenge's leaderboard is loaded from `leaderboard_entries` the first
+time it is read and then kept as a list sorted by (score desc, achieved_at
+asc), so top-K reads are a slice and a user's rank is a binary search.
+
+Usage:
+
+    from app.libs.leaderboard import leaderboard_index
+
+    board = await leaderboard_index.get(challenge_id)
+    top = board.top(10)                          # [(rank, LeaderboardRow), ...]
+    rank, around = board.around(user.sub, 2)     # rank and the rows around it
+    name = leaderboard_index.display_name(row.user_id)
+
+    # after the transaction that changed leaderboard_entries has committed
+    leaderboard_index.record(challenge_id, user.sub, score, achieved_at)
+
+Writes made by other worker processes are not seen until the board is
+reloaded, which happens LEADERBOARD_INDEX_TTL seconds (default 60) after it
+was loaded. Challenge ids that do not exist are remembered for as long, so
+a new challenge can take that long to get a leaderboard.
+"""
+
+import asyncio
+import bisect
+import datetime
+import os
+import time
+from typing import NamedTuple
+
+from app.libs.database import acquire
+
+LEADERBOARD_INDEX_TTL = float(os.environ.get("LEADERBOARD_INDEX_TTL", "60"))
+
+
+class LeaderboardRow(NamedTuple):
+    user_id: str
+    score: int
+    achieved_at: datetime.datetime
+
+
+def sort_key(row: LeaderboardRow) -> tuple:
+    # user_id breaks exact ties so every row has a distinct position
+    return (-row.score, row.achieved_at, row.user_id)
+
+
+class ChallengeLeaderboard:
+    """Best entry per user for one challenge, kept in rank order"""
+
+    def __init__(self, challenge_id: int, challenge_title: str, rows: list[LeaderboardRow]):
+        self.challenge_id = challenge_id
+        self.challenge_title = challenge_title
+        self.loaded_at = time.monotonic()
+        self._rows = sorted(rows, key=sort_key)
+        self._keys = [sort_key(row) for row in self._rows]
+        self._by_user = {row.user_id: row for row in self._rows}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def record(self, row: LeaderboardRow):
+        """Replace the user's entry if the new one ranks higher"""
+        current = self._by_user.get(row.user_id)
+        if current is not None:
+            if row.score <= current.score:
+                return
+            index = bisect.bisect_left(self._keys, sort_key(current))
+            del self._keys[index]
+            del self._rows[index]
+
+        key = sort_key(row)
+        index = bisect.bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self._rows.insert(index, row)
+        self._by_user[row.user_id] = row
+
+    def top(self, k: int) -> list[tuple[int, LeaderboardRow]]:
+        return [(i + 1, row) for i, row in enumerate(self._rows[:max(k, 0)])]
+
+    def rank(self, user_id: str) -> int | None:
+        """1-based position of the user's entry, or None if they have no entry"""
+        row = self._by_user.get(user_id)
+        if row is None:
+            return None
+        return bisect.bisect_left(self._keys, sort_key(row)) + 1
+
+    def around(self, user_id: str, neighbours: int) -> tuple[int | None, list[tuple[int, LeaderboardRow]]]:
+        """The user's rank and up to `neighbours` entries either side of (and including) theirs"""
+        rank = self.rank(user_id)
+        if rank is None:
+            return None, []
+        start = max(rank - 1 - neighbours, 0)
+        return rank, [(start + i + 1, row) for i, row in enumerate(self._rows[start:rank + neighbours])]
+
+
+class LeaderboardIndex:
+    """Lazily loaded ChallengeLeaderboard per challenge"""
+
+    def __init__(self, ttl: float, max_missing: int = 10000):
+        self.ttl = ttl
+        self.max_missing = max_missing
+        self._boards: dict[int, ChallengeLeaderboard] = {}
+        # Loads in flight; concurrent readers of a challenge share one
+        self._loading: dict[int, asyncio.Future] = {}
+        # Writes recorded while a challenge's board loads, re-applied to the new
+        # board in case its SELECT ran before they committed
+        self._pending: dict[int, list[LeaderboardRow]] = {}
+        # Challenge ids found not to exist, and when, so they are not queried
+        # again within the TTL (oldest first)
+        self._missing: dict[int, float] = {}
+        # Display names from `users`, refreshed with every board load
+        self._names: dict[str, str] = {}
+        self.loads = 0
+
+    async def get(self, challenge_id: int) -> ChallengeLeaderboard | None:
+        """The challenge's leaderboard, or None if the challenge does not exist"""
+        now = time.monotonic()
+        board = self._boards.get(challenge_id)
+        if board is not None and now - board.loaded_at < self.ttl:
+            return board
+        checked_at = self._missing.get(challenge_id)
+        if checked_at is not None and now - checked_at < self.ttl:
+            return None
+
+        load = self._loading.get(challenge_id)
+        if load is None:
+            self._pending[challenge_id] = []
+            load = self._loading[challenge_id] = asyncio.ensure_future(self._reload(challenge_id))
+            load.add_done_callback(lambda _: self._loading.pop(challenge_id, None))
+        # Shielded so a reader that goes away does not cancel the load for the others
+        return await asyncio.shield(load)
+
+    async def _reload(self, challenge_id: int) -> ChallengeLeaderboard | None:
+        try:
+            board = await self._load(challenge_id)
+        finally:
+            pending = self._pending.pop(challenge_id)
+
+        if board is None:
+            self._boards.pop(challenge_id, None)
+            self._missing.pop(challenge_id, None)
+            self._missing[challenge_id] = time.monotonic()
+            while len(self._missing) > self.max_missing:
+                del self._missing[next(iter(self._missing))]
+            return None
+
+        for row in pending:
+            board.record(row)
+        self._missing.pop(challenge_id, None)
+        self._boards[challenge_id] = board
+        return board
+
+    async def _load(self, challenge_id: int) -> ChallengeLeaderboard | None:
+        async with acquire() as conn:
+            title = await conn.fetchval("SELECT title FROM practice_challenges WHERE id = $1", challenge_id)
+            if title is None:
+                return None
+            rows = await conn.fetch(
+                """
+                SELECT le.user_id, le.score, le.achieved_at, u.name
+                FROM leaderboard_entries le
+                LEFT JOIN users u ON le.user_id = u.id
+                WHERE le.challenge_id = $1
+                """,
+                challenge_id,
+            )
+        self.loads += 1
+        # Keep each user's best entry in case the table holds duplicates
+        best: dict[str, LeaderboardRow] = {}
+        for row in rows:
+            if row["name"]:
+                self._names[row["user_id"]] = row["name"]
+            entry = LeaderboardRow(row["user_id"], row["score"], row["achieved_at"])
+            if entry.user_id not in best or sort_key(entry) < sort_key(best[entry.user_id]):
+                best[entry.user_id] = entry
+        return ChallengeLeaderboard(challenge_id, title, list(best.values()))
+
+    def record(self, challenge_id: int, user_id: str, score: int, achieved_at: datetime.datetime):
+        """Apply a committed leaderboard write to the loaded board (if any) and to one being loaded"""
+        row = LeaderboardRow(user_id, score, achieved_at)
+        pending = self._pending.get(challenge_id)
+        if pending is not None:
+            pending.append(row)
+        board = self._boards.get(challenge_id)
+        if board is not None:
+            board.record(row)
+
+    def display_name(self, user_id: str) -> str:
+        return self._names.get(user_id) or f"User {user_id[:8]}"
+
+    def set_display_name(self, user_id: str, name: str | None):
+        """Keep names current after a profile update without reloading boards"""
+        if name:
+            self._names[user_id] = name
+
+    def invalidate(self, challenge_id: int | None = None):
+        if challenge_id is None:
+            self._boards.clear()
+            self._missing.clear()
+        else:
+            self._boards.pop(challenge_id, None)
+            self._missing.pop(challenge_id, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "boards": len(self._boards),
+            "entries": sum(len(board) for board in self._boards.values()),
+            "missing": len(self._missing),
+            "names": len(self._names),
+            "loads": self.loads,
+        }
+
+
+leaderboard_index = LeaderboardIndex(ttl=LEADERBOARD_INDEX_TTL)
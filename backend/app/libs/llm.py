@@ -0,0 +1,156 @@
+"""Shared Azure OpenAI client for API routers.
+
+One AsyncAzureOpenAI client is created per process by the app lifespan (see
+`main.create_app`) and shared by every router, so LLM calls reuse warm
+keep-alive (and, when the `h2` package is installed, HTTP/2) connections
+instead of paying for a new TLS handshake per request.
+
+Usage:
+
+    from app.libs.llm import LLM_MODEL, require_llm_client
+
+    client = require_llm_client()      # 503 when Azure OpenAI is not configured
+    response = await client.chat.completions.create(model=LLM_MODEL, ...)
+
+Credentials come from the AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT
+secrets. The client is tuned through environment variables:
+
+    LLM_MODEL                   deployment name (default myvng-gpt4o-2ca9)
+    LLM_TIMEOUT                 seconds to wait for a read/write (default 60)
+    LLM_CONNECT_TIMEOUT         seconds to establish a connection (default 5)
+    LLM_MAX_RETRIES             retries on connection errors, 429s and 5xx (default 2)
+    LLM_MAX_CONNECTIONS         upper bound on open connections (default 100)
+    LLM_MAX_KEEPALIVE           idle connections kept open (default 20)
+    LLM_KEEPALIVE_EXPIRY        seconds before an idle connection is closed (default 60)
+    LLM_HTTP2                   use HTTP/2 when `h2` is installed (default true)
+
+Every HTTP request the client makes (retries included) is reported as `llm`
+time in the current request's Server-Timing breakdown, measured until the
+response headers arrive: the whole completion for regular calls, the time to
+the first token for streamed ones. The same latency feeds the /metrics
+histogram; callers report token usage and time to first token:
+
+    started = time.perf_counter()
+    response = await client.chat.completions.create(model=LLM_MODEL, ...)
+    record_usage(response)                 # regular calls
+
+    async for chunk in stream:             # streamed calls
+        record_first_token(started)        # on the first content chunk
+    record_streamed_tokens(chunks)
+"""
+
+import importlib.util
+import logging
+import os
+import time
+
+import databutton as db
+import httpx
+from fastapi import HTTPException
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+from app.libs.metrics import llm_request_duration, llm_time_to_first_token, llm_tokens
+from app.libs.request_timing import record
+
+LLM_MODEL = os.environ.get("LLM_MODEL", "myvng-gpt4o-2ca9")
+LLM_API_VERSION = "2024-02-01"
+
+logger = logging.getLogger(__name__)
+
+_client: AsyncAzureOpenAI | None = None
+
+
+async def _start_timer(request: httpx.Request):
+    request.extensions["started_at"] = time.perf_counter()
+
+
+async def _record_latency(response: httpx.Response):
+    started = response.request.extensions.get("started_at")
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        record("llm", elapsed)
+        llm_request_duration.observe(elapsed, str(response.status_code))
+
+
+def record_usage(response):
+    """Count the prompt and completion tokens a completion reports"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        llm_tokens.inc("prompt", amount=usage.prompt_tokens)
+        llm_tokens.inc("completion", amount=usage.completion_tokens)
+
+
+def record_first_token(started: float):
+    llm_time_to_first_token.observe(time.perf_counter() - started)
+
+
+def record_streamed_tokens(chunks: int):
+    # Streams carry no usage on this API version; Azure sends one token per chunk
+    llm_tokens.inc("completion", amount=chunks)
+
+
+def create_llm_client(api_key: str | None = None, azure_endpoint: str | None = None) -> AsyncAzureOpenAI | None:
+    """Create the process-wide client (called once from the app lifespan)"""
+    global _client
+    if _client is not None:
+        return _client
+
+    api_key = api_key or db.secrets.get("AZURE_OPENAI_API_KEY")
+    azure_endpoint = azure_endpoint or db.secrets.get("AZURE_OPENAI_ENDPOINT")
+    if not api_key or not azure_endpoint:
+        logger.warning("Azure OpenAI credentials are not fully configured; LLM features are disabled")
+        return None
+
+    timeout = httpx.Timeout(
+        float(os.environ.get("LLM_TIMEOUT", "60")),
+        connect=float(os.environ.get("LLM_CONNECT_TIMEOUT", "5")),
+    )
+    http2 = (
+        os.environ.get("LLM_HTTP2", "true").lower() == "true"
+        and importlib.util.find_spec("h2") is not None
+    )
+    http_client = DefaultAsyncHttpxClient(
+        timeout=timeout,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.environ.get("LLM_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "60")),
+        ),
+        event_hooks={"request": [_start_timer], "response": [_record_latency]},
+    )
+
+    _client = AsyncAzureOpenAI(
+        api_key=api_key,
+        api_version=LLM_API_VERSION,
+        azure_endpoint=azure_endpoint,
+        timeout=timeout,
+        max_retries=int(os.environ.get("LLM_MAX_RETRIES", "2")),
+        http_client=http_client,
+    )
+    return _client
+
+
+async def close_llm_client():
+    """Close pooled connections (called on shutdown)"""
+    global _client
+    if _client is None:
+        return
+    client, _client = _client, None
+    await client.close()
+
+
+def get_llm_client() -> AsyncAzureOpenAI | None:
+    """The shared client, or None when Azure OpenAI is not configured"""
+    if _client is None:
+        # Scripts and jobs that run without the app lifespan
+        return create_llm_client()
+    return _client
+
+
+def require_llm_client() -> AsyncAzureOpenAI:
+    """The shared client for an endpoint; responds 503 when Azure OpenAI is not configured"""
+    client = get_llm_client()
+    if client is None:
+        raise HTTPException(status_code=503, detail="LLM not configured")
+    return client
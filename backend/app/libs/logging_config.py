@@ -0,0 +1,174 @@
+"""Process-wide logging: structured JSON records written off the request path.
+
+Usage:
+
+    import logging
+    logger = logging.getLogger(__name__)
+
+    logger.info("Lesson completed", extra={"user_id": user.sub, "lesson_id": lesson_id})
+    logger.debug("Cache miss", extra={"sample_rate": 0.01})   # keep ~1% of these
+
+`configure_logging()` runs once at startup (see `main.py`). Handlers on the
+root logger are replaced by a QueueHandler, and uvicorn's server and access
+loggers are sent through it too: the calling code only formats the message
+and appends it to an in-memory queue, and a QueueListener thread encodes it
+as one JSON object per line and writes it to stdout. When the queue is full,
+records are dropped and counted instead of blocking.
+
+Fields passed with `extra=` become top-level keys of the JSON record.
+
+Configuration:
+
+    LOG_LEVEL           root level (default INFO)
+    LOG_LEVELS          per-logger levels, e.g. "databutton_app=WARNING,app.apis.dashboard=DEBUG"
+    LOG_SAMPLE_RATES    fraction of DEBUG/INFO records kept per logger, e.g. "databutton_app.mw.auth_mw=0.01"
+    LOG_FORMAT          json (default) or text for local development
+    LOG_QUEUE_SIZE      records buffered before new ones are dropped (default 10000)
+
+Warnings and errors are never sampled.
+"""
+
+import atexit
+import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+from app.libs.fast_json import dumps
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener: logging.handlers.QueueListener | None = None
+_handler: "NonBlockingQueueHandler | None" = None
+
+
+def parse_levels(value: str) -> dict[str, str]:
+    """"a=WARNING,b.c=DEBUG" -> {"a": "WARNING", "b.c": "DEBUG"}"""
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        try:
+            return dumps(entry).decode()
+        except TypeError:
+            # An `extra=` value JSON cannot encode; fall back to its str()
+            return dumps({key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                          for key, value in entry.items()}).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records, by logger prefix or per record"""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Longest prefix first so "a.b" wins over "a"
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def rate_for(self, record: logging.LogRecord) -> float:
+        rate = getattr(record, "sample_rate", None)
+        if rate is not None:
+            return rate
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record)
+        if rate >= 1.0:
+            return True
+        # Sampled records carry their rate so counts can be scaled back up
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (the arguments may change
+        # before the listener runs) but leave the JSON encoding to it
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging():
+    """Route all logging through the queue; safe to call more than once"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE", "10000")))
+    output = logging.StreamHandler(sys.stdout)
+    if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    _handler = NonBlockingQueueHandler(log_queue)
+    rates = {name: float(rate) for name, rate in parse_levels(os.environ.get("LOG_SAMPLE_RATES", "")).items()}
+    _handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    # uvicorn installs its own stdout handlers with propagate=False before
+    # importing the app; hand its records (one access line per request) to the queue
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_levels(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(_listener.stop)
+
+
+def logging_stats() -> dict[str, int]:
+    if _handler is None:
+        return {}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
@@ -0,0 +1,170 @@
+"""Prometheus metrics for this worker process, served at `/metrics`.
+
+Usage:
+
+    from app.libs.metrics import Counter, Histogram
+
+    grading_seconds = Histogram("grading_seconds", "Time to grade a submission", ["kind"])
+    grading_seconds.observe(elapsed, "practice")
+
+    # existing counters: report a stats() dict as one gauge per key
+    register_stats("grading_queue", grading_queue.stats)
+
+Two kinds of metrics are exposed in the Prometheus text format:
+
+  instruments   Counters and Histograms updated on the hot path (requests,
+                queries, LLM calls). An update is a dict lookup and a list
+                increment: no locks, because every update runs on the event
+                loop thread, the same as the other in-process counters.
+  stats         `stats()` functions the app already has (caches, catalog,
+                queues, token cache, ...), read only when /metrics is scraped
+                and reported as untyped samples named `<prefix>_<key>`.
+
+Values are per process and reset on restart; with several uvicorn workers,
+each one reports its own.
+
+The endpoint is off unless METRICS_ENABLED=true. It sits outside /routes and
+its user auth; set METRICS_TOKEN to require `Authorization: Bearer <token>`
+from the scraper, and keep the path off the public proxy either way.
+"""
+
+import bisect
+import math
+import os
+import secrets
+from typing import Callable, Iterable
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Seconds; the defaults of the official client, plus the long tail of LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+instruments: dict[str, "Counter | Histogram"] = {}
+stats_sources: dict[str, tuple[Callable[[], dict], str | None]] = {}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: dict[tuple, float] = {}
+        instruments[name] = self
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Observations counted into fixed buckets, per combination of label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self.values: dict[tuple, list] = {}
+        instruments[name] = self
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+def register_stats(prefix: str, source: Callable[[], dict], label: str | None = None):
+    """Report `source()` at scrape time; with `label`, it returns {label value: stats dict}"""
+    stats_sources[prefix] = (source, label)
+
+
+def _stats_samples(prefix: str, source: Callable[[], dict], label: str | None) -> dict[str, list[str]]:
+    """Sample lines per metric name for one stats source"""
+    stats = source()
+    grouped = stats.items() if label is not None else [(None, stats)]
+    samples: dict[str, list[str]] = {}
+    for label_value, values in grouped:
+        labels = _labels([label], [label_value]) if label is not None else ""
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                samples.setdefault(f"{prefix}_{key}", []).append(f"{prefix}_{key}{labels} {_number(value)}")
+    return samples
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in instruments.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    for prefix, (source, label) in stats_sources.items():
+        for name, samples in _stats_samples(prefix, source, label).items():
+            lines.append(f"# TYPE {name} untyped")
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if METRICS_TOKEN and not secrets.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        return Response("Unauthorized", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
+# Instruments updated by the shared helpers
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+db_query_duration = Histogram("db_query_duration_seconds", "Duration of queries on pooled connections", buckets=DB_BUCKETS)
+db_acquire_duration = Histogram("db_pool_acquire_seconds", "Wait for a pooled connection", buckets=DB_BUCKETS)
+llm_request_duration = Histogram("llm_request_duration_seconds", "Azure OpenAI HTTP requests, until response headers", ["status"])
+llm_time_to_first_token = Histogram("llm_time_to_first_token_seconds", "Streamed completions: time to the first content chunk")
+llm_tokens = Counter("llm_tokens_total", "Tokens used by LLM calls", ["kind"])
@@ -0,0 +1,104 @@
+"""Count the queries each request runs and catch N+1 patterns.
+
+Every statement run on a pooled connection is reduced to a fingerprint (its
+shape: literals, numbers and IN lists replaced by `?`) and counted for the
+current request by `RequestTimingMiddleware`. When one shape runs more than
+DB_REPEATED_QUERY_THRESHOLD times (default 5) in a single request, usually a
+query inside a loop, a "Repeated query" warning is logged with the route and
+the fingerprint. In development mode (`app.env.mode == Mode.DEV`) every
+response also carries the totals:
+
+    X-DB-Queries: total=17, distinct=4, max_repeat=12
+
+Usage in tests, to pin the number of queries an endpoint may run:
+
+    from app.libs.query_tracking import assert_max_queries
+
+    async with assert_max_queries(3):
+        response = await client.get("/routes/dashboard/data")
+
+`track_queries()` does the same without the assertion and returns the counts.
+Queries of code running outside any tracked block are not counted.
+"""
+
+import asyncio
+import contextlib
+import functools
+import os
+import re
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator
+
+REPEATED_QUERY_THRESHOLD = int(os.environ.get("DB_REPEATED_QUERY_THRESHOLD", "5"))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(query: str) -> str:
+    """The statement's shape: SELECT * FROM t WHERE id IN (1, 2) -> select * from t where id in (?)"""
+    shape = _STRING.sub("?", query)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip().lower()
+
+
+class QueryCounter:
+    """Number of executions per fingerprint"""
+
+    __slots__ = ("counts",)
+
+    def __init__(self):
+        self.counts: dict[str, int] = {}
+
+    def add(self, query: str):
+        shape = fingerprint(query)
+        self.counts[shape] = self.counts.get(shape, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Fingerprints run more than `threshold` times, most repeated first"""
+        return sorted(((shape, n) for shape, n in self.counts.items() if n > threshold), key=lambda item: -item[1])
+
+    def summary(self) -> str:
+        return f"total={self.total}, distinct={len(self.counts)}, max_repeat={max(self.counts.values(), default=0)}"
+
+
+_counters: ContextVar[tuple[QueryCounter, ...]] = ContextVar("query_counters", default=())
+
+
+def record_query(query: str):
+    """Count `query` in every tracking block around the current code"""
+    for counter in _counters.get():
+        counter.add(query)
+
+
+@contextlib.contextmanager
+def track_queries() -> Iterator[QueryCounter]:
+    """Count the queries run inside the block (blocks can be nested)"""
+    counter = QueryCounter()
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+
+@contextlib.asynccontextmanager
+async def assert_max_queries(limit: int) -> AsyncIterator[QueryCounter]:
+    """Fail with the list of fingerprints if the block runs more than `limit` queries"""
+    with track_queries() as counter:
+        yield counter
+        # Query loggers are called with call_soon; let the last ones land
+        await asyncio.sleep(0)
+    if counter.total > limit:
+        lines = "\n".join(f"  {n} x {shape}" for shape, n in sorted(counter.counts.items(), key=lambda item: -item[1]))
+        raise AssertionError(f"Expected at most {limit} queries, ran {counter.total}:\n{lines}")
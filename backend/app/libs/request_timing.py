@@ -0,0 +1,186 @@
+"""Per-request time breakdown: where did this request spend its time?
+
+`RequestTimingMiddleware` (installed in `main.create_app`) gives every HTTP
+request its own set of counters. Code anywhere below the endpoint adds the
+time it spends to a category, and the totals are sent back to the client as
+a `Server-Timing` header (shown in the browser's network panel) and logged
+as fields of one "Request completed" record per request:
+
+    Server-Timing: db;dur=12.4;desc="3 calls", llm;dur=1830.2, auth;dur=0.3, serialization;dur=0.8, total;dur=1851.9
+
+Categories reported by the shared helpers:
+
+    db              queries on pooled connections (app.libs.database)
+    db_acquire      waiting for a pooled connection
+    llm             Azure OpenAI requests, until response headers (app.libs.llm)
+    auth            bearer token verification (databutton_app.mw.auth_mw)
+    serialization   rendering JSON response bodies (app.libs.fast_json)
+
+Usage:
+
+    from app.libs.request_timing import span
+
+    with span("grading"):
+        ...
+
+The middleware also counts the request's queries by statement shape (see
+`app.libs.query_tracking`).
+
+Outside a request (background tasks started at startup, scripts) recording
+is a no-op. Streaming responses send their headers before the body is
+produced, so their header only covers the time up to the first byte; the log
+record covers the whole request.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+
+from app.env import Mode, mode
+from app.libs.metrics import http_request_duration, http_requests
+from app.libs.query_tracking import REPEATED_QUERY_THRESHOLD, track_queries
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    """Seconds and number of calls per category for one request"""
+
+    __slots__ = ("started", "durations", "counts")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+
+    def add(self, category: str, seconds: float):
+        self.durations[category] = self.durations.get(category, 0.0) + seconds
+        self.counts[category] = self.counts.get(category, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """The Server-Timing header value, durations in milliseconds"""
+        metrics = []
+        for category, seconds in self.durations.items():
+            metric = f"{category};dur={seconds * 1000:.1f}"
+            count = self.counts[category]
+            if count > 1:
+                metric += f';desc="{count} calls"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def log_fields(self) -> dict[str, float | int]:
+        fields: dict[str, float | int] = {}
+        for category, seconds in self.durations.items():
+            fields[f"{category}_ms"] = round(seconds * 1000, 2)
+            fields[f"{category}_calls"] = self.counts[category]
+        return fields
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> RequestTimings | None:
+    """The timings of the request being handled, None outside a request"""
+    return _current.get()
+
+
+def record(category: str, seconds: float):
+    """Add `seconds` to `category` for the current request, if any"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(category, seconds)
+
+
+@contextlib.contextmanager
+def span(category: str):
+    """Time the block into `category`; works in sync and async code"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(category, time.perf_counter() - started)
+
+
+def route_template(scope: dict) -> str | None:
+    """The matched route with its parameters, e.g. /routes/lessons/{lesson_id}; None if no route matched"""
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return None
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    # Depending on the FastAPI version, the route's format may leave out the
+    # prefixes its router was included under: the prefix is whatever comes
+    # before the part of the path the route's own pattern matches
+    for start in (i for i, char in enumerate(path) if char == "/"):
+        if route.path_regex.match(path[start:]):
+            return root_path + path[:start] + path_format
+    return root_path + path_format
+
+
+class RequestTimingMiddleware:
+    """ASGI middleware collecting `RequestTimings` for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status_code = 500
+        queries = None
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Query timings arrive through loop.call_soon (asyncpg's
+                # query loggers); let the pending ones run first
+                await asyncio.sleep(0)
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing())
+                if mode == Mode.DEV:
+                    headers.append("X-DB-Queries", queries.summary())
+            await send(message)
+
+        try:
+            with track_queries() as queries:
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = timings.elapsed()
+            route = route_template(scope)
+            if queries is not None:
+                for shape, count in queries.repeated(REPEATED_QUERY_THRESHOLD):
+                    logger.warning(
+                        "Repeated query",
+                        extra={"route": route, "path": scope["path"], "count": count, "fingerprint": shape},
+                    )
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            http_requests.inc(scope["method"], route or "unmatched", str(status_code))
+            http_request_duration.observe(elapsed, scope["method"], route or "unmatched")
+            logger.info(
+                "Request completed",
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    **timings.log_fields(),
+                },
+            )
@@ -0,0 +1,97 @@
+"""Compare the /dashboard/ execution engines against a real database.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.dashboard_engines --dsn postgresql://... --user-id <sub>
+
+Each engine builds the full DashboardData payload for the same user and
+reports round-trip latency percentiles; add --json for machine-readable output.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from app.apis import dashboard
+from app.libs.database import acquire, close_pool, create_pool
+from benchmarks.stats import percentile
+
+
+async def run_serial(user_id: str) -> bytes:
+    async with acquire() as conn:
+        data = await dashboard.get_dashboard_data_serial(conn, user_id)
+    return data.model_dump_json().encode()
+
+
+async def run_concurrent(user_id: str) -> bytes:
+    data = await dashboard.get_dashboard_data_concurrent(user_id)
+    return data.model_dump_json().encode()
+
+
+async def run_single_query(user_id: str) -> bytes:
+    async with acquire() as conn:
+        payload = await dashboard.get_dashboard_json(conn, user_id)
+    return payload.encode()
+
+
+ENGINES = {
+    "serial": run_serial,
+    "concurrent": run_concurrent,
+    "single_query": run_single_query,
+}
+
+
+async def bench_engine(engine, user_id: str, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await engine(user_id)
+
+    samples = []
+    payload_size = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        payload = await engine(user_id)
+        samples.append((time.perf_counter() - started) * 1000)
+        payload_size = len(payload)
+
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "payload_bytes": payload_size,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="Postgres URL (default: $DATABASE_URL)")
+    parser.add_argument("--user-id", required=True, help="User (JWT sub) to build the dashboard for")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Comma separated subset of engines")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    await create_pool(args.dsn)
+    try:
+        results = {}
+        for name in args.engines.split(","):
+            results[name] = await bench_engine(ENGINES[name], args.user_id, args.iterations, args.warmup)
+    finally:
+        await close_pool()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'engine':<14}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'bytes':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['mean_ms']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['payload_bytes']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
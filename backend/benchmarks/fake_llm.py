@@ -0,0 +1,125 @@
+"""Stand-in for the Azure OpenAI chat completions API.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.fake_llm --port 9100 --tokens 200 --token-delay 0.02
+
+and point the backend at it with AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9100
+(any AZURE_OPENAI_API_KEY works). Streaming requests get `--tokens` chunks,
+the first after `--first-token-delay` seconds and then one every
+`--token-delay` seconds; non-streaming requests get the same text in one
+response after the same total delay. Requests with
+`response_format={"type": "json_object"}` (the graders) get a grading result
+instead of text, with a score derived from the prompt so repeated
+submissions differ.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import zlib
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+app.state.tokens = 200
+app.state.token_delay = 0.02
+app.state.first_token_delay = 0.0
+app.state.active_streams = 0
+app.state.cancelled_streams = 0
+
+
+def chunk(model: str, content: str | None, finish_reason: str | None = None) -> str:
+    delta = {"content": content} if content is not None else {}
+    payload = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def stream_tokens(model: str):
+    app.state.active_streams += 1
+    finished = False
+    try:
+        await asyncio.sleep(app.state.first_token_delay)
+        for i in range(app.state.tokens):
+            if i:
+                await asyncio.sleep(app.state.token_delay)
+            yield chunk(model, f"tok{i} ")
+        yield chunk(model, None, "stop")
+        yield "data: [DONE]\n\n"
+        finished = True
+    finally:
+        app.state.active_streams -= 1
+        if not finished:
+            app.state.cancelled_streams += 1
+
+
+def grading_result(body: dict) -> str:
+    """A result both graders accept (practice challenges and lesson exercises)"""
+    prompt = json.dumps(body.get("messages", []))
+    score = zlib.crc32(prompt.encode()) % 61 + 40
+    return json.dumps({
+        "scoring_breakdown": {
+            "clarity": {"score": score // 2, "feedback": "Clear instructions."},
+            "context": {"score": score - score // 2, "feedback": "Add more context."},
+        },
+        "total_score": score,
+        "overall_feedback": "A solid prompt with room to add constraints.",
+        "improvement_suggestions": ["State the audience", "Give an example of the output"],
+        "score": score,
+        "feedback": "A solid prompt with room to add constraints.",
+    })
+
+
+@app.post("/openai/deployments/{model}/chat/completions")
+async def chat_completions(model: str, request: Request):
+    body = await request.json()
+    if body.get("stream"):
+        return StreamingResponse(stream_tokens(model), media_type="text/event-stream")
+
+    await asyncio.sleep(app.state.first_token_delay + app.state.tokens * app.state.token_delay)
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        text = grading_result(body)
+    else:
+        text = " ".join(f"tok{i}" for i in range(app.state.tokens))
+    return JSONResponse({
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": app.state.tokens, "total_tokens": app.state.tokens},
+    })
+
+
+@app.get("/stats")
+async def stats():
+    """Streams currently open and streams the caller abandoned before the end"""
+    return {"active_streams": app.state.active_streams, "cancelled_streams": app.state.cancelled_streams}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--tokens", type=int, default=200, help="Chunks per streamed completion")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between chunks")
+    parser.add_argument("--first-token-delay", type=float, default=0.0, help="Seconds before the first chunk")
+    args = parser.parse_args()
+
+    app.state.tokens = args.tokens
+    app.state.token_delay = args.token_delay
+    app.state.first_token_delay = args.first_token_delay
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
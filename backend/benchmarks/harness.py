@@ -0,0 +1,458 @@
+"""End-to-end load test of the whole backend against disposable local services.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.harness run --mix mixed --concurrency 50 --duration 60 --output results.json
+    python -m benchmarks.harness compare baseline.json results.json
+
+`run` starts, in a temporary directory:
+
+  Postgres     a throwaway cluster (initdb + pg_ctl from --pg-bin or PATH),
+               loaded from init.sql; or, with --dsn, a scratch database on an
+               existing server, dropped afterwards
+  LLM          benchmarks.fake_llm, streaming --llm-tokens chunks with the
+               given first-token and per-token delays, and answering the
+               graders with JSON
+  auth         a local signing key (benchmarks.local_jwks); the app verifies
+               every request against its JWKS file like a Stack Auth project
+  backend      `main.create_app` under uvicorn, in its own process, with its
+               lifespan pointed at the services above
+
+Then --concurrency virtual users, each with its own token, send requests
+back to back for --duration seconds, picking each request from the traffic
+mix (see MIXES); the first --warmup seconds are not measured. The report has
+throughput, errors and p50/p95/p99 latency per route, as JSON with --json or
+--output (with the commit and settings, so runs can be compared later).
+
+`compare` prints the change in throughput and latency per route between two
+result files and exits non-zero when a route's p95 regressed by more than
+--threshold percent.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, NamedTuple
+from urllib.parse import urlsplit
+
+import asyncpg
+import httpx
+
+from benchmarks.local_jwks import init_keys, sign_token
+from benchmarks.stats import summarize
+
+BACKEND_DIR = pathlib.Path(__file__).resolve().parent.parent
+AUDIENCE = "bench"
+
+
+class Call(NamedTuple):
+    route: str
+    method: str
+    path: str
+    body: dict | None = None
+
+
+class Catalog(NamedTuple):
+    """Ids the scenarios pick from, read from the seeded database"""
+    categories: list[int]
+    lessons: list[int]
+    challenges: list[int]
+
+
+PROMPTS = [
+    "Write a polite email to a customer explaining a delayed shipment and offering a discount.",
+    "You are a data analyst. Summarize the attached sales figures in three bullet points for executives.",
+    "Draft a project kickoff agenda for a 45 minute meeting with engineering and design.",
+    "Explain prompt engineering to a new employee in plain language, with one example.",
+]
+
+
+def dashboard(catalog: Catalog, rng: random.Random) -> Call:
+    return Call("GET /dashboard/", "GET", "/routes/dashboard/")
+
+
+def categories(catalog: Catalog, rng: random.Random) -> Call:
+    return Call("GET /lessons/categories", "GET", "/routes/lessons/categories")
+
+
+def category_lessons(catalog: Catalog, rng: random.Random) -> Call:
+    category_id = rng.choice(catalog.categories)
+    return Call("GET /lessons/categories/{id}/lessons", "GET", f"/routes/lessons/categories/{category_id}/lessons")
+
+
+def lesson_content(catalog: Catalog, rng: random.Random) -> Call:
+    lesson_id = rng.choice(catalog.lessons)
+    return Call("GET /lesson-content/lessons/{id}", "GET", f"/routes/lesson-content/lessons/{lesson_id}")
+
+
+def practice_submit(catalog: Catalog, rng: random.Random) -> Call:
+    body = {"challenge_id": rng.choice(catalog.challenges), "user_prompt": rng.choice(PROMPTS), "session_duration_seconds": rng.randint(30, 900)}
+    return Call("POST /practice/submit", "POST", "/routes/practice/submit", body)
+
+
+def leaderboard(catalog: Catalog, rng: random.Random) -> Call:
+    challenge_id = rng.choice(catalog.challenges)
+    return Call("GET /practice/leaderboard/{id}", "GET", f"/routes/practice/leaderboard/{challenge_id}")
+
+
+def playground(catalog: Catalog, rng: random.Random) -> Call:
+    return Call("POST /playground", "POST", "/routes/playground", {"prompt": rng.choice(PROMPTS)})
+
+
+SCENARIOS: dict[str, Callable[[Catalog, random.Random], Call]] = {
+    "dashboard": dashboard,
+    "categories": categories,
+    "category_lessons": category_lessons,
+    "lesson_content": lesson_content,
+    "practice_submit": practice_submit,
+    "leaderboard": leaderboard,
+    "playground": playground,
+}
+
+# Relative weights of each scenario
+MIXES = {
+    "browse": {"dashboard": 30, "categories": 15, "category_lessons": 20, "lesson_content": 25, "leaderboard": 10},
+    "practice": {"dashboard": 15, "category_lessons": 10, "practice_submit": 35, "leaderboard": 30, "playground": 10},
+    "mixed": {
+        "dashboard": 25, "categories": 10, "category_lessons": 15, "lesson_content": 20,
+        "practice_submit": 10, "leaderboard": 15, "playground": 5,
+    },
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def split_sql(script: str) -> list[str]:
+    """Statements of a psql script, keeping $$-quoted function bodies whole"""
+    statements, current, in_body = [], [], False
+    for line in script.splitlines():
+        if not current and (not line.strip() or line.lstrip().startswith("--")):
+            continue
+        current.append(line)
+        if line.count("$$") % 2:
+            in_body = not in_body
+        if not in_body and line.rstrip().endswith(";"):
+            statements.append("\n".join(current))
+            current = []
+    return statements
+
+
+async def load_schema(dsn: str, path: pathlib.Path) -> list[str]:
+    """Run init.sql one statement at a time, like psql; returns the failures"""
+    failures = []
+    conn = await asyncpg.connect(dsn)
+    try:
+        for statement in split_sql(path.read_text()):
+            try:
+                await conn.execute(statement)
+            except asyncpg.PostgresError as e:
+                failures.append(f"{statement.splitlines()[0][:60]}... {e}")
+    finally:
+        await conn.close()
+    return failures
+
+
+async def read_catalog(dsn: str) -> Catalog:
+    conn = await asyncpg.connect(dsn)
+    try:
+        return Catalog(
+            categories=[row["id"] for row in await conn.fetch("SELECT id FROM categories ORDER BY id")],
+            lessons=[row["id"] for row in await conn.fetch("SELECT id FROM lessons ORDER BY id")],
+            challenges=[row["id"] for row in await conn.fetch("SELECT id FROM practice_challenges ORDER BY id")],
+        )
+    finally:
+        await conn.close()
+
+
+@contextlib.asynccontextmanager
+async def local_postgres(workdir: pathlib.Path, pg_bin: str | None):
+    """A throwaway Postgres cluster on a unix socket; yields its DSN"""
+    def tool(name: str, *args) -> subprocess.CompletedProcess:
+        path = shutil.which(name, path=pg_bin) if pg_bin else shutil.which(name)
+        if path is None:
+            raise SystemExit(f"{name} not found; pass --pg-bin or --dsn")
+        result = subprocess.run([path, *args], capture_output=True, text=True)
+        if result.returncode:
+            raise SystemExit(f"{name} failed; pass --dsn to use an existing server:\n{result.stderr}")
+        return result
+
+    data = workdir / "pgdata"
+    tool("initdb", "-D", data, "-U", "postgres", "--auth=trust")
+    # Durability is irrelevant for a throwaway cluster
+    options = f"-k {workdir} -c listen_addresses='' -c fsync=off -c synchronous_commit=off -c full_page_writes=off -c max_connections=200"
+    tool("pg_ctl", "-D", data, "-o", options, "-l", workdir / "postgres.log", "-w", "start")
+    try:
+        yield f"postgresql://postgres@/postgres?host={workdir}"
+    finally:
+        tool("pg_ctl", "-D", data, "-m", "immediate", "stop")
+
+
+@contextlib.asynccontextmanager
+async def scratch_database(dsn: str):
+    """A fresh database on an existing server; yields its DSN and drops it afterwards"""
+    name = f"bench_{os.getpid()}_{int(time.time())}"
+    admin = await asyncpg.connect(dsn)
+    try:
+        await admin.execute(f'CREATE DATABASE "{name}"')
+        yield urlsplit(dsn)._replace(path=f"/{name}").geturl()
+    finally:
+        await admin.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        await admin.close()
+
+
+@contextlib.contextmanager
+def process(args: list[str], log_path: pathlib.Path, env: dict | None = None):
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen(args, cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT, env=env)
+    try:
+        yield proc
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def wait_until_up(url: str, proc: subprocess.Popen, log_path: pathlib.Path, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise SystemExit(f"{url} exited with {proc.returncode}; see {log_path}:\n{log_path.read_text()[-2000:]}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise SystemExit(f"{url} did not come up in {timeout}s; see {log_path}")
+
+
+def create_bench_app():
+    """uvicorn factory: the real app, with its lifespan pointed at the harness services"""
+    # Imported here: importing main builds the app, which only the server process does
+    import main
+    from app.libs.database import create_pool
+    from app.libs.llm import create_llm_client
+
+    app = main.app
+    lifespan = app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def bench_lifespan(app):
+        # Created first, so the app's own create_pool()/create_llm_client() reuse them
+        await create_pool(os.environ["BENCH_DATABASE_URL"])
+        create_llm_client(api_key="bench", azure_endpoint=os.environ["BENCH_LLM_ENDPOINT"])
+        async with lifespan(app):
+            yield
+
+    app.router.lifespan_context = bench_lifespan
+    return app
+
+
+async def virtual_user(
+    client: httpx.AsyncClient, token: str, mix: dict[str, int], catalog: Catalog, rng: random.Random,
+    measure_from: float, stop_at: float, samples: dict[str, list[float]], errors: dict[str, int],
+):
+    names, weights = list(mix), list(mix.values())
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.monotonic() < stop_at:
+        call = SCENARIOS[rng.choices(names, weights)[0]](catalog, rng)
+        started = time.monotonic()
+        try:
+            # Streams are read to the end, so their latency is the whole response
+            async with client.stream(call.method, call.path, json=call.body, headers=headers) as response:
+                await response.aread()
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        if started < measure_from:
+            continue
+        samples.setdefault(call.route, []).append((time.monotonic() - started) * 1000)
+        if not ok:
+            errors[call.route] = errors.get(call.route, 0) + 1
+
+
+async def drive(base_url: str, args, catalog: Catalog, keys_dir: pathlib.Path) -> dict:
+    mix = MIXES[args.mix]
+    tokens = [sign_token(keys_dir, f"bench-user-{i}", AUDIENCE, ttl=args.duration + args.warmup + 600) for i in range(args.concurrency)]
+    samples: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.monotonic()
+        measure_from = started + args.warmup
+        stop_at = measure_from + args.duration
+        await asyncio.gather(*(
+            virtual_user(client, token, mix, catalog, random.Random(args.seed + i), measure_from, stop_at, samples, errors)
+            for i, token in enumerate(tokens)
+        ))
+        measured = time.monotonic() - measure_from
+
+    routes = {}
+    for route in sorted(samples):
+        routes[route] = {
+            **summarize(samples[route]),
+            "errors": errors.get(route, 0),
+            "throughput_rps": round(len(samples[route]) / measured, 2),
+        }
+    everything = [sample for route_samples in samples.values() for sample in route_samples]
+    total = {**summarize(everything), "errors": sum(errors.values()), "throughput_rps": round(len(everything) / measured, 2)} if everything else {}
+    return {"routes": routes, "total": total, "measured_seconds": round(measured, 2)}
+
+
+async def run(args) -> dict:
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix="bench-"))
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            if args.dsn:
+                dsn = await stack.enter_async_context(scratch_database(args.dsn))
+            else:
+                dsn = await stack.enter_async_context(local_postgres(workdir, args.pg_bin))
+            failures = await load_schema(dsn, BACKEND_DIR / "init.sql")
+            for failure in failures:
+                print(f"init.sql: {failure}", file=sys.stderr)
+            catalog = await read_catalog(dsn)
+
+            keys_dir = workdir / "jwks"
+            init_keys(keys_dir)
+
+            llm_port, app_port = free_port(), free_port()
+            llm_log, app_log = workdir / "fake_llm.log", workdir / "backend.log"
+            llm = stack.enter_context(process([
+                sys.executable, "-m", "benchmarks.fake_llm", "--port", str(llm_port), "--tokens", str(args.llm_tokens),
+                "--token-delay", str(args.llm_token_delay), "--first-token-delay", str(args.llm_first_token_delay),
+            ], llm_log))
+            await wait_until_up(f"http://127.0.0.1:{llm_port}/stats", llm, llm_log)
+
+            env = {
+                **os.environ,
+                "BENCH_DATABASE_URL": dsn,
+                "BENCH_LLM_ENDPOINT": f"http://127.0.0.1:{llm_port}",
+                "DATABUTTON_EXTENSIONS": json.dumps([{
+                    "name": "stack-auth",
+                    "config": {"projectId": AUDIENCE, "jwksUrl": f"file://{keys_dir / 'jwks.json'}"},
+                }]),
+                "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+            }
+            backend = stack.enter_context(process([
+                sys.executable, "-m", "uvicorn", "benchmarks.harness:create_bench_app", "--factory",
+                "--host", "127.0.0.1", "--port", str(app_port), "--workers", str(args.workers), "--no-access-log",
+            ], app_log, env))
+            base_url = f"http://127.0.0.1:{app_port}"
+            await wait_until_up(f"{base_url}/openapi.json", backend, app_log)
+
+            results = await drive(base_url, args, catalog, keys_dir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "settings": {
+            "mix": args.mix, "concurrency": args.concurrency, "duration": args.duration, "warmup": args.warmup,
+            "workers": args.workers, "llm_tokens": args.llm_tokens, "llm_token_delay": args.llm_token_delay,
+            "llm_first_token_delay": args.llm_first_token_delay, "seed": args.seed,
+            "grading_mode": os.environ.get("GRADING_MODE", "sync"),
+        },
+        **results,
+    }
+
+
+def print_results(results: dict):
+    print(f"commit {results['commit']}, mix {results['settings']['mix']}, {results['settings']['concurrency']} users, {results['measured_seconds']}s")
+    print(f"{'route':<38}{'rps':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, r in {**results["routes"], "total": results["total"]}.items():
+        if r:
+            print(f"{route:<38}{r['throughput_rps']:>8}{r['errors']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print per-route changes; False if any route's p95 regressed beyond `threshold` percent"""
+    def change(old: float, new: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    ok = True
+    print(f"baseline {baseline['commit']} -> current {current['commit']}")
+    print(f"{'route':<38}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for route, new in {**current["routes"], "total": current["total"]}.items():
+        old = baseline["total"] if route == "total" else baseline["routes"].get(route)
+        if not old or not new:
+            print(f"{route:<38}{'(not in baseline)':>40}")
+            continue
+        print(
+            f"{route:<38}{change(old['throughput_rps'], new['throughput_rps']):>10}{change(old['p50_ms'], new['p50_ms']):>10}"
+            f"{change(old['p95_ms'], new['p95_ms']):>10}{change(old['p99_ms'], new['p99_ms']):>10}"
+        )
+        if old["p95_ms"] and (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > threshold:
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Boot the stack and measure a traffic mix")
+    run_parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    run_parser.add_argument("--concurrency", type=int, default=20, help="Virtual users")
+    run_parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds first")
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    run_parser.add_argument("--dsn", help="Admin URL of an existing Postgres (default: a throwaway local cluster)")
+    run_parser.add_argument("--pg-bin", help="Directory with initdb and pg_ctl (default: PATH)")
+    run_parser.add_argument("--llm-tokens", type=int, default=50, help="Chunks per fake completion")
+    run_parser.add_argument("--llm-token-delay", type=float, default=0.01)
+    run_parser.add_argument("--llm-first-token-delay", type=float, default=0.3)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--keep", action="store_true", help="Keep the temporary directory (logs, data)")
+    run_parser.add_argument("--output", type=pathlib.Path, help="Write the JSON results here")
+    run_parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline", type=pathlib.Path)
+    compare_parser.add_argument("current", type=pathlib.Path)
+    compare_parser.add_argument("--threshold", type=float, default=10, help="Allowed p95 regression in percent")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        ok = compare(json.loads(args.baseline.read_text()), json.loads(args.current.read_text()), args.threshold)
+        sys.exit(0 if ok else 1)
+
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Compare CPU and allocations of the /lesson-content/lessons/{id} encoders.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.lesson_payload --sections 12 --content-kb 4
+
+No database is needed: a synthetic lesson with the given number of sections
+(each with roughly --content-kb of structured content) is encoded per request
+in two ways:
+
+  models   build LessonWithContent per request and let FastAPI validate and
+           serialize it through the route's response_model (the old path)
+  spliced  render the static JSON once, then splice the user's progress and
+           completed sections into the cached bytes (the current path)
+
+Both must produce the same JSON. CPU time and wall latency are measured
+without tracing; a second, traced pass reports the peak memory allocated per
+request. Add --json for machine-readable output.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app.apis import lesson_content
+from app.apis.lesson_content import (
+    LessonContentSection, LessonWithContent, render_lesson_payload, splice_lesson_payload,
+)
+from app.libs.fast_json import HAS_ORJSON
+from benchmarks.stats import summarize
+
+SECTION_TYPES = ("introduction", "concept", "example", "practice_exercise", "summary")
+
+
+def make_lesson(sections: int, content_kb: int, seed: int) -> tuple[dict, list[dict]]:
+    rng = random.Random(seed)
+    words = ["prompt", "context", "model", "example", "constraint", "output", "role", "format", "tone", "step"]
+
+    def text(n: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    lesson = {
+        "id": 1, "title": "Writing effective prompts", "description": text(40), "category_id": 1,
+        "difficulty_level": "beginner", "estimated_duration": 30,
+        "learning_objectives": [text(8) for _ in range(5)], "workplace_scenario": text(60), "order_index": 1,
+    }
+    rows = []
+    for i in range(sections):
+        # ~7 bytes per word once encoded
+        paragraphs = [text(content_kb * 1024 // 7 // 4) for _ in range(4)]
+        rows.append({
+            "id": 100 + i, "lesson_id": 1, "section_type": SECTION_TYPES[i % len(SECTION_TYPES)],
+            "order_index": i, "title": f"Section {i + 1}",
+            "content": {"paragraphs": paragraphs, "tips": [text(12) for _ in range(3)], "scenario": text(30)},
+        })
+    return lesson, rows
+
+
+def build_model(lesson: dict, rows: list[dict], status: str, percentage: int, completed: set[int]) -> LessonWithContent:
+    return LessonWithContent(
+        **{field: lesson[field] for field in LessonWithContent.model_fields if field in lesson},
+        progress_status=status,
+        progress_percentage=percentage,
+        content_sections=[
+            LessonContentSection(
+                id=row["id"], section_type=row["section_type"], order_index=row["order_index"],
+                title=row["title"], content=row["content"], is_completed=row["id"] in completed,
+            )
+            for row in rows
+        ],
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--content-kb", type=int, default=4, help="Approximate content size per section")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    lesson, rows = make_lesson(args.sections, args.content_kb, args.seed)
+    # Different users see different progress; cycle through a few
+    rng = random.Random(args.seed)
+    users = [
+        (rng.choice(["not_started", "in_progress", "completed"]), rng.randint(0, 100),
+         {row["id"] for row in rows if rng.random() < 0.5})
+        for _ in range(16)
+    ]
+    route = next(r for r in lesson_content.router.routes if r.path.endswith("/lessons/{lesson_id}"))
+
+    async def models(i: int) -> bytes:
+        status, percentage, completed = users[i % len(users)]
+        content = await serialize_response(
+            field=route.response_field, response_content=build_model(lesson, rows, status, percentage, completed),
+        )
+        return JSONResponse(content).body
+
+    started = time.process_time()
+    payload = render_lesson_payload(lesson, rows)
+    render_ms = (time.process_time() - started) * 1000
+
+    async def spliced(i: int) -> bytes:
+        status, percentage, completed = users[i % len(users)]
+        return splice_lesson_payload(payload, status, percentage, completed)
+
+    for i in range(len(users)):
+        if json.loads(await models(i)) != json.loads(await spliced(i)):
+            raise SystemExit(f"payloads differ for user {i}")
+
+    results = {}
+    for name, encode in (("models", models), ("spliced", spliced)):
+        for i in range(args.warmup):
+            await encode(i)
+
+        samples = []
+        cpu_started = time.process_time()
+        for i in range(args.iterations):
+            started = time.perf_counter()
+            body = await encode(i)
+            samples.append((time.perf_counter() - started) * 1000)
+        cpu_us = (time.process_time() - cpu_started) / args.iterations * 1e6
+
+        peaks = []
+        tracemalloc.start()
+        for i in range(min(args.iterations, 100)):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await encode(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+        results[name] = {
+            **summarize(samples),
+            "cpu_us_per_request": round(cpu_us, 1),
+            "peak_alloc_kib": round(sum(peaks) / len(peaks) / 1024, 1),
+            "payload_bytes": len(body),
+        }
+
+    results["spliced"]["one_time_render_ms"] = round(render_ms, 3)
+    results["orjson"] = HAS_ORJSON
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"encoder: {'orjson' if HAS_ORJSON else 'json'}, one-time render {render_ms:.2f} ms")
+    print(f"{'path':<10}{'cpu us':>10}{'p50 ms':>10}{'p95 ms':>10}{'peak KiB':>10}{'bytes':>10}")
+    for name in ("models", "spliced"):
+        r = results[name]
+        print(f"{name:<10}{r['cpu_us_per_request']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['peak_alloc_kib']:>10}{r['payload_bytes']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Local JWKS stand-in: a signing key pair, its JWKS file and tokens signed with it.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.local_jwks init --dir .jwks
+    python -m benchmarks.local_jwks token --dir .jwks --sub user-1 --audience <projectId>
+
+`init` writes `private_key.pem` and `jwks.json` (RS256, kid "local-1"); run
+`init --rotate` to add a new key (next kid) while keeping the old ones in the
+JWKS, to exercise key rotation. Point the backend's auth config at the file
+with a `file://` jwksUrl (as benchmarks.harness does)
+
+    DATABUTTON_EXTENSIONS='[{"name": "stack-auth", "config": {"projectId": "local", "jwksUrl": "file:///abs/path/.jwks/jwks.json"}}]'
+
+and it verifies tokens from `token` without any network access. The audience
+must match the configured projectId.
+"""
+
+import argparse
+import json
+import pathlib
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+
+def key_paths(directory: pathlib.Path) -> tuple[pathlib.Path, pathlib.Path]:
+    return directory / "private_key.pem", directory / "jwks.json"
+
+
+def init_keys(directory: pathlib.Path, rotate: bool = False) -> str:
+    """Create (or rotate in) a signing key and return its kid"""
+    directory.mkdir(parents=True, exist_ok=True)
+    private_path, jwks_path = key_paths(directory)
+    keys = json.loads(jwks_path.read_text())["keys"] if rotate and jwks_path.exists() else []
+    kid = f"local-{len(keys) + 1}"
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_path.write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    ))
+    public_jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    keys.append({**public_jwk, "kid": kid, "alg": "RS256", "use": "sig"})
+    jwks_path.write_text(json.dumps({"keys": keys}, indent=2))
+    (directory / "kid").write_text(kid)
+    return kid
+
+
+def sign_token(directory: pathlib.Path, sub: str, audience: str, ttl: int = 3600, **claims) -> str:
+    """An RS256 token for `sub`, signed with the newest local key"""
+    private_path, _ = key_paths(directory)
+    now = int(time.time())
+    payload = {"sub": sub, "aud": audience, "iat": now, "exp": now + ttl, **claims}
+    return jwt.encode(
+        payload, private_path.read_bytes(), algorithm="RS256",
+        headers={"kid": (directory / "kid").read_text()},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["init", "token"])
+    parser.add_argument("--dir", type=pathlib.Path, default=pathlib.Path(".jwks"))
+    parser.add_argument("--rotate", action="store_true", help="init: add a key instead of replacing the set")
+    parser.add_argument("--sub", default="local-user")
+    parser.add_argument("--audience", default="local")
+    parser.add_argument("--ttl", type=int, default=3600)
+    args = parser.parse_args()
+
+    if args.command == "init":
+        kid = init_keys(args.dir, rotate=args.rotate)
+        print(f"wrote {args.dir / 'jwks.json'} (kid {kid}); use jwksUrl file://{args.dir.resolve() / 'jwks.json'}")
+    else:
+        print(sign_token(args.dir, args.sub, args.audience, args.ttl))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Check that playground streams do not slow down unrelated endpoints.
+
+Usage (from the backend directory, with the backend running against
+benchmarks.fake_llm or a real deployment):
+
+    python -m benchmarks.playground_load --base-url http://127.0.0.1:8000 --token <jwt>
+
+The probe endpoint is first measured on its own, then again while --streams
+playground requests are streaming concurrently. With a non-blocking LLM client
+the two latency distributions should be close; a client that blocks the event
+loop pushes probe latency up to the time between tokens or worse.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.stats import summarize
+
+
+async def probe(client: httpx.AsyncClient, path: str, requests: int, interval: float) -> list[float]:
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def stream_playground(client: httpx.AsyncClient, stop: asyncio.Event) -> int:
+    """Keep one playground stream open at all times until told to stop; returns bytes received"""
+    received = 0
+    while not stop.is_set():
+        async with client.stream("POST", "/routes/playground", json={"prompt": "Write a long story"}) as response:
+            response.raise_for_status()
+            async for data in response.aiter_bytes():
+                received += len(data)
+                if stop.is_set():
+                    break
+    return received
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", required=True, help="Bearer token accepted by the backend")
+    parser.add_argument("--streams", type=int, default=20, help="Concurrent playground streams")
+    parser.add_argument("--probe-path", default="/openapi.json", help="Unrelated endpoint to measure")
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="Seconds between probe requests")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"}
+    limits = httpx.Limits(max_connections=args.streams + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, limits=limits, timeout=60) as client:
+        await probe(client, args.probe_path, 10, 0)
+        baseline = await probe(client, args.probe_path, args.probes, args.probe_interval)
+
+        stop = asyncio.Event()
+        streams = [asyncio.create_task(stream_playground(client, stop)) for _ in range(args.streams)]
+        # Give every stream time to get past the first token
+        await asyncio.sleep(1)
+        loaded = await probe(client, args.probe_path, args.probes, args.probe_interval)
+        stop.set()
+        received = sum(await asyncio.gather(*streams))
+
+    results = {
+        "streams": args.streams,
+        "stream_bytes": received,
+        "baseline": summarize(baseline),
+        "under_load": summarize(loaded),
+    }
+    results["p95_ratio"] = round(results["under_load"]["p95_ms"] / results["baseline"]["p95_ms"], 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'phase':<12}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for phase in ("baseline", "under_load"):
+        r = results[phase]
+        print(f"{phase:<12}{r['mean_ms']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+    print(f"p95 under load / baseline: {results['p95_ratio']}x with {args.streams} streams")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+"""Hold the dashboard and engagement write paths to a fixed number of queries.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.query_budget --dsn postgresql://...
+
+Each code path runs once to warm the in-process caches (catalog, achievement
+rules, asyncpg type introspection) and then again on the same connection under
+`app.libs.query_tracking.assert_max_queries` with the budget in BUDGETS. A
+change that puts a query back inside a loop (an N+1) pushes a path over its
+budget and the script exits non-zero with the offending statement shapes.
+
+The repo has no test suite, so this runs as a CI step instead: without --dsn
+or $DATABASE_URL it reports SKIPPED and exits 0. The engagement user's rows
+are removed before and after.
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import uuid
+
+from app.apis.dashboard import get_dashboard_data_concurrent, get_dashboard_data_serial, get_dashboard_json
+from app.libs.database import acquire, close_pool, create_pool
+from app.libs.engagement_buffer import EngagementEvent, write_engagement_events
+from app.libs.query_tracking import assert_max_queries
+
+# Queries per call, transaction statements included (COPY is not counted)
+BUDGETS = {
+    # 7 panels; independent of how much data the user has
+    "dashboard serial": 15,
+    "dashboard concurrent": 15,
+    "dashboard single_query": 1,
+    # Replaces the per-event check_and_award_achievements: one counters
+    # update and at most one achievements insert per user per batch
+    "engagement first write": 6,
+    "engagement write": 5,
+}
+
+CLEANUP_TABLES = ("user_engagement", "user_counters", "user_achievements")
+
+
+async def cleanup(user_id: str):
+    async with acquire() as conn:
+        for table in CLEANUP_TABLES:
+            await conn.execute(f"DELETE FROM {table} WHERE user_id = $1", user_id)
+
+
+async def dashboard_serial(user_id: str):
+    async with acquire() as conn:
+        await get_dashboard_data_serial(conn, user_id)
+
+
+async def dashboard_single_query(user_id: str):
+    async with acquire() as conn:
+        await get_dashboard_json(conn, user_id)
+
+
+async def engagement_write(user_id: str, lesson_id: int):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    events = [
+        EngagementEvent(user_id, lesson_id, action, None, now)
+        for action in ("view", "preview", "start", "bookmark")
+    ]
+    async with acquire() as conn:
+        await write_engagement_events(conn, events)
+
+
+async def check_query_budgets(dsn: str) -> list[str]:
+    """Run every path under its budget; returns the failures"""
+    # asyncpg introspects types once per connection; with one connection the
+    # warm-up covers every measured run
+    os.environ["DB_POOL_MIN_SIZE"] = os.environ["DB_POOL_MAX_SIZE"] = "1"
+    await create_pool(dsn)
+    engagement_user = f"query-budget-{uuid.uuid4().hex[:12]}"
+    failures = []
+    try:
+        async with acquire() as conn:
+            lesson_id = await conn.fetchval("SELECT id FROM lessons ORDER BY id LIMIT 1")
+            # The most active user, so every dashboard panel has rows to read
+            dashboard_user = await conn.fetchval(
+                "SELECT user_id FROM user_engagement GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+            ) or engagement_user
+        if lesson_id is None:
+            return ["no lessons in the database; load init.sql first"]
+
+        paths = [
+            ("dashboard serial", lambda: dashboard_serial(dashboard_user)),
+            ("dashboard concurrent", lambda: get_dashboard_data_concurrent(dashboard_user)),
+            ("dashboard single_query", lambda: dashboard_single_query(dashboard_user)),
+            # Seeds the user's counters row
+            ("engagement first write", lambda: engagement_write(engagement_user, lesson_id)),
+            ("engagement write", lambda: engagement_write(engagement_user, lesson_id)),
+        ]
+        for _, run in paths:
+            await run()
+        await cleanup(engagement_user)
+
+        for name, run in paths:
+            try:
+                async with assert_max_queries(BUDGETS[name]) as counter:
+                    await run()
+                print(f"{name}: {counter.summary()} (budget {BUDGETS[name]})")
+            except AssertionError as e:
+                failures.append(f"{name}: {e}")
+    finally:
+        await cleanup(engagement_user)
+        await close_pool()
+    return failures
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="Postgres URL (default: $DATABASE_URL)")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print("SKIPPED: no --dsn or DATABASE_URL")
+        return
+
+    failures = await check_query_budgets(args.dsn)
+    if failures:
+        print("FAILED:\n" + "\n".join(failures))
+        sys.exit(1)
+    print("OK: every path is within its query budget")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""Per-endpoint serialization cost of the list endpoints.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.serialization --rows 50
+
+No database is needed. For each endpoint a list of synthetic rows shaped like
+its response model is turned into response bytes four ways:
+
+  validated  build validated models, then FastAPI validates and serializes the
+             response through the route's response_model and renders it with
+             the stdlib JSONResponse (the old path)
+  fast_json  the same, rendered with FastJSONResponse (the app-wide default
+             response class, orjson when installed)
+  construct  model_construct() without validation, serialized by pydantic-core
+  dicts      plain dicts in field order returned in a FastJSONResponse, which
+             FastAPI does not validate (the path the list endpoints now take)
+
+All four must produce the same JSON. Reports CPU microseconds per response;
+add --json for machine-readable output.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from pydantic import TypeAdapter
+
+from app.apis import lessons, practice_playground
+from app.libs.fast_json import HAS_ORJSON, FastJSONResponse
+
+
+def text(rng: random.Random, words: int) -> str:
+    vocabulary = ["prompt", "context", "model", "example", "constraint", "output", "role", "format", "tone", "step"]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def timestamp(rng: random.Random) -> str:
+    moment = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=rng.randint(0, 10**7))
+    return moment.isoformat()
+
+
+def session_row(rng: random.Random, i: int) -> dict:
+    return {
+        "id": i, "challenge_id": rng.randint(1, 20), "challenge_title": text(rng, 3), "user_prompt": text(rng, 80),
+        "feedback": text(rng, 60), "total_score": rng.randint(0, 100), "max_score": 100,
+        "scoring_breakdown": {f"criterion_{k}": {"score": rng.randint(0, 25), "feedback": text(rng, 15)} for k in range(4)},
+        "improvement_suggestions": [text(rng, 12) for _ in range(3)], "submitted_at": timestamp(rng),
+    }
+
+
+def portfolio_row(rng: random.Random, i: int) -> dict:
+    return {
+        "id": i, "title": text(rng, 4), "description": text(rng, 20), "prompt_text": text(rng, 80),
+        "ai_response": text(rng, 60), "score": rng.randint(0, 100), "tags": [text(rng, 1) for _ in range(3)],
+        "is_favorite": rng.random() < 0.2, "is_public": rng.random() < 0.5, "created_at": timestamp(rng),
+    }
+
+
+def lesson_row(rng: random.Random, i: int) -> dict:
+    return {
+        "id": i, "title": text(rng, 4), "description": text(rng, 20), "category_id": 1,
+        "difficulty_level": "beginner", "estimated_duration": 30, "preview_content": text(rng, 30),
+        "learning_objectives": [text(rng, 6) for _ in range(4)], "workplace_scenario": text(rng, 30),
+        "order_index": i, "is_bookmarked": rng.random() < 0.2, "progress_status": "in_progress",
+        "progress_percentage": rng.randint(0, 100),
+    }
+
+
+def achievement_row(rng: random.Random, i: int) -> dict:
+    earned = rng.random() < 0.5
+    return {
+        "id": i, "name": text(rng, 3), "description": text(rng, 12), "icon": "🏆", "reward_points": 50,
+        "is_earned": earned, "earned_at": timestamp(rng) if earned else None,
+    }
+
+
+def leaderboard_row(rng: random.Random, i: int) -> dict:
+    return {
+        "user_id": f"user-{i:06d}", "challenge_id": 1, "challenge_title": "Email Writing",
+        "score": 100 - i, "rank_position": i + 1, "achieved_at": timestamp(rng), "user_name": text(rng, 2),
+    }
+
+
+# endpoint -> (router, route path, response item model, row factory)
+ENDPOINTS = {
+    "practice_sessions": (practice_playground.router, "/practice/sessions", practice_playground.PracticeSession, session_row),
+    "portfolio": (practice_playground.router, "/practice/portfolio", practice_playground.PortfolioItem, portfolio_row),
+    "lessons_by_category": (lessons.router, "/lessons/categories/{category_id}/lessons", lessons.Lesson, lesson_row),
+    "achievements": (lessons.router, "/lessons/achievements", lessons.Achievement, achievement_row),
+    "leaderboard": (practice_playground.router, "/practice/leaderboard/{challenge_id}", practice_playground.LeaderboardEntry, leaderboard_row),
+}
+
+
+async def bench_endpoint(name: str, rows: int, iterations: int, seed: int) -> dict:
+    router, path, model, make_row = ENDPOINTS[name]
+    route = next(r for r in router.routes if r.path == path and "GET" in r.methods)
+    adapter = TypeAdapter(list[model])
+    rng = random.Random(seed)
+    data = [make_row(rng, i) for i in range(rows)]
+
+    async def validated() -> bytes:
+        content = await serialize_response(field=route.response_field, response_content=[model(**row) for row in data])
+        return JSONResponse(content).body
+
+    async def fast_json() -> bytes:
+        content = await serialize_response(field=route.response_field, response_content=[model(**row) for row in data])
+        return FastJSONResponse(content).body
+
+    async def construct() -> bytes:
+        return adapter.dump_json([model.model_construct(**row) for row in data])
+
+    async def dicts() -> bytes:
+        return FastJSONResponse([{field: row[field] for field in model.model_fields} for row in data]).body
+
+    paths = {"validated": validated, "fast_json": fast_json, "construct": construct, "dicts": dicts}
+    expected = json.loads(await validated())
+    for path_name, encode in paths.items():
+        if json.loads(await encode()) != expected:
+            raise SystemExit(f"{name}: {path_name} output differs from validated")
+
+    result = {"rows": rows, "payload_bytes": len(await dicts())}
+    for path_name, encode in paths.items():
+        for _ in range(max(iterations // 10, 1)):
+            await encode()
+        started = time.process_time()
+        for _ in range(iterations):
+            await encode()
+        result[f"{path_name}_us"] = round((time.process_time() - started) / iterations * 1e6, 1)
+    result["speedup"] = round(result["validated_us"] / result["dicts_us"], 1)
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50, help="Items per response")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma separated subset of endpoints")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.endpoints.split(","):
+        results[name] = await bench_endpoint(name, args.rows, args.iterations, args.seed)
+
+    if args.json:
+        print(json.dumps({"orjson": HAS_ORJSON, "endpoints": results}, indent=2))
+        return
+
+    print(f"encoder: {'orjson' if HAS_ORJSON else 'json'}, {args.rows} rows per response, CPU us per response")
+    print(f"{'endpoint':<22}{'validated':>11}{'fast_json':>11}{'construct':>11}{'dicts':>9}{'speedup':>9}{'bytes':>9}")
+    for name, r in results.items():
+        print(
+            f"{name:<22}{r['validated_us']:>11}{r['fast_json_us']:>11}{r['construct_us']:>11}"
+            f"{r['dicts_us']:>9}{r['speedup']:>8}x{r['payload_bytes']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""Fire concurrent practice submissions at the database and check the totals.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.submit_stress --dsn postgresql://... --submits 500
+
+Grading is skipped: every submission goes straight to the write path
+(`save_practice_session`) with a known score, all for the same user and
+challenge, as many at once as the pool allows. Afterwards practice_stats and
+leaderboard_entries must match the submitted scores exactly; any lost update
+makes the script exit non-zero. The user's rows are removed before and after.
+
+The repo has no test suite, so this runs as a CI step instead: without --dsn
+or $DATABASE_URL it reports SKIPPED and exits 0, so the same command works
+on runners with and without a database. `check_submit_totals()` returns the
+failures for callers that want to run it in-process.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+from app.apis.practice_playground import PromptSubmission, save_practice_session
+from app.libs.database import acquire, close_pool, create_pool
+
+CLEANUP_TABLES = ("leaderboard_entries", "practice_sessions", "practice_stats")
+
+
+async def cleanup(user_id: str):
+    async with acquire() as conn:
+        for table in CLEANUP_TABLES:
+            await conn.execute(f"DELETE FROM {table} WHERE user_id = $1", user_id)
+
+
+async def check_submit_totals(dsn: str, submits: int, challenge_id: int = 1, seed: int = 0) -> tuple[float, list[str]]:
+    """Run the concurrent submits; returns the elapsed seconds and the mismatches found"""
+    os.environ.setdefault("DB_POOL_MAX_SIZE", "50")
+    await create_pool(dsn)
+    user_id = f"stress-{uuid.uuid4().hex[:12]}"
+    rng = random.Random(seed)
+    scores = [rng.randint(0, 100) for _ in range(submits)]
+    body = PromptSubmission(challenge_id=challenge_id, user_prompt="stress test", session_duration_seconds=1)
+
+    try:
+        await cleanup(user_id)
+        started = time.perf_counter()
+        session_ids = await asyncio.gather(*(
+            save_practice_session(user_id, body, {"total_score": score, "overall_feedback": "stress"})
+            for score in scores
+        ))
+        elapsed = time.perf_counter() - started
+
+        async with acquire() as conn:
+            stats = await conn.fetchrow(
+                "SELECT total_sessions, average_score, best_score, total_practice_time_minutes FROM practice_stats WHERE user_id = $1",
+                user_id,
+            )
+            entries = await conn.fetch(
+                "SELECT score, session_id FROM leaderboard_entries WHERE user_id = $1 AND challenge_id = $2",
+                user_id, challenge_id,
+            )
+    finally:
+        await cleanup(user_id)
+        await close_pool()
+
+    best = max(scores)
+    # The first session (by commit order) to reach the best score owns the entry
+    best_sessions = {sid for sid, score in zip(session_ids, scores) if score == best}
+    failures = []
+    if stats["total_sessions"] != len(scores):
+        failures.append(f"total_sessions {stats['total_sessions']} != {len(scores)}")
+    if stats["best_score"] != best:
+        failures.append(f"best_score {stats['best_score']} != {best}")
+    # The write path adds score // 60 minutes per session, a quirk kept from
+    # before it was reworked (not the session duration); this checks that
+    # every increment landed, not that the minutes are meaningful
+    if stats["total_practice_time_minutes"] != sum(score // 60 for score in scores):
+        failures.append("total_practice_time_minutes does not match")
+    # average_score is rounded to 2 decimals on every update, so allow drift
+    if abs(float(stats["average_score"]) - sum(scores) / len(scores)) > 0.5:
+        failures.append(f"average_score {stats['average_score']} too far from {sum(scores) / len(scores):.2f}")
+    if len(entries) != 1:
+        failures.append(f"{len(entries)} leaderboard entries, expected 1")
+    elif entries[0]["score"] != best or entries[0]["session_id"] not in best_sessions:
+        failures.append(f"leaderboard entry {dict(entries[0])} does not hold the best score {best}")
+    return elapsed, failures
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="Postgres URL (default: $DATABASE_URL)")
+    parser.add_argument("--submits", type=int, default=500)
+    parser.add_argument("--challenge-id", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print("SKIPPED: no --dsn or DATABASE_URL")
+        return
+
+    elapsed, failures = await check_submit_totals(args.dsn, args.submits, args.challenge_id, args.seed)
+    print(f"{args.submits} submits in {elapsed:.2f}s ({args.submits / elapsed:.0f}/s)")
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: practice_stats and leaderboard_entries are exact")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,512 @@
+"""Fill every table of init.sql with synthetic data at a configurable scale.
+
+Usage (from the backend directory, against a database created from init.sql):
+
+    python -m benchmarks.synthetic_data --dsn postgresql://... \\
+        --users 1000000 --engagement 100000000 --sessions 10000000 --jobs 8
+
+All existing rows are replaced (TRUNCATE ... RESTART IDENTITY). The catalog
+(categories, lessons and their content sections, practice challenges,
+roadmaps, achievements with criteria) is generated at --lessons /
+--challenges scale; --keep-catalog keeps the rows init.sql inserted instead.
+Then users are generated in --jobs parallel processes, each loading its
+share through binary COPY in batches of --batch-users users.
+
+Activity is skewed like real usage. Each user gets a lognormal activity
+weight, and a --power-users fraction of them gets it multiplied by
+--power-weight. Engagement events, practice sessions and portfolio items are
+split across users in proportion to their weight, so totals land close to
+--engagement and --sessions while a few users own a large share of the rows.
+Lessons and challenges are picked with a Zipf-like popularity.
+
+Everything derived from those events is generated consistently with them:
+- progress, completed content sections and exercise submissions
+- bookmarks
+- practice stats and leaderboard entries (each user's best session per challenge)
+- user_counters and learning streaks
+- the achievements whose criteria the counters meet
+
+Secondary indexes are dropped during the load and rebuilt at the end (add
+--keep-indexes to load with them in place), and sequences are moved past
+the generated ids. Add --skip-fk-checks on a superuser connection to skip
+foreign key triggers while loading.
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import asyncpg
+
+from app.libs.database import init_connection
+
+# Tables in dependency order; user tables are truncated and reloaded together
+CATALOG_TABLES = ("categories", "lessons", "lesson_content", "practice_challenges", "roadmaps", "roadmap_items", "achievements")
+USER_TABLES = (
+    "users", "user_engagement", "user_progress", "user_progress_content", "submissions", "user_bookmarks",
+    "practice_sessions", "prompt_portfolio", "leaderboard_entries", "practice_stats", "portfolio_items",
+    "user_counters", "learning_streaks", "user_achievements", "user_roadmaps",
+)
+
+NOW = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+HISTORY_SECONDS = 365 * 24 * 3600
+
+WORDS = (
+    "prompt context model example constraint output role format tone step audience goal summary draft "
+    "review customer email report analysis feedback policy meeting product launch data insight plan"
+).split()
+SECTION_TYPES = ("introduction", "content", "example", "practice_exercise", "summary")
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+# Engagement actions and their share of events
+ACTIONS = (("view", 50), ("preview", 25), ("start", 12), ("complete", 8), ("bookmark", 3), ("unbookmark", 2))
+# (criterion type, targets) of the generated achievements
+ACHIEVEMENT_CRITERIA = (
+    ("lessons_completed", (1, 5, 10, 25, 50)),
+    ("lesson_previews", (10, 50)),
+    ("bookmarks", (5, 15)),
+    ("categories_explored", (3, 5)),
+    ("practice_sessions", (5, 20, 100)),
+    ("learning_streak", (7, 30)),
+)
+
+
+class Catalog(NamedTuple):
+    """What the user generator picks from"""
+    lesson_ids: list[int]
+    lesson_category: dict[int, int]
+    sections_by_lesson: dict[int, list[tuple[int, str]]]
+    challenge_ids: list[int]
+    roadmap_items: dict[int, list[int]]
+    achievements: list[tuple[int, str, int]]
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def moment(rng: random.Random, within: int = HISTORY_SECONDS) -> datetime.datetime:
+    return NOW - datetime.timedelta(seconds=rng.randrange(within))
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> list[float]:
+    """Popularity of n items, the first ones picked most often"""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def user_id(index: int) -> str:
+    return f"user-{index:07d}"
+
+
+# --- Catalog ---
+
+def catalog_rows(args, rng: random.Random) -> dict[str, list[tuple]]:
+    rows: dict[str, list[tuple]] = {table: [] for table in CATALOG_TABLES}
+    for category_id in range(1, args.categories + 1):
+        rows["categories"].append((
+            category_id, f"Category {category_id}: {text(rng, 2).title()}", text(rng, 12), "📘", "#3B82F6",
+            DIFFICULTIES[category_id % 3], category_id,
+        ))
+
+    section_id = 0
+    for lesson_id in range(1, args.lessons + 1):
+        category_id = (lesson_id - 1) % args.categories + 1
+        rows["lessons"].append((
+            lesson_id, f"Lesson {lesson_id}: {text(rng, 3).title()}", text(rng, 20), category_id,
+            DIFFICULTIES[lesson_id % 3], rng.choice((10, 15, 20, 30, 45)), text(rng, 30),
+            [text(rng, 6) for _ in range(3)], text(rng, 25), (lesson_id - 1) // args.categories + 1, True,
+        ))
+        for order, section_type in enumerate(SECTION_TYPES[:rng.randint(3, 5)] if rng.random() < 0.5 else SECTION_TYPES, 1):
+            section_id += 1
+            if section_type == "practice_exercise":
+                content = {"type": "exercise", "scenario": text(rng, 20), "task": text(rng, 15), "guidelines": [text(rng, 6) for _ in range(3)]}
+            else:
+                content = {"type": "text", "content": text(rng, 80), "key_points": [text(rng, 6) for _ in range(3)]}
+            rows["lesson_content"].append((section_id, lesson_id, section_type, order, text(rng, 3).title(), content))
+
+    for challenge_id in range(1, args.challenges + 1):
+        criteria = {name: {"max_score": 25, "description": text(rng, 8)} for name in ("clarity", "relevance", "structure", "effectiveness")}
+        rows["practice_challenges"].append((
+            challenge_id, f"Challenge {challenge_id}: {text(rng, 2).title()}", text(rng, 12),
+            rng.choice(("email", "content_creation", "analysis")), DIFFICULTIES[challenge_id % 3], text(rng, 30),
+            text(rng, 20), text(rng, 15), criteria, 100, rng.choice((10, 15, 20, 30)), text(rng, 10),
+            rng.choice(("Communication", "Marketing", "Analytics")), [rng.choice(WORDS) for _ in range(3)],
+        ))
+
+    item_id = 0
+    for roadmap_id in range(1, args.roadmaps + 1):
+        rows["roadmaps"].append((roadmap_id, f"Roadmap {roadmap_id}", text(rng, 15), "Professionals", "🧭", rng.randint(4, 12)))
+        for order, lesson_id in enumerate(sorted(rng.sample(range(1, args.lessons + 1), min(8, args.lessons))), 1):
+            item_id += 1
+            rows["roadmap_items"].append((item_id, roadmap_id, "lesson", lesson_id, order, f"Lesson {lesson_id}", text(rng, 8)))
+
+    achievement_id = 0
+    for criterion, targets in ACHIEVEMENT_CRITERIA:
+        for target in targets:
+            achievement_id += 1
+            rows["achievements"].append((
+                achievement_id, f"{criterion.replace('_', ' ').title()} {target}", f"Reach {target} {criterion.replace('_', ' ')}",
+                "🏅", target * 5, {"type": criterion, "target": target},
+            ))
+    return rows
+
+
+CATALOG_COLUMNS = {
+    "categories": ("id", "name", "description", "icon", "color", "difficulty_level", "order_index"),
+    "lessons": (
+        "id", "title", "description", "category_id", "difficulty_level", "estimated_duration", "preview_content",
+        "learning_objectives", "workplace_scenario", "order_index", "is_published",
+    ),
+    "lesson_content": ("id", "lesson_id", "section_type", "order_index", "title", "content"),
+    "practice_challenges": (
+        "id", "title", "description", "scenario_type", "difficulty_level", "context", "target_outcome", "template_prompt",
+        "scoring_criteria", "max_score", "time_limit_minutes", "prompt_text", "category", "tags",
+    ),
+    "roadmaps": ("id", "title", "description", "target_audience", "icon", "estimated_duration_weeks"),
+    "roadmap_items": ("id", "roadmap_id", "item_type", "item_id", "order_index", "title", "description"),
+    "achievements": ("id", "name", "description", "icon", "reward_points", "criteria"),
+}
+
+
+async def read_catalog(conn: asyncpg.Connection) -> Catalog:
+    lessons = await conn.fetch("SELECT id, category_id FROM lessons ORDER BY id")
+    sections: dict[int, list[tuple[int, str]]] = {}
+    for row in await conn.fetch("SELECT id, lesson_id, section_type FROM lesson_content ORDER BY lesson_id, order_index"):
+        sections.setdefault(row["lesson_id"], []).append((row["id"], row["section_type"]))
+    items: dict[int, list[int]] = {}
+    for row in await conn.fetch("SELECT id, roadmap_id FROM roadmap_items ORDER BY roadmap_id, order_index"):
+        items.setdefault(row["roadmap_id"], []).append(row["id"])
+    achievements = [
+        (row["id"], row["criteria"]["type"], int(row["criteria"]["target"]))
+        for row in await conn.fetch("SELECT id, criteria FROM achievements WHERE criteria IS NOT NULL ORDER BY id")
+        if isinstance(row["criteria"], dict) and "type" in row["criteria"]
+    ]
+    return Catalog(
+        lesson_ids=[row["id"] for row in lessons],
+        lesson_category={row["id"]: row["category_id"] for row in lessons},
+        sections_by_lesson=sections,
+        challenge_ids=[row["id"] for row in await conn.fetch("SELECT id FROM practice_challenges ORDER BY id")],
+        roadmap_items=items,
+        achievements=achievements,
+    )
+
+
+# --- Users ---
+
+def activity_weights(args, rng: random.Random, count: int) -> list[float]:
+    weights = []
+    for _ in range(count):
+        weight = rng.lognormvariate(0, args.sigma)
+        if rng.random() < args.power_users:
+            weight *= args.power_weight
+        weights.append(weight)
+    return weights
+
+
+def expected_weight(args) -> float:
+    """Mean of `activity_weights`, to turn a weight into an expected row count"""
+    return math.exp(args.sigma ** 2 / 2) * (1 - args.power_users + args.power_users * args.power_weight)
+
+
+def share(rng: random.Random, mean: float) -> int:
+    """An integer count with the given mean"""
+    whole = int(mean)
+    return whole + (rng.random() < mean - whole)
+
+
+class UserBatch:
+    """Rows of a batch of users, per table, ready for COPY"""
+
+    def __init__(self):
+        self.rows: dict[str, list[tuple]] = {table: [] for table in USER_TABLES}
+
+
+USER_COLUMNS = {
+    "users": ("id", "name", "email", "first_seen_at", "last_seen_at"),
+    "user_engagement": ("user_id", "lesson_id", "action", "metadata", "created_at"),
+    "user_progress": ("user_id", "lesson_id", "status", "progress_percentage", "started_at", "completed_at", "last_accessed_at"),
+    "user_progress_content": ("user_id", "lesson_content_id", "is_completed", "completed_at"),
+    "submissions": ("user_id", "lesson_id", "lesson_content_id", "submitted_prompt", "score", "feedback", "submitted_at"),
+    "user_bookmarks": ("user_id", "lesson_id", "created_at"),
+    "practice_sessions": (
+        "id", "user_id", "challenge_id", "user_prompt", "feedback", "total_score", "scoring_breakdown",
+        "improvement_suggestions", "session_duration_seconds", "created_at",
+    ),
+    "prompt_portfolio": ("user_id", "session_id", "title", "prompt_text", "ai_response", "score", "tags", "is_favorite", "is_public", "created_at"),
+    "leaderboard_entries": ("user_id", "challenge_id", "session_id", "score", "achieved_at"),
+    "practice_stats": (
+        "user_id", "total_sessions", "average_score", "best_score", "total_practice_time_minutes", "current_streak_days",
+        "challenges_completed", "prompts_saved", "last_practice_date",
+    ),
+    "portfolio_items": ("user_id", "title", "description", "prompt_text", "ai_response", "score", "tags", "is_favorite", "is_public", "created_at"),
+    "user_counters": ("user_id", "lessons_completed", "categories_explored", "lesson_previews", "bookmarks"),
+    "learning_streaks": ("user_id", "current_streak", "longest_streak", "streak_goal", "last_activity_date", "days_this_week"),
+    "user_achievements": ("user_id", "achievement_id", "earned_at"),
+    "user_roadmaps": ("user_id", "roadmap_id", "status", "started_at", "current_item_id"),
+}
+
+
+def generate_user(args, rng: random.Random, catalog: Catalog, lesson_cdf: list[float], challenge_cdf: list[float],
+                  index: int, weight: float, next_session_id: int, batch: UserBatch) -> int:
+    """Append one user's rows to the batch; returns the next free practice session id"""
+    rows = batch.rows
+    uid = user_id(index)
+    scale = weight / expected_weight(args)
+    first_seen = moment(rng)
+    active_seconds = max(int((NOW - first_seen).total_seconds()), 1)
+    rows["users"].append((uid, f"User {index}", f"{uid}@example.com", first_seen, moment(rng, active_seconds)))
+
+    # Engagement events and what they imply
+    events = share(rng, args.engagement / args.users * scale)
+    lessons = rng.choices(catalog.lesson_ids, cum_weights=lesson_cdf, k=events)
+    actions = rng.choices([a for a, _ in ACTIONS], weights=[w for _, w in ACTIONS], k=events)
+    touched: dict[int, set[str]] = {}
+    for lesson_id, action in zip(lessons, actions):
+        metadata = {"source": "lesson_page"} if action in ("view", "preview") else None
+        rows["user_engagement"].append((uid, lesson_id, action, metadata, moment(rng, active_seconds)))
+        touched.setdefault(lesson_id, set()).add(action)
+
+    completed_categories = set()
+    completed = previews = bookmarks = 0
+    for lesson_id, lesson_actions in touched.items():
+        if "preview" in lesson_actions:
+            previews += 1
+        if "bookmark" in lesson_actions and "unbookmark" not in lesson_actions:
+            bookmarks += 1
+            rows["user_bookmarks"].append((uid, lesson_id, moment(rng, active_seconds)))
+        if not lesson_actions & {"start", "complete"}:
+            continue
+        started = moment(rng, active_seconds)
+        done = "complete" in lesson_actions
+        percentage = 100 if done else rng.choice((10, 25, 50, 75))
+        rows["user_progress"].append((
+            uid, lesson_id, "completed" if done else "in_progress", percentage, started,
+            started + datetime.timedelta(minutes=rng.randint(5, 60)) if done else None, started,
+        ))
+        if done:
+            completed += 1
+            completed_categories.add(catalog.lesson_category[lesson_id])
+        sections = catalog.sections_by_lesson.get(lesson_id, [])
+        for position, (section_id, section_type) in enumerate(sections):
+            is_completed = done or position < len(sections) * percentage // 100
+            if is_completed:
+                rows["user_progress_content"].append((uid, section_id, True, started))
+            if is_completed and section_type == "practice_exercise":
+                rows["submissions"].append((uid, lesson_id, section_id, text(rng, 25), rng.randint(40, 100), text(rng, 20), started))
+
+    # Practice sessions, their stats and the leaderboard
+    sessions = share(rng, args.sessions / args.users * scale)
+    best: dict[int, tuple[int, int, datetime.datetime]] = {}
+    scores, minutes, saved, days = [], 0, 0, set()
+    for challenge_id in rng.choices(catalog.challenge_ids, cum_weights=challenge_cdf, k=sessions):
+        score = min(100, max(0, int(rng.gauss(72, 14))))
+        duration = rng.randint(30, 1800)
+        created = moment(rng, active_seconds)
+        breakdown = {"clarity": {"score": score // 4, "feedback": text(rng, 8)}, "structure": {"score": score // 4, "feedback": text(rng, 8)}}
+        rows["practice_sessions"].append((
+            next_session_id, uid, challenge_id, text(rng, 40), text(rng, 25), score, breakdown,
+            [text(rng, 8), text(rng, 8)], duration, created,
+        ))
+        if rng.random() < args.saved_fraction:
+            saved += 1
+            rows["prompt_portfolio"].append((
+                uid, next_session_id, text(rng, 4).title(), text(rng, 40), text(rng, 30), score,
+                [rng.choice(WORDS)], rng.random() < 0.2, rng.random() < 0.3, created,
+            ))
+        previous = best.get(challenge_id)
+        if previous is None or score > previous[0]:
+            best[challenge_id] = (score, next_session_id, created)
+        scores.append(score)
+        minutes += duration // 60
+        days.add(created.date())
+        next_session_id += 1
+    for challenge_id, (score, session_id, achieved_at) in best.items():
+        rows["leaderboard_entries"].append((uid, challenge_id, session_id, score, achieved_at))
+
+    streak = 0
+    if days:
+        last_day = max(days)
+        while last_day - datetime.timedelta(days=streak) in days:
+            streak += 1
+        rows["practice_stats"].append((
+            uid, sessions, round(sum(scores) / sessions, 2), max(scores), minutes, streak, len(best),
+            saved, last_day,
+        ))
+        rows["learning_streaks"].append((
+            uid, streak, max(streak, rng.randint(streak, streak + 10)), 7, last_day,
+            [rng.random() < 0.4 for _ in range(7)],
+        ))
+
+    for _ in range(share(rng, args.portfolio * scale)):
+        rows["portfolio_items"].append((
+            uid, text(rng, 4).title(), text(rng, 12), text(rng, 40), text(rng, 30), rng.randint(40, 100),
+            [rng.choice(WORDS) for _ in range(2)], rng.random() < 0.2, rng.random() < 0.3, moment(rng, active_seconds),
+        ))
+
+    # Counters and the achievements they earn, as the write path would leave them
+    metrics = {
+        "lessons_completed": completed, "categories_explored": len(completed_categories), "lesson_previews": previews,
+        "bookmarks": bookmarks, "practice_sessions": sessions, "learning_streak": streak,
+    }
+    if touched or sessions:
+        rows["user_counters"].append((uid, completed, len(completed_categories), previews, bookmarks))
+    for achievement_id, criterion, target in catalog.achievements:
+        if metrics.get(criterion, 0) >= target:
+            rows["user_achievements"].append((uid, achievement_id, moment(rng, active_seconds)))
+
+    if catalog.roadmap_items and rng.random() < min(1.0, 0.2 * scale):
+        roadmap_id = rng.choice(list(catalog.roadmap_items))
+        rows["user_roadmaps"].append((uid, roadmap_id, "in_progress", moment(rng, active_seconds), rng.choice(catalog.roadmap_items[roadmap_id])))
+
+    return next_session_id
+
+
+async def copy_batch(conn: asyncpg.Connection, batch: UserBatch):
+    for table in USER_TABLES:
+        records = batch.rows[table]
+        if records:
+            await conn.copy_records_to_table(table, records=records, columns=USER_COLUMNS[table])
+
+
+async def load_users(args, catalog: Catalog, job: int, first: int, last: int) -> dict[str, int]:
+    """Generate and COPY users first..last-1; runs in its own process"""
+    rng = random.Random(f"{args.seed}-{job}")
+    lesson_cdf = zipf_weights(len(catalog.lesson_ids))
+    challenge_cdf = zipf_weights(len(catalog.challenge_ids))
+    # Each job owns a disjoint range of practice session ids (INTEGER column)
+    next_session_id = job * (2**31 // args.jobs) + 1
+    counts = {table: 0 for table in USER_TABLES}
+
+    conn = await asyncpg.connect(args.dsn)
+    await init_connection(conn)
+    if args.skip_fk_checks:
+        await conn.execute("SET session_replication_role = replica")
+    try:
+        for start in range(first, last, args.batch_users):
+            stop = min(start + args.batch_users, last)
+            batch = UserBatch()
+            for index, weight in zip(range(start, stop), activity_weights(args, rng, stop - start)):
+                next_session_id = generate_user(args, rng, catalog, lesson_cdf, challenge_cdf, index, weight, next_session_id, batch)
+            for table, records in batch.rows.items():
+                counts[table] += len(records)
+            await copy_batch(conn, batch)
+    finally:
+        await conn.close()
+    return counts
+
+
+def run_job(args, catalog: Catalog, job: int, first: int, last: int) -> dict[str, int]:
+    return asyncio.run(load_users(args, catalog, job, first, last))
+
+
+# --- Orchestration ---
+
+async def drop_secondary_indexes(conn: asyncpg.Connection) -> list[str]:
+    """Drop indexes that back no constraint on the loaded tables; returns their definitions"""
+    rows = await conn.fetch(
+        """
+        SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE t.relname = ANY($1::text[]) AND t.relnamespace = 'public'::regnamespace
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """,
+        list(CATALOG_TABLES + USER_TABLES),
+    )
+    for row in rows:
+        await conn.execute(f"DROP INDEX {row['name']}")
+    return [row["definition"] for row in rows]
+
+
+async def reset_sequences(conn: asyncpg.Connection, tables):
+    for table in tables:
+        await conn.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), GREATEST((SELECT MAX(id) FROM {table}), 1))"
+        )
+
+
+async def main_async(args) -> dict:
+    started = time.perf_counter()
+    conn = await asyncpg.connect(args.dsn)
+    await init_connection(conn)
+    try:
+        tables = USER_TABLES if args.keep_catalog else CATALOG_TABLES + USER_TABLES
+        await conn.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE")
+        indexes = [] if args.keep_indexes else await drop_secondary_indexes(conn)
+
+        if not args.keep_catalog:
+            for table, records in catalog_rows(args, random.Random(args.seed)).items():
+                await conn.copy_records_to_table(table, records=records, columns=CATALOG_COLUMNS[table])
+            await reset_sequences(conn, CATALOG_TABLES)
+        catalog = await read_catalog(conn)
+        if not catalog.lesson_ids or not catalog.challenge_ids:
+            raise SystemExit("The catalog has no lessons or challenges to generate activity for")
+
+        # Contiguous user ranges, one per job
+        bounds = [args.users * job // args.jobs for job in range(args.jobs + 1)]
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(pool, run_job, args, catalog, job, bounds[job], bounds[job + 1])
+                for job in range(args.jobs)
+            ))
+        loaded = time.perf_counter()
+
+        for definition in indexes:
+            await conn.execute(definition)
+        await reset_sequences(conn, [table for table in USER_TABLES if table not in ("users", "user_counters")])
+        await conn.execute(f"ANALYZE {', '.join(CATALOG_TABLES + USER_TABLES)}")
+    finally:
+        await conn.close()
+
+    counts = {table: sum(result[table] for result in results) for table in USER_TABLES}
+    return {
+        "rows": counts,
+        "load_seconds": round(loaded - started, 1),
+        "index_seconds": round(time.perf_counter() - loaded, 1),
+        "rows_per_second": round(sum(counts.values()) / max(loaded - started, 1e-9)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True, help="Database created from init.sql; its data is replaced")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--engagement", type=int, default=1000000, help="user_engagement rows in total")
+    parser.add_argument("--sessions", type=int, default=100000, help="practice_sessions rows in total")
+    parser.add_argument("--portfolio", type=float, default=0.5, help="Portfolio items per average user")
+    parser.add_argument("--saved-fraction", type=float, default=0.1, help="Practice sessions saved to the prompt portfolio")
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--lessons", type=int, default=200)
+    parser.add_argument("--challenges", type=int, default=50)
+    parser.add_argument("--roadmaps", type=int, default=10)
+    parser.add_argument("--keep-catalog", action="store_true", help="Keep the catalog rows already in the database")
+    parser.add_argument("--sigma", type=float, default=1.0, help="Spread of the lognormal activity weights")
+    parser.add_argument("--power-users", type=float, default=0.01, help="Fraction of power users")
+    parser.add_argument("--power-weight", type=float, default=50, help="Activity multiplier of power users")
+    parser.add_argument("--jobs", type=int, default=4, help="Parallel generator processes")
+    parser.add_argument("--batch-users", type=int, default=2000, help="Users per COPY batch")
+    parser.add_argument("--keep-indexes", action="store_true", help="Load with secondary indexes in place")
+    parser.add_argument("--skip-fk-checks", action="store_true", help="Skip foreign key triggers (needs superuser)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+    width = max(len(table) for table in result["rows"])
+    for table, count in result["rows"].items():
+        print(f"{table:<{width}} {count:>14,}")
+    print(
+        f"loaded {sum(result['rows'].values()):,} rows in {result['load_seconds']}s "
+        f"({result['rows_per_second']:,} rows/s), indexes and ANALYZE {result['index_seconds']}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
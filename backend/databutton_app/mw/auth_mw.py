@@ -1,13 +1,27 @@
-import functools
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from collections import OrderedDict
 from http import HTTPStatus
 from typing import Annotated, Callable
+import httpx
 import jwt
 from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
 from fastapi.requests import HTTPConnection
-from jwt import PyJWKClient
+from jwt import PyJWK, PyJWKSet
 from pydantic import BaseModel
 from starlette.requests import Request
 
+from app.libs.request_timing import span
+
+
+logger = logging.getLogger(__name__)
+
 
 class AuthConfig(BaseModel):
     jwks_url: str
@@ -46,24 +60,105 @@ def get_audit_log(request: HTTPConnection) -> Callable[[str], None] | None:
 AuditLogDep = Annotated[Callable[[str], None] | None, Depends(get_audit_log)]
 
 
-def get_authorized_user(
+class VerifiedTokenCache:
+    """Bounded LRU of users from tokens whose signature has already been verified
+
+    Entries are keyed by a hash of the token (never the token itself) together
+    with the audience and JWKS url it was verified against, and are dropped at
+    the token's `exp` or after `max_ttl` seconds, whichever comes first. The
+    short cap bounds how long a revoked token keeps working; `flush()` drops
+    everything at once. Access is under a lock so the cache is also safe to
+    use from threads.
+    """
+
+    def __init__(self, max_entries: int, max_ttl: float):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: OrderedDict[bytes, tuple[float, User]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.flushes = 0
+
+    @staticmethod
+    def key(token: str, audience: str, jwks_url: str) -> bytes:
+        return hashlib.sha256(f"{audience}\0{jwks_url}\0{token}".encode()).digest()
+
+    def get(self, key: bytes) -> User | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: bytes, user: User, exp: float | None):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def flush(self):
+        """Forget every verified token, e.g. after revoking sessions or rotating keys"""
+        with self._lock:
+            self._entries.clear()
+            self.flushes += 1
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+        }
+
+
+# 0 entries disables the cache; the TTL cap bounds how long a revoked token is honoured
+token_cache = VerifiedTokenCache(
+    max_entries=int(os.environ.get("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000")),
+    max_ttl=float(os.environ.get("AUTH_TOKEN_CACHE_MAX_TTL", "300")),
+)
+
+
+async def get_authorized_user(
     request: HTTPConnection,
 ) -> User:
     auth_config = get_auth_config(request)
 
     try:
-        if isinstance(request, WebSocket):
-            user = authorize_websocket(request, auth_config)
-        elif isinstance(request, Request):
-            user = authorize_request(request, auth_config)
-        else:
-            raise ValueError("Unexpected request type")
+        with span("auth"):
+            if isinstance(request, WebSocket):
+                user = await authorize_websocket(request, auth_config)
+            elif isinstance(request, Request):
+                user = await authorize_request(request, auth_config)
+            else:
+                raise ValueError("Unexpected request type")
 
         if user is not None:
             return user
-        print("Request authentication returned no user")
+        logger.info("Request authentication returned no user")
     except Exception as e:
-        print(f"Request authentication failed: {e}")
+        logger.warning(f"Request authentication failed: {e}")
 
     if isinstance(request, WebSocket):
         raise WebSocketException(
@@ -75,15 +170,146 @@ def get_authorized_user(
         )
 
 
-@functools.cache
-def get_jwks_client(url: str):
-    """Reuse client cached by its url, client caches keys by default."""
-    return PyJWKClient(url, cache_keys=True)
-
-
-def get_signing_key(url: str, token: str) -> tuple[str, str]:
-    client = get_jwks_client(url)
-    signing_key = client.get_signing_key_from_jwt(token)
+JWKS_REFRESH_INTERVAL = float(os.environ.get("AUTH_JWKS_REFRESH_INTERVAL", "3600"))
+JWKS_MIN_REFRESH_INTERVAL = float(os.environ.get("AUTH_JWKS_MIN_REFRESH_INTERVAL", "30"))
+JWKS_FETCH_TIMEOUT = float(os.environ.get("AUTH_JWKS_FETCH_TIMEOUT", "5"))
+
+
+class JWKSKeySet:
+    """Signing keys from one JWKS url, held in memory and refreshed in the background
+
+    `start()` fetches the keys, then keeps refreshing them every
+    `refresh_interval` seconds (sooner if the response's Cache-Control max-age
+    asks for it), so lookups by `kid` never wait on the network. A token with an
+    unknown `kid` (key rotation) triggers a single refresh that every waiting
+    request shares, at most once per `min_refresh_interval` seconds. If a
+    refresh fails, the previous keys are kept.
+
+    A `file://` url reads the key set from a local JSON file instead, for
+    running offline against self-signed tokens.
+    """
+
+    def __init__(self, url: str, refresh_interval: float, min_refresh_interval: float):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: dict[str | None, PyJWK] = {}
+        self._fetched_at: float | None = None
+        self._attempted_at: float | None = None
+        self._next_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.fetches = 0
+        self.failures = 0
+
+    async def _fetch(self) -> tuple[dict, float | None]:
+        """The JWKS document and its max-age, if the server sent one"""
+        source = self.url
+        if source.startswith(("http://", "https://")):
+            async with httpx.AsyncClient(timeout=JWKS_FETCH_TIMEOUT) as client:
+                response = await client.get(source)
+                response.raise_for_status()
+            max_age = None
+            for directive in response.headers.get("cache-control", "").split(","):
+                name, _, value = directive.strip().partition("=")
+                if name.lower() == "max-age" and value.isdigit():
+                    max_age = float(value)
+            return response.json(), max_age
+
+        path = pathlib.Path(source.removeprefix("file://"))
+        return json.loads(await asyncio.to_thread(path.read_text)), None
+
+    async def refresh(self, min_age: float = 0.0) -> bool:
+        """Fetch the keys unless a fetch was attempted less than `min_age` seconds ago"""
+        async with self._refresh_lock:
+            # Callers that queued behind a refresh reuse its result, and a
+            # failing JWKS endpoint is retried at most once per `min_age`
+            if self._attempted_at is not None and time.monotonic() - self._attempted_at < min_age:
+                return bool(self._keys)
+            self._attempted_at = time.monotonic()
+            try:
+                document, max_age = await self._fetch()
+                key_set = PyJWKSet.from_dict(document)
+            except Exception as e:
+                self.failures += 1
+                self._next_refresh = time.monotonic() + self.min_refresh_interval
+                logger.warning(f"Failed to fetch JWKS from {self.url}: {e}")
+                return False
+
+            self._keys = {key.key_id: key for key in key_set.keys}
+            self._fetched_at = time.monotonic()
+            interval = self.refresh_interval if max_age is None else min(self.refresh_interval, max_age)
+            self._next_refresh = self._fetched_at + max(interval, self.min_refresh_interval)
+            self.fetches += 1
+            return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(max(self._next_refresh - time.monotonic(), 1.0))
+            await self.refresh()
+
+    async def start(self):
+        if self._task is None:
+            await self.refresh()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def get_key(self, kid: str | None) -> PyJWK:
+        key = self._lookup(kid)
+        if key is None:
+            # Not fetched yet or a rotated key: one shared refresh
+            await self.refresh(min_age=self.min_refresh_interval)
+            key = self._lookup(kid)
+        if key is None:
+            raise ValueError(f"Unknown signing key {kid!r}")
+        return key
+
+    def _lookup(self, kid: str | None) -> PyJWK | None:
+        key = self._keys.get(kid)
+        # A token without a kid is accepted only if the set has a single key
+        if key is None and kid is None and len(self._keys) == 1:
+            key = next(iter(self._keys.values()))
+        return key
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "keys": len(self._keys),
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at is not None else -1,
+        }
+
+
+jwks_key_sets: dict[str, JWKSKeySet] = {}
+
+
+def get_jwks(url: str) -> JWKSKeySet:
+    """The key set for a JWKS url, created on first use"""
+    key_set = jwks_key_sets.get(url)
+    if key_set is None:
+        key_set = jwks_key_sets[url] = JWKSKeySet(url, JWKS_REFRESH_INTERVAL, JWKS_MIN_REFRESH_INTERVAL)
+    return key_set
+
+
+async def start_jwks_refresh(auth_config: AuthConfig | None):
+    """Fetch the signing keys and keep them fresh (called from the app lifespan)"""
+    if auth_config is not None:
+        await get_jwks(auth_config.jwks_url).start()
+
+
+async def stop_jwks_refresh():
+    for key_set in jwks_key_sets.values():
+        await key_set.stop()
+
+
+async def get_signing_key(url: str, token: str) -> tuple[str, str]:
+    kid = jwt.get_unverified_header(token).get("kid")
+    signing_key = await get_jwks(url).get_key(kid)
     key = signing_key.key
     alg = signing_key.algorithm_name
     if alg not in ["RS256", "ES256"]:
@@ -91,7 +317,7 @@ def get_signing_key(url: str, token: str) -> tuple[str, str]:
     return (key, alg)
 
 
-def authorize_websocket(
+async def authorize_websocket(
     request: WebSocket,
     auth_config: AuthConfig,
 ) -> User | None:
@@ -111,42 +337,48 @@ def authorize_websocket(
             break
 
     if not token:
-        print(f"Missing bearer {prefix}.<token> in protocols")
+        logger.debug(f"Missing bearer {prefix}.<token> in protocols")
         return None
 
-    return authorize_token(token, auth_config)
+    return await authorize_token(token, auth_config)
 
 
-def authorize_request(
+async def authorize_request(
     request: Request,
     auth_config: AuthConfig,
 ) -> User | None:
     auth_header = request.headers.get(auth_config.header)
     if not auth_header:
-        print(f"Missing header '{auth_config.header}'")
+        logger.debug(f"Missing header '{auth_config.header}'")
         return None
 
     token = auth_header.startswith("Bearer ") and auth_header[7:]
     if not token:
-        print(f"Missing bearer token in '{auth_config.header}'")
+        logger.debug(f"Missing bearer token in '{auth_config.header}'")
         return None
 
-    return authorize_token(token, auth_config)
+    return await authorize_token(token, auth_config)
 
 
-def authorize_token(
+async def authorize_token(
     token: str,
     auth_config: AuthConfig,
 ) -> User | None:
+    # Tokens seen before skip the signing key lookup and signature check
+    cache_key = token_cache.key(token, auth_config.audience, auth_config.jwks_url)
+    user = token_cache.get(cache_key)
+    if user is not None:
+        return user
+
     # Audience and jwks url to get signing key from based on the users config
     jwks_urls = [(auth_config.audience, auth_config.jwks_url)]
 
     payload = None
     for audience, jwks_url in jwks_urls:
         try:
-            key, alg = get_signing_key(jwks_url, token)
+            key, alg = await get_signing_key(jwks_url, token)
         except Exception as e:
-            print(f"Failed to get signing key {e}")
+            logger.info(f"Failed to get signing key {e}")
             continue
 
         try:
@@ -157,13 +389,14 @@ def authorize_token(
                 audience=audience,
             )
         except jwt.PyJWTError as e:
-            print(f"Failed to decode and validate token {e}")
+            logger.info(f"Failed to decode and validate token {e}")
             continue
 
     try:
         user = User.model_validate(payload)
-        print(f"User {user.sub} authenticated")
+        logger.debug(f"User {user.sub} authenticated", extra={"user_id": user.sub})
+        token_cache.put(cache_key, user, payload.get("exp"))
         return user
     except Exception as e:
-        print(f"Failed to parse token payload {e}")
+        logger.info(f"Failed to parse token payload {e}")
         return None
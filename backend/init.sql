@@ -229,6 +229,17 @@ CREATE TABLE prompt_portfolio (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- User counters table (achievement metrics maintained incrementally on write)
+CREATE TABLE user_counters (
+    user_id VARCHAR(255) PRIMARY KEY,
+    lessons_completed INTEGER NOT NULL DEFAULT 0,
+    categories_explored INTEGER NOT NULL DEFAULT 0,
+    lesson_previews INTEGER NOT NULL DEFAULT 0,
+    bookmarks INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Learning streaks table
 CREATE TABLE learning_streaks (
     id SERIAL PRIMARY KEY,
@@ -249,7 +260,8 @@ CREATE TABLE leaderboard_entries (
     challenge_id INTEGER REFERENCES practice_challenges(id) ON DELETE CASCADE,
     session_id INTEGER REFERENCES practice_sessions(id) ON DELETE CASCADE,
     score INTEGER,
-    achieved_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    achieved_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, challenge_id)
 );
 
 -- Lesson content table
@@ -438,4 +450,5 @@ CREATE TRIGGER update_user_progress_updated_at BEFORE UPDATE ON user_progress FO
 CREATE TRIGGER update_user_roadmaps_updated_at BEFORE UPDATE ON user_roadmaps FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_practice_stats_updated_at BEFORE UPDATE ON practice_stats FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_portfolio_items_updated_at BEFORE UPDATE ON portfolio_items FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
-CREATE TRIGGER update_learning_streaks_updated_at BEFORE UPDATE ON learning_streaks FOR EACH ROW EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
+CREATE TRIGGER update_learning_streaks_updated_at BEFORE UPDATE ON learning_streaks FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_user_counters_updated_at BEFORE UPDATE ON user_counters FOR EACH ROW EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
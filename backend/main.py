@@ -1,13 +1,33 @@
 import os
 import pathlib
 import json
+import logging
+import contextlib
 import dotenv
 from fastapi import FastAPI, APIRouter, Depends
 from fastapi.middleware.cors import CORSMiddleware
 
 dotenv.load_dotenv()
 
-from databutton_app.mw.auth_mw import AuthConfig, get_authorized_user
+from app.libs.logging_config import configure_logging, logging_stats
+
+# Before the app modules are imported so their import-time logs are kept
+configure_logging()
+logger = logging.getLogger(__name__)
+
+from databutton_app.mw.auth_mw import (
+    AuthConfig, get_authorized_user, jwks_key_sets, start_jwks_refresh, stop_jwks_refresh, token_cache,
+)
+from app.libs.cache import cache_stats
+from app.libs.catalog import catalog_stats
+from app.libs.database import create_pool, close_pool, pool_stats
+from app.libs.engagement_buffer import engagement_buffer
+from app.libs.fast_json import FastJSONResponse
+from app.libs.grading_queue import grading_queue
+from app.libs.leaderboard import leaderboard_index
+from app.libs.llm import close_llm_client, create_llm_client
+from app.libs.metrics import metrics_endpoint, register_stats
+from app.libs.request_timing import RequestTimingMiddleware
 
 
 def get_router_config() -> dict:
@@ -54,8 +74,8 @@ def import_api_routers() -> APIRouter:
                         else [Depends(get_authorized_user)]
                     ),
                 )
-        except Exception as e:
-            print(e)
+        except Exception:
+            logger.exception(f"Failed to load API router '{name}'")
             continue
 
     return routes
@@ -74,9 +94,41 @@ def get_firebase_config() -> dict | None:
     return None
 
 
+def register_metrics():
+    """Report the in-process counters of the shared libs at /metrics"""
+    register_stats("db_pool", pool_stats)
+    register_stats("cache", cache_stats, label="cache")
+    register_stats("catalog", catalog_stats)
+    register_stats("leaderboard_index", leaderboard_index.stats)
+    register_stats("auth_token_cache", token_cache.stats)
+    register_stats("auth_jwks", lambda: {url: key_set.stats() for url, key_set in jwks_key_sets.items()}, label="url")
+    register_stats("engagement_buffer", engagement_buffer.stats)
+    register_stats("grading_queue", grading_queue.stats)
+    register_stats("logging", logging_stats)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown."""
+    await create_pool()
+    create_llm_client()
+    await start_jwks_refresh(app.state.auth_config)
+    await engagement_buffer.start()
+    await grading_queue.start()
+    try:
+        yield
+    finally:
+        # Stop background work while the pool is still open
+        await grading_queue.stop()
+        await engagement_buffer.stop()
+        await stop_jwks_refresh()
+        await close_llm_client()
+        await close_pool()
+
+
 def create_app() -> FastAPI:
     """Create the app. This is called by uvicorn with the factory option to construct the app object."""
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
     
     # Add CORS middleware
     app.add_middleware(
@@ -90,9 +142,20 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Let the frontend read the timing breakdown of cross-origin requests
+        expose_headers=["Server-Timing"],
     )
+    # Outermost, so the timings cover CORS handling and the whole app
+    app.add_middleware(RequestTimingMiddleware)
     
     app.include_router(import_api_routers())
+
+    # Prometheus scrape target, outside /routes and its user auth (see
+    # METRICS_TOKEN). Added as an API route so scrapes are labelled /metrics
+    if os.environ.get("METRICS_ENABLED", "false").lower() == "true":
+        register_metrics()
+        app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+
     auth_config_data = get_firebase_config()
 
     if auth_config_data is None: